@@ -1,227 +1,203 @@
 from __future__ import annotations
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
+
+import voluptuous as vol
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.event import async_call_later
+from homeassistant.const import ATTR_CONFIG_ENTRY_ID
+from homeassistant.core import HomeAssistant, ServiceCall, callback
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.typing import ConfigType
 from homeassistant.util import dt as dt_util
 
 from .const import (
+    CONF_RULES,
+    DATA_ENGINE,
     DOMAIN,
-    DEFAULT_UPDATE_INTERVAL,
-    CONF_UPDATE_INTERVAL,
-    CONF_AGENT_ID,
-    CONF_MINUTES_BETWEEN_AI,
-    DEFAULT_MINUTES_BETWEEN_AI,
-    CONF_NOTIFY_CHANGE,
-    CONF_ADVISOR_INTERVAL_MIN,
-    DEFAULT_NOTIFY_CHANGE,
-    DEFAULT_ADVISOR_INTERVAL_MIN,
+    RULES_FILE,
+    STORAGE_HISTORY_SPACING,
 )
+from .backfill import async_backfill
 from .coordinator import PowerManCoordinator
+from .engine import LAST_AI_KEY, PowerManEngine
+from .options import CompiledOptions
+from .rules import RuleError, RuleSet, parse_rules
+from .storage import PowerManStore
 
 _LOGGER = logging.getLogger(__name__)
 
 PLATFORMS: list[str] = ["sensor"]
 
-LAST_AI_KEY = "last_ai_run"  # stored per entry in hass.data
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
 
+SERVICE_SCHEMA = vol.Schema(
+    {vol.Optional(ATTR_CONFIG_ENTRY_ID): vol.All(cv.ensure_list, [cv.string])}
+)
 
-async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
-    update_seconds = entry.options.get(CONF_UPDATE_INTERVAL, DEFAULT_UPDATE_INTERVAL)
-    coordinator = PowerManCoordinator(
-        hass,
-        update_interval=timedelta(seconds=update_seconds),
-        entry_options=entry.options,
-    )
-    await coordinator.async_config_entry_first_refresh()
 
-    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = {
-        "coordinator": coordinator,
-        LAST_AI_KEY: None,
-        "adv_prev_code": None,
-        "adv_timer_unsub": None,
-    }
-    store = hass.data[DOMAIN][entry.entry_id]
-    store["adv_prev_code"] = (coordinator.data.get("advice") or {}).get("code")
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Create the shared engine and register the services once per domain."""
+    engine = PowerManEngine(hass)
+    hass.data.setdefault(DOMAIN, {})[DATA_ENGINE] = engine
 
-    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
-    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
+    async def _handle_advise_now(call: ServiceCall) -> None:
+        await engine.async_advise_now(call.data.get(ATTR_CONFIG_ENTRY_ID))
 
-    async def _notify_advice(title: str, message: str) -> None:
-        await hass.services.async_call(
-            "persistent_notification",
-            "create",
-            {"title": title, "message": message},
-            blocking=True,
-        )
+    async def _handle_generate_insight(call: ServiceCall) -> None:
+        await engine.async_generate_insight(call.data.get(ATTR_CONFIG_ENTRY_ID))
 
-    def _format_reasons(reasons: list[str] | None) -> str:
-        if not reasons:
-            return "- No reasons provided"
-        return "\n".join(f"- {reason}" for reason in reasons)
-
-    async def _handle_advise_now(call):
-        await coordinator.async_request_refresh()
-        adv = coordinator.data.get("advice") or {}
-        reasons = _format_reasons(adv.get("reasons"))
-        if adv.get("code"):
-            store["adv_prev_code"] = adv.get("code")
-        await _notify_advice(
-            "PowerMan — Advice",
-            f"{adv.get('title', '(no advice)')}\n\nReasons:\n{reasons}",
-        )
-
-    hass.services.async_register(DOMAIN, "advise_now", _handle_advise_now)
-
-    async def _periodic_watch(now=None):
-        await coordinator.async_request_refresh()
-        adv = coordinator.data.get("advice") or {}
-        code = adv.get("code")
-
-        prev_code = store.get("adv_prev_code")
-        if code and code != prev_code:
-            if entry.options.get(CONF_NOTIFY_CHANGE, DEFAULT_NOTIFY_CHANGE):
-                reasons = _format_reasons(adv.get("reasons"))
-                await _notify_advice(
-                    "PowerMan — Advice changed",
-                    f"{adv.get('title', '')}\n\nReasons:\n{reasons}",
-                )
-            store["adv_prev_code"] = code
-        elif code is None and prev_code is not None:
-            store["adv_prev_code"] = None
-
-        interval = int(
-            entry.options.get(CONF_ADVISOR_INTERVAL_MIN, DEFAULT_ADVISOR_INTERVAL_MIN)
-        )
-        _schedule_watch(interval * 60)
+    hass.services.async_register(
+        DOMAIN, "advise_now", _handle_advise_now, schema=SERVICE_SCHEMA
+    )
+    hass.services.async_register(
+        DOMAIN, "generate_insight", _handle_generate_insight, schema=SERVICE_SCHEMA
+    )
+    return True
 
-    def _schedule_watch(delay_seconds: float) -> None:
-        if store.get("adv_timer_unsub"):
-            store["adv_timer_unsub"]()
-        store["adv_timer_unsub"] = async_call_later(
-            hass, delay_seconds, _periodic_watch
-        )
 
-    _schedule_watch(5)
-
-    # ---- Service: powerman.generate_insight ----
-    async def _handle_generate_insight(call):
-        store = hass.data[DOMAIN][entry.entry_id]
-        coord: PowerManCoordinator = store["coordinator"]
-        data = coord.data or {}
-
-        # Build a *local* summary (no tokens used)
-        now = dt_util.now()
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        bat = data.get("battery_percent")
-        pwr = data.get("solar_power_w")
-        kwh = data.get("solar_energy_today_kwh")
-
-        summary_lines = [f"PowerMan insight — {now.strftime('%Y-%m-%d %H:%M')}"]
-        if kwh is not None:
-            summary_lines.append(
-                f"• Solar energy today: {kwh:.2f} kWh since {today_start.strftime('%H:%M')}"
-            )
-        if pwr is not None:
-            summary_lines.append(f"• Live solar power: {pwr:.0f} W")
-        if bat is not None:
-            summary_lines.append(f"• Battery state: {bat:.0f} %")
-        if len(summary_lines) == 1:
-            summary_lines.append(
-                "• No mapped entities yet. Configure in the integration options."
+@callback
+def _start_backfill(hass: HomeAssistant, entry: ConfigEntry, store: dict) -> None:
+    """Load recorder history in the background; advice works without it."""
+    coordinator: PowerManCoordinator = store["coordinator"]
+    if store.get("backfill_task"):
+        store["backfill_task"].cancel()
+    store["backfill_task"] = None
+    coordinator.profile = None
+    days = coordinator.options.backfill_days
+    if not days:
+        return
+
+    async def _async_load() -> None:
+        try:
+            coordinator.profile = await async_backfill(
+                hass, coordinator.options, days
             )
+        except Exception as exc:  # noqa: BLE001
+            _LOGGER.warning("PowerMan: history backfill failed: %s", exc)
 
-        local_summary = "\n".join(summary_lines)
-
-        # Always show a notification with the local summary
-        await hass.services.async_call(
-            "persistent_notification",
-            "create",
-            {"title": "PowerMan — Local insight", "message": local_summary},
-            blocking=True,
-        )
+    store["backfill_task"] = entry.async_create_background_task(
+        hass, _async_load(), "powerman_backfill"
+    )
 
-        # Optional AI call (rate limited)
-        agent_id = (entry.options.get(CONF_AGENT_ID) or "").strip()
-        if not agent_id:
-            _LOGGER.debug("PowerMan: no agent_id configured; skipping AI.")
-            return
 
-        min_minutes = int(
-            entry.options.get(
-                CONF_MINUTES_BETWEEN_AI, DEFAULT_MINUTES_BETWEEN_AI
-            )
-        )
-        last: datetime | None = store.get(LAST_AI_KEY)
-        if last and (dt_util.now() - last) < timedelta(minutes=min_minutes):
-            _LOGGER.info(
-                "PowerMan: AI rate limit hit; skipping (last run %s).",
-                last,
+def _read_rules_file(path: str) -> str | None:
+    """Contents of the rules file, None if there is none (blocking)."""
+    try:
+        with open(path, encoding="utf-8") as handle:
+            return handle.read()
+    except FileNotFoundError:
+        return None
+
+
+async def _async_load_rules(hass: HomeAssistant, entry: ConfigEntry) -> RuleSet:
+    """Advice rules from the options, else from the rules file; bad rules are skipped."""
+    text = entry.options.get(CONF_RULES) or ""
+    source = "options"
+    try:
+        if not text.strip():
+            source = RULES_FILE
+            text = await hass.async_add_executor_job(
+                _read_rules_file, hass.config.path(RULES_FILE)
             )
-            return
-
-        prompt = (
-            "You are an energy assistant. Summarise today's solar/battery situation briefly in 3–5 bullet points. "
-            "Be concise and practical for a home user.\n\n"
-            f"Data:\n"
-            f"- Solar energy produced today (kWh): {kwh if kwh is not None else 'unknown'}\n"
-            f"- Live solar power (W): {pwr if pwr is not None else 'unknown'}\n"
-            f"- Battery state (%): {bat if bat is not None else 'unknown'}\n"
-            f"- Current time: {now.isoformat()}\n"
-        )
+        return parse_rules(text)
+    except (OSError, RuleError) as exc:
+        _LOGGER.warning("PowerMan: ignoring advice rules from %s: %s", source, exc)
+        return RuleSet()
+
 
-        # Use HA's Conversation service (agent = Google Gemini conversation the user configured)
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    options = CompiledOptions.from_options(entry.options)
+    coordinator = PowerManCoordinator(hass, options=options)
+    coordinator.rules = await _async_load_rules(hass, entry)
+
+    # Warm restart: restore history, last advice and AI rate limit
+    persist = PowerManStore(hass, entry.entry_id)
+    saved = await persist.async_load()
+    if saved.get("history"):
         try:
-            await hass.services.async_call(
-                "conversation",
-                "process",
-                {"agent_id": agent_id, "text": prompt},
-                blocking=True,
-            )
-            store[LAST_AI_KEY] = dt_util.now()
-
-            await hass.services.async_call(
-                "persistent_notification",
-                "create",
-                {
-                    "title": "PowerMan — AI insight requested",
-                    "message": "Sent prompt to your Conversation agent. Check Assist/Conversation history or any linked outputs (e.g. TTS).",
-                },
-                blocking=True,
-            )
-        except Exception as exc:  # noqa: BLE001
-            _LOGGER.exception("PowerMan: AI call failed: %s", exc)
-            await hass.services.async_call(
-                "persistent_notification",
-                "create",
-                {
-                    "title": "PowerMan — AI error",
-                    "message": f"AI call failed: {exc}",
-                },
-                blocking=True,
-            )
+            coordinator.history.load_dict(saved["history"])
+            coordinator.digest.rebuild(coordinator.history, dt_util.now())
+        except (KeyError, TypeError, ValueError) as exc:
+            _LOGGER.warning("PowerMan: discarding unreadable saved history: %s", exc)
+    if saved.get("energy"):
+        try:
+            coordinator.energy.load_dict(saved["energy"], dt_util.now().date())
+        except (TypeError, ValueError) as exc:
+            _LOGGER.warning("PowerMan: discarding unreadable energy totals: %s", exc)
+    last_ai: datetime | None = None
+    if saved.get("last_ai_run"):
+        last_ai = dt_util.parse_datetime(saved["last_ai_run"])
+
+    await coordinator.async_config_entry_first_refresh()
+
+    hass.data[DOMAIN][entry.entry_id] = {
+        "coordinator": coordinator,
+        "persist": persist,
+        LAST_AI_KEY: last_ai,
+        "adv_prev_code": None,
+        "backfill_task": None,
+    }
+    store = hass.data[DOMAIN][entry.entry_id]
+    _start_backfill(hass, entry, store)
+    if "adv_prev_code" in saved:
+        store["adv_prev_code"] = saved["adv_prev_code"]
+    else:
+        store["adv_prev_code"] = (coordinator.data.get("advice") or {}).get("code")
+
+    def _data_to_save() -> dict:
+        last = store.get(LAST_AI_KEY)
+        return {
+            "history": coordinator.history.as_dict(STORAGE_HISTORY_SPACING),
+            "energy": coordinator.energy.as_dict(),
+            "adv_prev_code": store.get("adv_prev_code"),
+            "last_ai_run": last.isoformat() if last else None,
+        }
+
+    store["data_to_save"] = _data_to_save
+    entry.async_on_unload(
+        coordinator.async_add_listener(
+            lambda: persist.async_schedule_save(_data_to_save)
+        )
+    )
 
-    hass.services.async_register(DOMAIN, "generate_insight", _handle_generate_insight)
-    # --------------------------------------------
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
 
+    # Polling, push routing and the advice watch run on the shared engine
+    hass.data[DOMAIN][DATA_ENGINE].async_add_entry(entry, store)
     return True
 
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
+        hass.data[DOMAIN][DATA_ENGINE].async_remove_entry(entry.entry_id)
         store = hass.data[DOMAIN].pop(entry.entry_id, None)
-        if store and store.get("adv_timer_unsub"):
-            store["adv_timer_unsub"]()
+        if store:
+            await store["persist"].async_save(store["data_to_save"]())
     return unload_ok
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    await PowerManStore(hass, entry.entry_id).async_remove()
+
+
 async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
     store = hass.data[DOMAIN][entry.entry_id]
     coordinator: PowerManCoordinator = store["coordinator"]
-    coordinator.update_interval = timedelta(
-        seconds=entry.options.get(CONF_UPDATE_INTERVAL, DEFAULT_UPDATE_INTERVAL)
+    options = CompiledOptions.from_options(entry.options)
+    if options.instrumentation != coordinator.options.instrumentation:
+        # Adds or removes the diagnostic sensors
+        await hass.config_entries.async_reload(entry.entry_id)
+        return
+    reload_profile = (
+        options.backfill_days != coordinator.options.backfill_days
+        or options.sources != coordinator.options.sources
     )
+    coordinator.async_update_options(options)
+    coordinator.rules = await _async_load_rules(hass, entry)
+    if reload_profile:
+        _start_backfill(hass, entry, store)
+    hass.data[DOMAIN][DATA_ENGINE].async_update_entry(entry.entry_id)
     await coordinator.async_request_refresh()
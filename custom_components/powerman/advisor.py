@@ -1,7 +1,18 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from datetime import datetime, time
+import math
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta
+
+# Review horizon: minutes until the advice should be re-evaluated
+REVIEW_NEAR_RESERVE = 2  # SoC within SOC_NEAR_MARGIN of reserve
+SOC_NEAR_MARGIN = 5.0  # %
+NIGHT_REVIEW_FACTOR = 6  # stable nights wait this many normal intervals
+NIGHT_SOLAR_W = 50.0  # below this the system is considered idle overnight
+
+# Confidence lost per stale or rejected input, and the floor it stops at
+UNTRUSTED_PENALTY = 0.15
+MIN_CONFIDENCE = 0.1
 
 
 @dataclass
@@ -22,6 +33,15 @@ class AdvisorInputs:
     peak_start: time
     peak_end: time
     ev_enabled: bool
+    # Battery % expected at the next peak start from the load/solar forecast;
+    # None until enough history is available.
+    projected_soc_at_peak: float | None = None
+    # Minutes until the current price slot ends, when slot data is known
+    minutes_to_price_change: float | None = None
+    # Normal re-evaluation interval; the review horizon adapts around it
+    review_minutes: int = 10
+    # Number of inputs the quality filter flagged as stale or rejected
+    untrusted: int = 0
 
 
 @dataclass
@@ -30,7 +50,8 @@ class Advice:
     title: str
     confidence: float
     reasons: list[str]
-    next_review_minutes: int
+    # Relative to the evaluation time, so it is not part of the advice identity
+    next_review_minutes: int = field(compare=False)
 
 
 def _within_peak(now: datetime, start: time, end: time) -> bool:
@@ -40,18 +61,46 @@ def _within_peak(now: datetime, start: time, end: time) -> bool:
     return (t >= start) and (t < end) if start < end else (t >= start or t < end)
 
 
-def make_advice(i: AdvisorInputs) -> Advice:
-    reasons: list[str] = []
-    conf = 0.5
+def _minutes_until(now: datetime, t: time) -> float:
+    target = now.replace(hour=t.hour, minute=t.minute, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds() / 60.0
+
 
-    # Estimate load if missing
+def _review_minutes(i: AdvisorInputs, peak: bool) -> int:
+    """Minutes until the advice is worth re-evaluating.
+
+    Wakes exactly at the next peak boundary or price slot change, reviews
+    often while SoC closes in on reserve and stretches the interval on
+    stable nights (no solar, outside peak).
+    """
+    next_event = min(
+        _minutes_until(i.now, i.peak_start), _minutes_until(i.now, i.peak_end)
+    )
+    if i.minutes_to_price_change is not None:
+        next_event = min(next_event, i.minutes_to_price_change)
+
+    horizon = float(i.review_minutes)
     if (
-        i.load_w is None
-        and i.solar_w is not None
-        and i.import_w is not None
-        and i.export_w is not None
+        i.battery_pct is not None
+        and abs(i.battery_pct - i.reserve_soc) <= SOC_NEAR_MARGIN
     ):
-        i.load_w = max(0.0, i.solar_w - i.export_w + i.import_w)
+        horizon = min(horizon, REVIEW_NEAR_RESERVE)
+    elif not peak and i.solar_w is not None and i.solar_w < NIGHT_SOLAR_W:
+        horizon = i.review_minutes * NIGHT_REVIEW_FACTOR
+
+    return max(1, math.ceil(min(horizon, next_event)))
+
+
+def make_advice(i: AdvisorInputs) -> Advice:
+    """Evaluate the rules for one snapshot; ``i`` is not modified.
+
+    batch.advise_batch implements the same rules over columns and must be
+    kept in step with any change here.
+    """
+    reasons: list[str] = []
+    conf = 0.5
 
     peak = _within_peak(i.now, i.peak_start, i.peak_end)
 
@@ -101,9 +150,21 @@ def make_advice(i: AdvisorInputs) -> Advice:
                 f"Current price {i.price_now:.2f} ≥ high threshold {i.high_price:.2f}"
             )
 
+    # With a net-energy forecast we know whether the battery reaches reserve
+    # by the peak; otherwise fall back to the remaining-solar heuristic.
+    if i.projected_soc_at_peak is not None and i.battery_pct is not None:
+        if i.projected_soc_at_peak < i.reserve_soc and not peak:
+            code = "charge_battery_from_grid_now"
+            title = "Forecast short of reserve at peak — charge now"
+            conf = max(conf, 0.75)
+            reasons.append(
+                f"Forecast battery at peak start {i.projected_soc_at_peak:.0f}% "
+                f"< reserve {i.reserve_soc}%"
+            )
+
     # If we have solar remaining forecast and it's low before peak,
     # bias towards charging to reach target.
-    if i.solar_kwh_remaining_today is not None and i.battery_pct is not None:
+    elif i.solar_kwh_remaining_today is not None and i.battery_pct is not None:
         if i.solar_kwh_remaining_today < 1.0 and i.battery_pct < i.target_soc and not peak:
             code = "charge_battery_from_grid_now"
             title = "Low remaining solar — charge to reach target"
@@ -112,10 +173,15 @@ def make_advice(i: AdvisorInputs) -> Advice:
                 f"Low solar left today ({i.solar_kwh_remaining_today:.1f} kWh)"
             )
 
+    if i.untrusted:
+        conf = max(MIN_CONFIDENCE, conf - UNTRUSTED_PENALTY * i.untrusted)
+        reasons.append(f"{i.untrusted} input(s) stale or rejected as outliers")
+
     return Advice(
         code=code,
         title=title,
         confidence=round(conf, 2),
         reasons=reasons,
-        next_review_minutes=10,
+        next_review_minutes=_review_minutes(i, peak),
     )
+
@@ -0,0 +1,132 @@
+from __future__ import annotations
+import asyncio
+import logging
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+
+from .stats import Stats
+
+_LOGGER = logging.getLogger(__name__)
+
+QUEUE_SIZE = 4
+
+
+@dataclass(slots=True)
+class InsightJob:
+    entry_id: str
+    agent_id: str
+    prompt: str
+    key: tuple  # prompt inputs; equal keys reuse the previous answer
+    timeout: float
+    stats: Stats
+
+
+def response_text(response: dict[str, Any] | None) -> str | None:
+    """Pull the spoken text out of a ``conversation.process`` response."""
+    try:
+        return response["response"]["speech"]["plain"]["speech"]  # type: ignore[index]
+    except (KeyError, TypeError):
+        return None
+
+
+class InsightWorker:
+    """Runs conversation agent calls off the service-call path.
+
+    Jobs go through a small bounded queue drained by one background task,
+    so ``generate_insight`` returns as soon as the job is queued. Each call
+    is bounded by the job's timeout, and an entry's queued or in-flight job
+    is dropped when the entry unloads. ``on_result(job, text, error)`` runs
+    in the event loop once a call finishes.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        on_result: Callable[[InsightJob, str | None, Exception | None], None],
+    ) -> None:
+        self.hass = hass
+        self._on_result = on_result
+        self._queue: asyncio.Queue[InsightJob] = asyncio.Queue(QUEUE_SIZE)
+        self._pending: set[str] = set()  # entry ids queued or in flight
+        self._current: InsightJob | None = None
+        self._call: asyncio.Task | None = None
+        self._worker: asyncio.Task | None = None
+
+    @callback
+    def async_start(self) -> None:
+        if self._worker is None:
+            self._worker = self.hass.async_create_background_task(
+                self._async_run(), "powerman_ai_insight"
+            )
+
+    @callback
+    def async_stop(self) -> None:
+        self._pending.clear()
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        if self._call is not None:
+            self._call.cancel()
+
+    @callback
+    def async_forget(self, entry_id: str) -> None:
+        self._pending.discard(entry_id)
+        if self._current and self._current.entry_id == entry_id and self._call:
+            self._call.cancel()
+
+    @callback
+    def async_submit(self, job: InsightJob) -> bool:
+        """Queue a job; False if the entry already has one or the queue is full."""
+        if job.entry_id in self._pending:
+            return False
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            return False
+        self._pending.add(job.entry_id)
+        return True
+
+    async def _async_run(self) -> None:
+        while True:
+            job = await self._queue.get()
+            if job.entry_id not in self._pending:
+                continue  # entry unloaded while queued
+            self._current = job
+            self._call = self.hass.async_create_task(self._async_call(job))
+            text: str | None = None
+            error: Exception | None = None
+            try:
+                job.stats.incr("ai_calls")
+                with job.stats.timer("ai_call"):
+                    text = await asyncio.wait_for(self._call, job.timeout)
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():  # type: ignore[union-attr]
+                    raise
+                continue  # entry unloaded mid-call
+            except TimeoutError:
+                job.stats.incr("ai_timeouts")
+                error = TimeoutError(f"no answer within {job.timeout:.0f} s")
+            except Exception as exc:  # noqa: BLE001
+                error = exc
+            finally:
+                self._current = self._call = None
+                self._pending.discard(job.entry_id)
+            if error is not None:
+                job.stats.incr("ai_errors")
+            try:
+                self._on_result(job, text, error)
+            except Exception:  # noqa: BLE001
+                _LOGGER.exception("PowerMan: handling AI result failed")
+
+    async def _async_call(self, job: InsightJob) -> str | None:
+        response = await self.hass.services.async_call(
+            "conversation",
+            "process",
+            {"agent_id": job.agent_id, "text": job.prompt},
+            blocking=True,
+            return_response=True,
+        )
+        return response_text(response)
@@ -0,0 +1,81 @@
+from __future__ import annotations
+import logging
+from datetime import datetime, timedelta
+from typing import Any
+
+import numpy as np
+
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.statistics import statistics_during_period
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from .history import METRICS
+from .options import CompiledOptions
+from .profile import BucketSeries
+
+_LOGGER = logging.getLogger(__name__)
+
+# Recorder unit classes converted to the units the data keys are named after
+STATISTIC_UNITS = {"power": "W", "energy": "kWh"}
+
+
+def _start_ts(value: Any) -> float:
+    # Newer recorder versions return epoch floats, older ones datetimes
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+async def async_backfill(
+    hass: HomeAssistant, options: CompiledOptions, days: int
+) -> BucketSeries | None:
+    """Load the last ``days`` of 5-minute statistics for the mapped sources.
+
+    Runs a single batched statistics query on the recorder executor and
+    resamples the result into a BucketSeries. Returns None when the recorder
+    is not available or none of the recorded metrics is mapped.
+    """
+    if "recorder" not in hass.config.components:
+        _LOGGER.debug("PowerMan: recorder not loaded; skipping backfill")
+        return None
+
+    wanted = {
+        entity_id: data_key
+        for data_key, entity_id in options.sources
+        if data_key in METRICS
+    }
+    if not wanted:
+        return None
+
+    end = dt_util.utcnow()
+    series = await get_instance(hass).async_add_executor_job(
+        _load, hass, wanted, end - timedelta(days=days), end, days
+    )
+    _LOGGER.debug("PowerMan: backfilled %d days for %s", days, ", ".join(wanted))
+    return series
+
+
+def _load(
+    hass: HomeAssistant,
+    wanted: dict[str, str],
+    start: datetime,
+    end: datetime,
+    days: int,
+) -> BucketSeries:
+    """Query and resample; runs in the recorder's executor."""
+    stats = statistics_during_period(
+        hass, start, end, set(wanted), "5minute", STATISTIC_UNITS, {"mean"}
+    )
+    series = BucketSeries(days, end.timestamp())
+    for entity_id, rows in stats.items():
+        if not rows:
+            continue
+        ts = np.fromiter((_start_ts(r["start"]) for r in rows), float, len(rows))
+        values = np.fromiter(
+            (np.nan if r.get("mean") is None else r["mean"] for r in rows),
+            float,
+            len(rows),
+        )
+        series.add_many(wanted[entity_id], ts, values)
+    return series
@@ -0,0 +1,332 @@
+from __future__ import annotations
+
+import csv
+import math
+from collections.abc import Iterable, Iterator
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, time, tzinfo
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from .advisor import AdvisorInputs, _within_peak, make_advice
+from .optimizer import DEFAULT_EFFICIENCY
+from .options import CompiledOptions
+
+CHUNK_ROWS = 8640  # one month of 5-minute rows per chunk
+MAX_STEP_SECONDS = 3600  # longer gaps in the history are not integrated
+TIMESTAMP_COLUMN = "timestamp"
+# Columns read from a history file, named like the coordinator's data keys.
+# house_load_w and price_now are required; the rest are optional.
+COLUMNS = (
+    "solar_power_w",
+    "house_load_w",
+    "price_now",
+    "price_next",
+    "solar_remaining_kwh",
+    "export_price",
+)
+
+
+def _epoch(value: Any, tz: tzinfo | None) -> float:
+    """Epoch seconds; naive timestamps are wall-clock time in ``tz``."""
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, (int, float)):
+        return float(value)
+    else:
+        text = str(value).strip()
+        try:
+            return float(text)
+        except ValueError:
+            dt = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=tz) if tz is not None else dt.astimezone()
+    return dt.timestamp()
+
+
+def _float(value: Any) -> float:
+    if value is None or value == "":
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _chunk(ts: list[float], rows: dict[str, list[float]]) -> dict[str, np.ndarray]:
+    out = {TIMESTAMP_COLUMN: np.asarray(ts, dtype=float)}
+    for name, values in rows.items():
+        out[name] = np.asarray(values, dtype=float)
+    return out
+
+
+def read_csv(
+    path: str | Path, tz: tzinfo | None = None, chunk_rows: int = CHUNK_ROWS
+) -> Iterator[dict[str, np.ndarray]]:
+    """Stream a wide CSV (one row per sample) as column chunks.
+
+    Needs a ``timestamp`` column (ISO 8601 or epoch seconds) plus any of
+    COLUMNS; unknown columns are ignored and empty cells become NaN.
+    """
+    with open(path, newline="", encoding="utf-8") as handle:
+        reader = csv.DictReader(handle)
+        if not reader.fieldnames or TIMESTAMP_COLUMN not in reader.fieldnames:
+            raise ValueError(f"{path}: missing a '{TIMESTAMP_COLUMN}' column")
+        present = [name for name in COLUMNS if name in reader.fieldnames]
+        ts: list[float] = []
+        rows: dict[str, list[float]] = {name: [] for name in present}
+        for record in reader:
+            ts.append(_epoch(record[TIMESTAMP_COLUMN], tz))
+            for name in present:
+                rows[name].append(_float(record[name]))
+            if len(ts) >= chunk_rows:
+                yield _chunk(ts, rows)
+                ts = []
+                rows = {name: [] for name in present}
+        if ts:
+            yield _chunk(ts, rows)
+
+
+def read_parquet(
+    path: str | Path, tz: tzinfo | None = None, chunk_rows: int = CHUNK_ROWS
+) -> Iterator[dict[str, np.ndarray]]:
+    """Stream a Parquet file with the same columns as read_csv.
+
+    Needs the optional ``pyarrow`` package; row groups are read in batches so
+    the file never has to fit in memory.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise RuntimeError("Reading Parquet needs the 'pyarrow' package") from exc
+
+    parquet = pq.ParquetFile(path)
+    names = parquet.schema_arrow.names
+    if TIMESTAMP_COLUMN not in names:
+        raise ValueError(f"{path}: missing a '{TIMESTAMP_COLUMN}' column")
+    present = [name for name in COLUMNS if name in names]
+    for batch in parquet.iter_batches(
+        batch_size=chunk_rows, columns=[TIMESTAMP_COLUMN, *present]
+    ):
+        ts = [_epoch(v, tz) for v in batch.column(TIMESTAMP_COLUMN).to_pylist()]
+        rows = {
+            name: [_float(v) for v in batch.column(name).to_pylist()]
+            for name in present
+        }
+        yield _chunk(ts, rows)
+
+
+def read_history(
+    path: str | Path, tz: tzinfo | None = None, chunk_rows: int = CHUNK_ROWS
+) -> Iterator[dict[str, np.ndarray]]:
+    if Path(path).suffix.lower() in (".parquet", ".pq"):
+        return read_parquet(path, tz, chunk_rows)
+    return read_csv(path, tz, chunk_rows)
+
+
+class BatterySim:
+    """Energy-level battery model driven by advice codes.
+
+    Surplus solar charges the battery and deficits discharge it, but never
+    below reserve outside the peak window. ``charge_battery_from_grid_now``
+    also charges from the grid up to the target SoC and holds the battery.
+    """
+
+    def __init__(
+        self,
+        capacity_kwh: float,
+        max_power_kw: float,
+        soc_pct: float,
+        efficiency: float = DEFAULT_EFFICIENCY,
+    ) -> None:
+        self.capacity_kwh = capacity_kwh
+        self.max_power_kw = max_power_kw
+        self.energy_kwh = soc_pct / 100.0 * capacity_kwh
+        self._eta = math.sqrt(efficiency)
+
+    @property
+    def soc_pct(self) -> float:
+        return self.energy_kwh / self.capacity_kwh * 100.0
+
+    def step(
+        self,
+        code: str,
+        solar_kwh: float,
+        load_kwh: float,
+        hours: float,
+        floor_pct: float,
+        target_pct: float,
+    ) -> tuple[float, float]:
+        """Advance by ``hours``; returns (grid import, grid export) in kWh."""
+        eta = self._eta
+        room = self.max_power_kw * hours  # AC-side kWh the inverter can move
+        surplus = solar_kwh - load_kwh
+        imported = exported = 0.0
+        if surplus >= 0:
+            absorb = min(surplus, room, (self.capacity_kwh - self.energy_kwh) / eta)
+            self.energy_kwh += absorb * eta
+            room -= absorb
+            exported = surplus - absorb
+        elif code == "charge_battery_from_grid_now":
+            imported = -surplus
+        else:
+            floor_kwh = floor_pct / 100.0 * self.capacity_kwh
+            available = max(0.0, self.energy_kwh - floor_kwh) * eta
+            discharge = min(-surplus, room, available)
+            self.energy_kwh -= discharge / eta
+            imported = -surplus - discharge
+        if code == "charge_battery_from_grid_now" and room > 0:
+            target_kwh = target_pct / 100.0 * self.capacity_kwh
+            charge = min(room, max(0.0, target_kwh - self.energy_kwh) / eta)
+            self.energy_kwh += charge * eta
+            imported += charge
+        return imported, exported
+
+
+@dataclass
+class BacktestResult:
+    rows: int = 0
+    skipped_rows: int = 0
+    hours: float = 0.0
+    solar_kwh: float = 0.0
+    load_kwh: float = 0.0
+    import_kwh: float = 0.0
+    export_kwh: float = 0.0
+    cost: float = 0.0
+    peak_import_kwh: float = 0.0
+    max_import_w: float = 0.0
+    # Same battery run as plain self-consumption, and no battery at all
+    cost_self_consumption: float = 0.0
+    cost_no_battery: float = 0.0
+    advice_hours: dict[str, float] = field(default_factory=dict)
+    final_soc_pct: float | None = None
+
+    @property
+    def self_consumption(self) -> float | None:
+        """Share of the solar energy used on site."""
+        if self.solar_kwh <= 0:
+            return None
+        return 1.0 - self.export_kwh / self.solar_kwh
+
+    def as_dict(self) -> dict[str, Any]:
+        out = asdict(self)
+        out["self_consumption"] = self.self_consumption
+        out["advice_hours"] = {k: round(v, 2) for k, v in self.advice_hours.items()}
+        return {
+            key: round(value, 4) if isinstance(value, float) else value
+            for key, value in out.items()
+        }
+
+
+def backtest(
+    chunks: Iterable[dict[str, np.ndarray]],
+    options: CompiledOptions,
+    *,
+    initial_soc_pct: float | None = None,
+    export_price: float = 0.0,
+    tz: tzinfo | None = None,
+) -> BacktestResult:
+    """Replay history chunks through the advisor and a simulated battery.
+
+    The advisor sees the simulated SoC, so its advice feeds back into the
+    battery (closed loop); that makes the replay sequential per row. Each row
+    holds for the time until the next one. Before a gap longer than
+    MAX_STEP_SECONDS it holds for the previous step only and the rest of
+    the gap is not integrated. Rows without load or price are skipped.
+    Only one chunk is held in memory.
+    """
+    soc = options.reserve_soc if initial_soc_pct is None else initial_soc_pct
+    cap = options.battery_capacity_kwh
+    battery = BatterySim(cap, options.battery_power_kw, soc)
+    baseline = BatterySim(cap, options.battery_power_kw, soc)
+    result = BacktestResult()
+    peak_start: time = options.peak_start
+    peak_end: time = options.peak_end
+
+    def _replay(row: tuple[float, ...], seconds: float) -> None:
+        ts, solar_w, load_w, price, price_next, remaining, export = row
+        if math.isnan(load_w) or math.isnan(price) or seconds <= 0:
+            result.skipped_rows += 1
+            return
+        solar_w = 0.0 if math.isnan(solar_w) else solar_w
+        export = export_price if math.isnan(export) else export
+        now = datetime.fromtimestamp(ts, tz)
+        advice = make_advice(
+            AdvisorInputs(
+                now=now,
+                battery_pct=battery.soc_pct,
+                solar_w=solar_w,
+                load_w=load_w,
+                import_w=None,
+                export_w=max(0.0, solar_w - load_w),
+                price_now=price,
+                price_next=_none(price_next),
+                solar_kwh_remaining_today=_none(remaining),
+                reserve_soc=options.reserve_soc,
+                target_soc=options.target_soc,
+                cheap_price=options.cheap_price,
+                high_price=options.high_price,
+                peak_start=peak_start,
+                peak_end=peak_end,
+                ev_enabled=options.ev_enabled,
+            )
+        )
+        peak = _within_peak(now, peak_start, peak_end)
+        floor = 0.0 if peak else options.reserve_soc
+        hours = seconds / 3600.0
+        solar_kwh = solar_w / 1000.0 * hours
+        load_kwh = load_w / 1000.0 * hours
+
+        imported, exported = battery.step(
+            advice.code, solar_kwh, load_kwh, hours, floor, options.target_soc
+        )
+        base_in, base_out = baseline.step(
+            "do_nothing_normal_day", solar_kwh, load_kwh, hours, 0.0, 100.0
+        )
+        net = load_kwh - solar_kwh
+
+        result.rows += 1
+        result.hours += hours
+        result.solar_kwh += solar_kwh
+        result.load_kwh += load_kwh
+        result.import_kwh += imported
+        result.export_kwh += exported
+        result.cost += imported * price - exported * export
+        result.cost_self_consumption += base_in * price - base_out * export
+        result.cost_no_battery += max(net, 0.0) * price - max(-net, 0.0) * export
+        if peak:
+            result.peak_import_kwh += imported
+        result.max_import_w = max(result.max_import_w, imported / hours * 1000.0)
+        result.advice_hours[advice.code] = (
+            result.advice_hours.get(advice.code, 0.0) + hours
+        )
+
+    def _rows() -> Iterator[tuple[float, ...]]:
+        for chunk in chunks:
+            n = len(chunk[TIMESTAMP_COLUMN])
+            nan = [math.nan] * n
+            columns = [chunk[TIMESTAMP_COLUMN].tolist()]
+            columns += [
+                chunk[name].tolist() if name in chunk else nan for name in COLUMNS
+            ]
+            yield from zip(*columns)
+
+    pending: tuple[float, ...] | None = None
+    last_step = 0.0
+    for row in _rows():
+        if pending is not None:
+            step = row[0] - pending[0]
+            if step <= MAX_STEP_SECONDS:
+                last_step = step
+            _replay(pending, last_step)
+        pending = row
+    if pending is not None:
+        _replay(pending, last_step)
+    result.final_soc_pct = round(battery.soc_pct, 1) if result.rows else None
+    return result
+
+
+def _none(value: float) -> float | None:
+    return None if math.isnan(value) else value
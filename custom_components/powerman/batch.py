@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass, fields
+from datetime import time
+from typing import Any
+
+import numpy as np
+
+from .advisor import (
+    MIN_CONFIDENCE,
+    NIGHT_REVIEW_FACTOR,
+    NIGHT_SOLAR_W,
+    REVIEW_NEAR_RESERVE,
+    SOC_NEAR_MARGIN,
+    UNTRUSTED_PENALTY,
+    AdvisorInputs,
+)
+
+# Advice codes by their index in BatchAdvice.codes
+ADVICE_CODES: tuple[str, ...] = (
+    "do_nothing_normal_day",
+    "charge_battery_from_grid_now",
+    "plug_in_ev_now",
+)
+DO_NOTHING, CHARGE, PLUG_IN_EV = range(len(ADVICE_CODES))
+
+_US_PER_DAY = 86_400_000_000
+# Columns that must be one value for the whole batch
+_SCALAR_FIELDS = ("peak_start", "peak_end")
+
+
+@dataclass
+class BatchAdvice:
+    """Advice for every row of a batch."""
+
+    codes: np.ndarray  # index into ADVICE_CODES
+    confidence: np.ndarray
+    next_review_minutes: np.ndarray
+
+    def code_names(self) -> np.ndarray:
+        return np.asarray(ADVICE_CODES, dtype=object)[self.codes]
+
+
+def _col(columns: Mapping[str, Any], name: str, n: int) -> np.ndarray:
+    """Float column with None/missing mapped to NaN, broadcast to ``n`` rows."""
+    value = columns.get(name)
+    if value is None:
+        return np.full(n, np.nan)
+    arr = np.asarray(value)
+    if arr.dtype == object:
+        arr = np.array([np.nan if v is None else v for v in arr.ravel()], dtype=float)
+    return np.broadcast_to(arr.astype(float, copy=False), (n,))
+
+
+def _time_us(t: time) -> int:
+    return ((t.hour * 60 + t.minute) * 60 + t.second) * 1_000_000 + t.microsecond
+
+
+def _minutes_until(tod_us: np.ndarray, t: time) -> np.ndarray:
+    # Mirrors advisor._minutes_until: the target is at whole minutes
+    delta = (t.hour * 60 + t.minute) * 60_000_000 - tod_us
+    delta = np.where(delta <= 0, delta + _US_PER_DAY, delta)
+    return delta / 1e6 / 60.0
+
+
+def advise_batch(columns: Mapping[str, Any]) -> BatchAdvice:
+    """Evaluate advisor.make_advice over columns of inputs at once.
+
+    ``columns`` holds one array per AdvisorInputs field; NaN stands for None
+    and threshold fields may be scalars. ``now`` is an array of local wall
+    clock times (``datetime64``), ``peak_start``/``peak_end`` are single
+    ``time`` values for the whole batch. Nothing passed in is modified.
+    """
+    now = np.asarray(columns["now"], dtype="datetime64[us]")
+    n = len(now)
+    tod_us = (now - now.astype("datetime64[D]")).astype(np.int64)
+
+    bat = _col(columns, "battery_pct", n)
+    solar = _col(columns, "solar_w", n)
+    export = _col(columns, "export_w", n)
+    price = _col(columns, "price_now", n)
+    remaining = _col(columns, "solar_kwh_remaining_today", n)
+    projected = _col(columns, "projected_soc_at_peak", n)
+    to_price_change = _col(columns, "minutes_to_price_change", n)
+    reserve = _col(columns, "reserve_soc", n)
+    target = _col(columns, "target_soc", n)
+    cheap_price = _col(columns, "cheap_price", n)
+    high_price = _col(columns, "high_price", n)
+    review = _col(columns, "review_minutes", n)
+    untrusted = np.nan_to_num(_col(columns, "untrusted", n))
+    if columns.get("review_minutes") is None:
+        review = np.full(n, 10.0)
+    ev_enabled = np.broadcast_to(np.asarray(columns["ev_enabled"], dtype=bool), (n,))
+
+    start: time = columns["peak_start"]
+    end: time = columns["peak_end"]
+    start_us, end_us = _time_us(start), _time_us(end)
+    if start == end:
+        peak = np.ones(n, dtype=bool)
+    elif start < end:
+        peak = (tod_us >= start_us) & (tod_us < end_us)
+    else:
+        peak = (tod_us >= start_us) | (tod_us < end_us)
+
+    # NaN compares False, which matches the scalar "is not None and ..." tests
+    has_bat = ~np.isnan(bat)
+    codes = np.full(n, DO_NOTHING, dtype=np.int8)
+    conf = np.full(n, 0.5)
+
+    below = bat < reserve
+    cheap = below & (price <= cheap_price)
+    codes[cheap] = CHARGE
+    conf[cheap] = 0.85
+    before_peak = below & ~cheap & ~peak
+    codes[before_peak] = CHARGE
+    conf[before_peak] = 0.7
+
+    ev = ev_enabled & (bat >= target) & (export > 500)
+    codes[ev] = PLUG_IN_EV
+    conf[ev] = 0.8
+
+    hold = (price >= high_price) & (codes == CHARGE)
+    codes[hold] = DO_NOTHING
+    conf[hold] = 0.6
+
+    has_projection = ~np.isnan(projected) & has_bat
+    short = has_projection & (projected < reserve) & ~peak
+    low_solar = (
+        ~has_projection & (remaining < 1.0) & (bat < target) & ~peak
+    )
+    charge = short | low_solar
+    codes[charge] = CHARGE
+    conf[charge] = np.maximum(conf[charge], 0.75)
+
+    flagged = untrusted > 0
+    conf[flagged] = np.maximum(
+        MIN_CONFIDENCE, conf[flagged] - UNTRUSTED_PENALTY * untrusted[flagged]
+    )
+
+    next_event = np.minimum(_minutes_until(tod_us, start), _minutes_until(tod_us, end))
+    next_event = np.fmin(next_event, to_price_change)
+    near = np.abs(bat - reserve) <= SOC_NEAR_MARGIN
+    night = ~near & ~peak & (solar < NIGHT_SOLAR_W)
+    horizon = np.where(near, np.minimum(review, REVIEW_NEAR_RESERVE), review)
+    horizon = np.where(night, review * NIGHT_REVIEW_FACTOR, horizon)
+    minutes = np.maximum(1, np.ceil(np.minimum(horizon, next_event))).astype(np.int64)
+
+    return BatchAdvice(
+        codes=codes, confidence=np.round(conf, 2), next_review_minutes=minutes
+    )
+
+
+def columns_from_inputs(inputs: Sequence[AdvisorInputs]) -> dict[str, Any]:
+    """Turn scalar inputs into advise_batch columns (mainly for checks)."""
+    columns: dict[str, Any] = {}
+    for f in fields(AdvisorInputs):
+        values = [getattr(i, f.name) for i in inputs]
+        if f.name in _SCALAR_FIELDS:
+            if len(set(values)) > 1:
+                raise ValueError(f"{f.name} must be the same for every row")
+            columns[f.name] = values[0]
+        elif f.name == "now":
+            columns[f.name] = np.array(
+                [v.replace(tzinfo=None) for v in values], dtype="datetime64[us]"
+            )
+        elif f.name == "ev_enabled":
+            columns[f.name] = np.array(values, dtype=bool)
+        else:
+            columns[f.name] = np.array(
+                [np.nan if v is None else v for v in values], dtype=float
+            )
+    return columns
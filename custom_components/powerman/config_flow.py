@@ -1,4 +1,7 @@
 from __future__ import annotations
+import json
+import logging
+
 import voluptuous as vol
 
 from homeassistant import config_entries
@@ -11,6 +14,8 @@ from .const import (
     DEFAULT_NAME,
     DEFAULT_UPDATE_INTERVAL,
     CONF_UPDATE_INTERVAL,
+    CONF_PUSH_UPDATES,
+    DEFAULT_PUSH_UPDATES,
     CONF_BATTERY_ENTITY,
     CONF_SOLAR_POWER_ENTITY,
     CONF_SOLAR_ENERGY_TODAY_ENTITY,
@@ -24,24 +29,73 @@ from .const import (
     CONF_TARGET_SOC,
     CONF_CHEAP_PRICE,
     CONF_HIGH_PRICE,
+    CONF_FEED_IN_PRICE,
     CONF_PEAK_START,
     CONF_PEAK_END,
     CONF_EV_ENABLED,
     CONF_NOTIFY_CHANGE,
     CONF_ADVISOR_INTERVAL_MIN,
+    CONF_BACKFILL_DAYS,
+    CONF_STALE_MINUTES,
+    CONF_BATTERY_CAPACITY_KWH,
+    CONF_BATTERY_POWER_KW,
+    CONF_INSTRUMENTATION,
     CONF_AGENT_ID,
     CONF_MINUTES_BETWEEN_AI,
     DEFAULT_MINUTES_BETWEEN_AI,
+    CONF_AI_TIMEOUT,
+    DEFAULT_AI_TIMEOUT,
     DEFAULT_RESERVE_SOC,
     DEFAULT_TARGET_SOC,
     DEFAULT_CHEAP_PRICE,
     DEFAULT_HIGH_PRICE,
+    DEFAULT_FEED_IN_PRICE,
     DEFAULT_PEAK_START,
     DEFAULT_PEAK_END,
     DEFAULT_EV_ENABLED,
     DEFAULT_NOTIFY_CHANGE,
     DEFAULT_ADVISOR_INTERVAL_MIN,
+    DEFAULT_BACKFILL_DAYS,
+    DEFAULT_STALE_MINUTES,
+    DEFAULT_BATTERY_CAPACITY_KWH,
+    DEFAULT_BATTERY_POWER_KW,
+    DEFAULT_INSTRUMENTATION,
+    TUNING_FILE,
+    CONF_RULES,
 )
+from .rules import RuleError, parse_rules
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _tuning_suggestion(path: str) -> str:
+    """Describe the thresholds suggested by tools/tune.py, if any (blocking)."""
+    try:
+        with open(path, encoding="utf-8") as handle:
+            tuning = json.load(handle)
+        opts = tuning["options"]
+        return (
+            f"\n\nSuggested by the tuning tool ({tuning.get('generated', '?')}): "
+            f"cheap price {opts[CONF_CHEAP_PRICE]}, high price "
+            f"{opts[CONF_HIGH_PRICE]}, reserve {opts[CONF_RESERVE_SOC]} %, "
+            f"target {opts[CONF_TARGET_SOC]} % — backtested cost "
+            f"{tuning['cost']:.2f} vs {tuning['current_cost']:.2f}."
+        )
+    except FileNotFoundError:
+        return ""
+    except (OSError, ValueError, KeyError, TypeError) as exc:
+        _LOGGER.warning("PowerMan: ignoring unreadable %s: %s", path, exc)
+        return ""
+
+
+def _rules_errors(user_input: dict) -> dict[str, str]:
+    """Form errors for the advice rules text (compiled here to validate it)."""
+    try:
+        parse_rules(user_input.get(CONF_RULES))
+    except RuleError as exc:
+        _LOGGER.debug("PowerMan: rejected advice rules: %s", exc)
+        return {CONF_RULES: "invalid_rules"}
+    return {}
 
 
 def _user_schema(defaults: dict | None = None) -> vol.Schema:
@@ -53,6 +107,10 @@ def _user_schema(defaults: dict | None = None) -> vol.Schema:
                 CONF_UPDATE_INTERVAL,
                 default=d.get(CONF_UPDATE_INTERVAL, DEFAULT_UPDATE_INTERVAL),
             ): int,
+            vol.Optional(
+                CONF_PUSH_UPDATES,
+                default=d.get(CONF_PUSH_UPDATES, DEFAULT_PUSH_UPDATES),
+            ): selector.selector({"boolean": {}}),
             vol.Optional(
                 CONF_BATTERY_ENTITY,
                 default=d.get(CONF_BATTERY_ENTITY),
@@ -97,6 +155,16 @@ def _user_schema(defaults: dict | None = None) -> vol.Schema:
                 CONF_TARGET_SOC,
                 default=d.get(CONF_TARGET_SOC, DEFAULT_TARGET_SOC),
             ): int,
+            vol.Optional(
+                CONF_BATTERY_CAPACITY_KWH,
+                default=d.get(
+                    CONF_BATTERY_CAPACITY_KWH, DEFAULT_BATTERY_CAPACITY_KWH
+                ),
+            ): vol.Coerce(float),
+            vol.Optional(
+                CONF_BATTERY_POWER_KW,
+                default=d.get(CONF_BATTERY_POWER_KW, DEFAULT_BATTERY_POWER_KW),
+            ): vol.Coerce(float),
             vol.Optional(
                 CONF_CHEAP_PRICE,
                 default=d.get(CONF_CHEAP_PRICE, DEFAULT_CHEAP_PRICE),
@@ -105,6 +173,10 @@ def _user_schema(defaults: dict | None = None) -> vol.Schema:
                 CONF_HIGH_PRICE,
                 default=d.get(CONF_HIGH_PRICE, DEFAULT_HIGH_PRICE),
             ): float,
+            vol.Optional(
+                CONF_FEED_IN_PRICE,
+                default=d.get(CONF_FEED_IN_PRICE, DEFAULT_FEED_IN_PRICE),
+            ): vol.Coerce(float),
             vol.Optional(
                 CONF_PEAK_START,
                 default=d.get(CONF_PEAK_START, DEFAULT_PEAK_START),
@@ -125,11 +197,30 @@ def _user_schema(defaults: dict | None = None) -> vol.Schema:
                 CONF_ADVISOR_INTERVAL_MIN,
                 default=d.get(CONF_ADVISOR_INTERVAL_MIN, DEFAULT_ADVISOR_INTERVAL_MIN),
             ): int,
+            vol.Optional(
+                CONF_BACKFILL_DAYS,
+                default=d.get(CONF_BACKFILL_DAYS, DEFAULT_BACKFILL_DAYS),
+            ): int,
+            vol.Optional(
+                CONF_STALE_MINUTES,
+                default=d.get(CONF_STALE_MINUTES, DEFAULT_STALE_MINUTES),
+            ): int,
+            vol.Optional(
+                CONF_INSTRUMENTATION,
+                default=d.get(CONF_INSTRUMENTATION, DEFAULT_INSTRUMENTATION),
+            ): selector.selector({"boolean": {}}),
             vol.Optional(CONF_AGENT_ID, default=d.get(CONF_AGENT_ID, "")): str,
             vol.Optional(
                 CONF_MINUTES_BETWEEN_AI,
                 default=d.get(CONF_MINUTES_BETWEEN_AI, DEFAULT_MINUTES_BETWEEN_AI),
             ): int,
+            vol.Optional(
+                CONF_AI_TIMEOUT,
+                default=d.get(CONF_AI_TIMEOUT, DEFAULT_AI_TIMEOUT),
+            ): int,
+            vol.Optional(
+                CONF_RULES, default=d.get(CONF_RULES, "")
+            ): selector.selector({"text": {"multiline": True}}),
         }
     )
 
@@ -138,12 +229,16 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     VERSION = 1
 
     async def async_step_user(self, user_input=None) -> FlowResult:
-        if user_input is not None:
+        errors: dict[str, str] = {}
+        if user_input is not None and not (errors := _rules_errors(user_input)):
             title = user_input.get("name", DEFAULT_NAME)
             options = {
                 CONF_UPDATE_INTERVAL: int(
                     user_input.get(CONF_UPDATE_INTERVAL, DEFAULT_UPDATE_INTERVAL)
                 ),
+                CONF_PUSH_UPDATES: bool(
+                    user_input.get(CONF_PUSH_UPDATES, DEFAULT_PUSH_UPDATES)
+                ),
                 CONF_BATTERY_ENTITY: user_input.get(CONF_BATTERY_ENTITY),
                 CONF_SOLAR_POWER_ENTITY: user_input.get(CONF_SOLAR_POWER_ENTITY),
                 CONF_SOLAR_ENERGY_TODAY_ENTITY: user_input.get(
@@ -163,12 +258,23 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 CONF_TARGET_SOC: int(
                     user_input.get(CONF_TARGET_SOC, DEFAULT_TARGET_SOC)
                 ),
+                CONF_BATTERY_CAPACITY_KWH: float(
+                    user_input.get(
+                        CONF_BATTERY_CAPACITY_KWH, DEFAULT_BATTERY_CAPACITY_KWH
+                    )
+                ),
+                CONF_BATTERY_POWER_KW: float(
+                    user_input.get(CONF_BATTERY_POWER_KW, DEFAULT_BATTERY_POWER_KW)
+                ),
                 CONF_CHEAP_PRICE: float(
                     user_input.get(CONF_CHEAP_PRICE, DEFAULT_CHEAP_PRICE)
                 ),
                 CONF_HIGH_PRICE: float(
                     user_input.get(CONF_HIGH_PRICE, DEFAULT_HIGH_PRICE)
                 ),
+                CONF_FEED_IN_PRICE: float(
+                    user_input.get(CONF_FEED_IN_PRICE, DEFAULT_FEED_IN_PRICE)
+                ),
                 CONF_PEAK_START: user_input.get(CONF_PEAK_START, DEFAULT_PEAK_START),
                 CONF_PEAK_END: user_input.get(CONF_PEAK_END, DEFAULT_PEAK_END),
                 CONF_EV_ENABLED: bool(
@@ -182,16 +288,31 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                         CONF_ADVISOR_INTERVAL_MIN, DEFAULT_ADVISOR_INTERVAL_MIN
                     )
                 ),
+                CONF_BACKFILL_DAYS: int(
+                    user_input.get(CONF_BACKFILL_DAYS, DEFAULT_BACKFILL_DAYS)
+                ),
+                CONF_STALE_MINUTES: int(
+                    user_input.get(CONF_STALE_MINUTES, DEFAULT_STALE_MINUTES)
+                ),
+                CONF_INSTRUMENTATION: bool(
+                    user_input.get(CONF_INSTRUMENTATION, DEFAULT_INSTRUMENTATION)
+                ),
                 CONF_AGENT_ID: (user_input.get(CONF_AGENT_ID) or "").strip(),
                 CONF_MINUTES_BETWEEN_AI: int(
                     user_input.get(
                         CONF_MINUTES_BETWEEN_AI, DEFAULT_MINUTES_BETWEEN_AI
                     )
                 ),
+                CONF_AI_TIMEOUT: int(
+                    user_input.get(CONF_AI_TIMEOUT, DEFAULT_AI_TIMEOUT)
+                ),
+                CONF_RULES: user_input.get(CONF_RULES) or "",
             }
             return self.async_create_entry(title=title, data={}, options=options)
 
-        return self.async_show_form(step_id="user", data_schema=_user_schema())
+        return self.async_show_form(
+            step_id="user", data_schema=_user_schema(user_input), errors=errors
+        )
 
     @staticmethod
     @callback
@@ -205,10 +326,13 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
 
     async def async_step_init(self, user_input=None):
         opts = dict(self.config_entry.options)
-        if user_input is not None:
+        errors: dict[str, str] = {}
+        if user_input is not None and not (errors := _rules_errors(user_input)):
             new_opts = dict(opts)
             if CONF_UPDATE_INTERVAL in user_input:
                 new_opts[CONF_UPDATE_INTERVAL] = int(user_input[CONF_UPDATE_INTERVAL])
+            if CONF_PUSH_UPDATES in user_input:
+                new_opts[CONF_PUSH_UPDATES] = bool(user_input[CONF_PUSH_UPDATES])
             if CONF_BATTERY_ENTITY in user_input:
                 new_opts[CONF_BATTERY_ENTITY] = user_input[CONF_BATTERY_ENTITY]
             if CONF_SOLAR_POWER_ENTITY in user_input:
@@ -235,10 +359,20 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                 new_opts[CONF_RESERVE_SOC] = int(user_input[CONF_RESERVE_SOC])
             if CONF_TARGET_SOC in user_input:
                 new_opts[CONF_TARGET_SOC] = int(user_input[CONF_TARGET_SOC])
+            if CONF_BATTERY_CAPACITY_KWH in user_input:
+                new_opts[CONF_BATTERY_CAPACITY_KWH] = float(
+                    user_input[CONF_BATTERY_CAPACITY_KWH]
+                )
+            if CONF_BATTERY_POWER_KW in user_input:
+                new_opts[CONF_BATTERY_POWER_KW] = float(
+                    user_input[CONF_BATTERY_POWER_KW]
+                )
             if CONF_CHEAP_PRICE in user_input:
                 new_opts[CONF_CHEAP_PRICE] = float(user_input[CONF_CHEAP_PRICE])
             if CONF_HIGH_PRICE in user_input:
                 new_opts[CONF_HIGH_PRICE] = float(user_input[CONF_HIGH_PRICE])
+            if CONF_FEED_IN_PRICE in user_input:
+                new_opts[CONF_FEED_IN_PRICE] = float(user_input[CONF_FEED_IN_PRICE])
             if CONF_PEAK_START in user_input:
                 new_opts[CONF_PEAK_START] = user_input[CONF_PEAK_START]
             if CONF_PEAK_END in user_input:
@@ -251,12 +385,22 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                 new_opts[CONF_ADVISOR_INTERVAL_MIN] = int(
                     user_input[CONF_ADVISOR_INTERVAL_MIN]
                 )
+            if CONF_BACKFILL_DAYS in user_input:
+                new_opts[CONF_BACKFILL_DAYS] = int(user_input[CONF_BACKFILL_DAYS])
+            if CONF_STALE_MINUTES in user_input:
+                new_opts[CONF_STALE_MINUTES] = int(user_input[CONF_STALE_MINUTES])
+            if CONF_INSTRUMENTATION in user_input:
+                new_opts[CONF_INSTRUMENTATION] = bool(user_input[CONF_INSTRUMENTATION])
             if CONF_AGENT_ID in user_input:
                 new_opts[CONF_AGENT_ID] = (user_input[CONF_AGENT_ID] or "").strip()
             if CONF_MINUTES_BETWEEN_AI in user_input:
                 new_opts[CONF_MINUTES_BETWEEN_AI] = int(
                     user_input[CONF_MINUTES_BETWEEN_AI]
                 )
+            if CONF_AI_TIMEOUT in user_input:
+                new_opts[CONF_AI_TIMEOUT] = int(user_input[CONF_AI_TIMEOUT])
+            if CONF_RULES in user_input:
+                new_opts[CONF_RULES] = user_input[CONF_RULES] or ""
             if "name" in user_input:
                 new_opts["name"] = user_input["name"]
             return self.async_create_entry(title="", data=new_opts)
@@ -264,5 +408,14 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
         defaults = {
             "name": self.config_entry.title,
             **opts,
+            **(user_input or {}),
         }
-        return self.async_show_form(step_id="init", data_schema=_user_schema(defaults))
+        suggestion = await self.hass.async_add_executor_job(
+            _tuning_suggestion, self.hass.config.path(TUNING_FILE)
+        )
+        return self.async_show_form(
+            step_id="init",
+            data_schema=_user_schema(defaults),
+            description_placeholders={"suggestion": suggestion},
+            errors=errors,
+        )
@@ -1,9 +1,14 @@
 DOMAIN = "powerman"
 DEFAULT_NAME = "PowerMan"
 DEFAULT_UPDATE_INTERVAL = 30  # seconds
+PUSH_DEBOUNCE_SECONDS = 0.5  # coalesce bursts of source state changes
 
 # Options/Config keys
 CONF_UPDATE_INTERVAL = "update_interval"
+CONF_PUSH_UPDATES = "push_updates"
+DEFAULT_PUSH_UPDATES = True
+CONF_INSTRUMENTATION = "instrumentation"  # hot-path timings and diagnostic sensors
+DEFAULT_INSTRUMENTATION = False
 CONF_BATTERY_ENTITY = "battery_entity"
 CONF_SOLAR_POWER_ENTITY = "solar_power_entity"
 CONF_SOLAR_ENERGY_TODAY_ENTITY = "solar_energy_today_entity"
@@ -21,24 +26,60 @@ CONF_RESERVE_SOC = "reserve_soc_percent"
 CONF_TARGET_SOC = "target_soc_percent"
 CONF_CHEAP_PRICE = "cheap_price_threshold"
 CONF_HIGH_PRICE = "high_price_threshold"
+CONF_FEED_IN_PRICE = "feed_in_price"  # export tariff; 0 creates no revenue sensor
 CONF_PEAK_START = "peak_start"
 CONF_PEAK_END = "peak_end"
 CONF_EV_ENABLED = "ev_recommendation_enabled"
 CONF_NOTIFY_CHANGE = "notify_on_change"
 CONF_ADVISOR_INTERVAL_MIN = "advisor_interval_minutes"
+CONF_BATTERY_CAPACITY_KWH = "battery_capacity_kwh"
 DEFAULT_RESERVE_SOC = 30
 DEFAULT_TARGET_SOC = 80
 DEFAULT_CHEAP_PRICE = 0.15
 DEFAULT_HIGH_PRICE = 0.30
+DEFAULT_FEED_IN_PRICE = 0.0
 DEFAULT_PEAK_START = "15:00"
 DEFAULT_PEAK_END = "21:00"
 DEFAULT_EV_ENABLED = True
 DEFAULT_NOTIFY_CHANGE = True
 DEFAULT_ADVISOR_INTERVAL_MIN = 10
+DEFAULT_BATTERY_CAPACITY_KWH = 10.0
+CONF_BATTERY_POWER_KW = "battery_max_power_kw"
+DEFAULT_BATTERY_POWER_KW = 5.0
+
+# Battery schedule optimizer
+PLAN_STEP_SECONDS = 900  # 15-minute slots
+PLAN_HORIZON_SLOTS = 192  # 48 h
+
+# History backfill from the recorder's 5-minute statistics (0 disables)
+CONF_BACKFILL_DAYS = "history_backfill_days"
+DEFAULT_BACKFILL_DAYS = 3
+MAX_BACKFILL_DAYS = 10  # recorder keeps short-term statistics for 10 days
+
+# Source readings not updated for this long are treated as untrusted (0 disables)
+CONF_STALE_MINUTES = "stale_after_minutes"
+DEFAULT_STALE_MINUTES = 30
+
+# Suggested thresholds written by tools/tune.py into the HA config directory
+TUNING_FILE = "powerman_tuning.json"
+
+# User advice rules: YAML text in the options, else this file in the config dir
+CONF_RULES = "rules"
+RULES_FILE = "powerman_rules.yaml"
 
 # AI options
 CONF_AGENT_ID = "agent_id"  # conversation agent id (from Google Gemini conversation)
 CONF_MINUTES_BETWEEN_AI = "min_minutes_between_ai"  # rate limit in minutes
 DEFAULT_MINUTES_BETWEEN_AI = 180  # 3 hours
+CONF_AI_TIMEOUT = "ai_timeout_seconds"  # give up on the agent after this
+DEFAULT_AI_TIMEOUT = 60
 
 DEVICE_ID = "powerman_hub"
+
+# hass.data[DOMAIN] key of the shared engine (entries are keyed by entry_id)
+DATA_ENGINE = "engine"
+
+# Persistence (per entry, via homeassistant.helpers.storage)
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 300  # seconds; at most one save per window
+STORAGE_HISTORY_SPACING = 60  # seconds between history rows kept on disk
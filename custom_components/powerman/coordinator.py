@@ -1,43 +1,54 @@
 from __future__ import annotations
 import asyncio
 import logging
-from datetime import datetime, timedelta
+import math
+from functools import partial
+from datetime import datetime, time, timedelta
 from typing import Any
 
-from homeassistant.core import HomeAssistant, State
+from homeassistant.core import HomeAssistant, State, callback
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
 from homeassistant.util import dt as dt_util
 
-from .advisor import AdvisorInputs, make_advice
-from .const import (
-    CONF_BATTERY_ENTITY,
-    CONF_CHEAP_PRICE,
-    CONF_EV_ENABLED,
-    CONF_GRID_EXPORT_ENTITY,
-    CONF_GRID_IMPORT_ENTITY,
-    CONF_HIGH_PRICE,
-    CONF_LOAD_POWER_ENTITY,
-    CONF_PEAK_END,
-    CONF_PEAK_START,
-    CONF_PRICE_NEXT_ENTITY,
-    CONF_PRICE_NOW_ENTITY,
-    CONF_RESERVE_SOC,
-    CONF_SOLAR_ENERGY_TODAY_ENTITY,
-    CONF_SOLAR_FORECAST_REMAINING_ENTITY,
-    CONF_SOLAR_POWER_ENTITY,
-    CONF_TARGET_SOC,
-    DEFAULT_CHEAP_PRICE,
-    DEFAULT_EV_ENABLED,
-    DEFAULT_HIGH_PRICE,
-    DEFAULT_PEAK_END,
-    DEFAULT_PEAK_START,
-    DEFAULT_RESERVE_SOC,
-    DEFAULT_TARGET_SOC,
-)
+from .advisor import Advice, AdvisorInputs, _minutes_until, make_advice
+from .const import PLAN_HORIZON_SLOTS, PLAN_STEP_SECONDS
+from .digest import DailyDigest
+from .energy import EnergyMeter, PowerIntegrator
+from .forecast import EnergyForecast, build_forecast, projected_soc, slot_energy
+from .history import SampleBuffer
+from .optimizer import Schedule, optimize
+from .options import CompiledOptions
+from .prices import PriceSeries
+from .profile import BucketSeries
+from .quality import QualityFilter, fill_gaps, normalize
+from .rules import RuleSet
+from .stats import Stats
 
 _LOGGER = logging.getLogger(__name__)
 
 
+# Data keys the advisor reads; quality issues elsewhere don't lower confidence
+ADVISOR_KEYS = frozenset(
+    {
+        "battery_percent",
+        "solar_power_w",
+        "house_load_w",
+        "grid_import_w",
+        "grid_export_w",
+        "price_now",
+        "price_next",
+        "solar_remaining_kwh",
+    }
+)
+
+
+def _next_start(now: datetime, start: time) -> datetime:
+    candidate = now.replace(
+        hour=start.hour, minute=start.minute, second=0, microsecond=0
+    )
+    return candidate if candidate > now else candidate + timedelta(days=1)
+
+
 def _as_float(state: State | None) -> float | None:
     if state is None:
         return None
@@ -49,73 +60,340 @@ def _as_float(state: State | None) -> float | None:
 
 
 class PowerManCoordinator(DataUpdateCoordinator[dict[str, Any]]):
-    """Coordinator that reads selected entity states each interval."""
+    """Coordinator that reads the selected entity states of one entry.
+
+    It has no timer of its own: the shared PowerManEngine triggers polling
+    refreshes and, in push mode, routes ``state_changed`` events for the
+    mapped entities so only the sources that changed are re-read.
+    """
 
     def __init__(
-        self, hass: HomeAssistant, update_interval: timedelta, entry_options: dict
+        self,
+        hass: HomeAssistant,
+        options: CompiledOptions,
     ) -> None:
         super().__init__(
             hass,
             _LOGGER,
             name="PowerMan coordinator",
-            update_interval=update_interval,
+            update_interval=None,
         )
-        self._opt = entry_options
+        self.options = options
+        self.history = SampleBuffer()
+        self.digest = DailyDigest()
+        self.energy = EnergyMeter()
+        self.integrator = PowerIntegrator()
+        self.quality = QualityFilter()
+        # 5-minute profile from the recorder; None until the backfill is done
+        self.profile: BucketSeries | None = None
+        self.forecast: EnergyForecast | None = None
+        self._forecast_key: tuple | None = None
+        self.prices: PriceSeries | None = None
+        self._prices_key: tuple | None = None
+        # Cheapest slots before the next peak covering a charge to target
+        self._charge_window: list[dict[str, Any]] | None = None
+        self._charge_window_key: tuple | None = None
+        self.schedule: Schedule | None = None
+        self._plan_key: tuple | None = None
+        self._plan_task: asyncio.Task | None = None
+        self._refresh_task: asyncio.Task | None = None
+        self.rules = RuleSet()  # set from the options or rules file at setup
+        self.stats = Stats(options.instrumentation)
+        # Last AI answer (key, text, agent_id, timestamp, error), set by the engine
+        self.insight: dict[str, Any] | None = None
+        self._last_advice: Advice | None = None
+        self._last_advice_dict: dict[str, Any] | None = None
+        # Minutes until the advice wants re-evaluating, from the last run
+        self.review_minutes: int | None = None
+
+    # ---- Push mode ----
+    @callback
+    def async_update_options(self, options: CompiledOptions) -> None:
+        """Swap in new entry options; the engine re-routes state events."""
+        self.options = options
+        if self.stats.enabled and not options.instrumentation:
+            self.stats.reset()
+        self.stats.enabled = options.instrumentation
+
+    @callback
+    def async_apply_changes(self, entity_ids: set[str]) -> None:
+        """Re-read only the given sources (routed here by the engine)."""
+        entity_keys = self.options.entity_keys
+        data = dict(self.data or {})
+        for data_key in data.get("gap_filled", ()):
+            data[data_key] = None  # bridged again below while within its hold
+        if rejected := self.quality.rejected:
+            # Give a rejected spike its confirming second read
+            entity_ids = entity_ids | {
+                e for e, k in entity_keys.items() if k in rejected
+            }
+        for entity_id in entity_ids:
+            data_key = entity_keys.get(entity_id)
+            if data_key is not None:
+                data[data_key] = self._read(data_key, self.hass.states.get(entity_id))
+        self._process(data)
+        self.async_set_updated_data(data)
+
+    # ---- Single-flight refresh ----
+    async def async_refresh_data(self) -> dict[str, Any]:
+        """Refresh now and return the data that refresh produced.
+
+        Callers arriving while a refresh is running share it instead of
+        starting another one.
+        """
+        if self._refresh_task is None:
+            self._refresh_task = self.hass.async_create_task(
+                self._async_refresh_once()
+            )
+        return await asyncio.shield(self._refresh_task)
 
-    def _get(self, key: str) -> str | None:
-        return self._opt.get(key) or None
+    async def _async_refresh_once(self) -> dict[str, Any]:
+        try:
+            await self.async_refresh()
+            return self.data or {}
+        finally:
+            self._refresh_task = None
 
+    # ---- Polling ----
     async def _async_update_data(self) -> dict[str, Any]:
         # Very light I/O: just read states; tiny sleep to yield.
         await asyncio.sleep(0)
         data: dict[str, Any] = {}
 
-        if self._get(CONF_BATTERY_ENTITY):
-            data["battery_percent"] = _as_float(
-                self.hass.states.get(self._get(CONF_BATTERY_ENTITY))
-            )
-        if self._get(CONF_SOLAR_POWER_ENTITY):
-            data["solar_power_w"] = _as_float(
-                self.hass.states.get(self._get(CONF_SOLAR_POWER_ENTITY))
-            )
-        if self._get(CONF_SOLAR_ENERGY_TODAY_ENTITY):
-            data["solar_energy_today_kwh"] = _as_float(
-                self.hass.states.get(self._get(CONF_SOLAR_ENERGY_TODAY_ENTITY))
-            )
+        states = self.hass.states
+        for data_key, entity_id in self.options.sources:
+            data[data_key] = self._read(data_key, states.get(entity_id))
 
-        if self._get(CONF_GRID_IMPORT_ENTITY):
-            data["grid_import_w"] = _as_float(
-                self.hass.states.get(self._get(CONF_GRID_IMPORT_ENTITY))
-            )
-        if self._get(CONF_GRID_EXPORT_ENTITY):
-            data["grid_export_w"] = _as_float(
-                self.hass.states.get(self._get(CONF_GRID_EXPORT_ENTITY))
-            )
-        if self._get(CONF_LOAD_POWER_ENTITY):
-            data["house_load_w"] = _as_float(
-                self.hass.states.get(self._get(CONF_LOAD_POWER_ENTITY))
-            )
-        if self._get(CONF_PRICE_NOW_ENTITY):
-            data["price_now"] = _as_float(
-                self.hass.states.get(self._get(CONF_PRICE_NOW_ENTITY))
-            )
-        if self._get(CONF_PRICE_NEXT_ENTITY):
-            data["price_next"] = _as_float(
-                self.hass.states.get(self._get(CONF_PRICE_NEXT_ENTITY))
+        self._process(data)
+        return data
+
+    def _read(self, data_key: str, state: State | None) -> float | None:
+        """A source's value in the data key's unit, or None if unusable."""
+        value = _as_float(state)
+        if value is None:
+            self.quality.forget(data_key)
+            return None
+        value = normalize(
+            data_key, value, state.attributes.get("unit_of_measurement")
+        )
+        return self.quality.screen(data_key, value, self.history)
+
+    def _reported(self) -> dict[str, float]:
+        """When each available source entity last reported a state (epoch)."""
+        states = self.hass.states
+        out: dict[str, float] = {}
+        for data_key, entity_id in self.options.sources:
+            state = states.get(entity_id)
+            if state is None or _as_float(state) is None:
+                continue  # unavailable sources are bridged, not stale
+            updated = getattr(state, "last_reported", None) or state.last_updated
+            out[data_key] = updated.timestamp()
+        return out
+
+    def _process(self, data: dict[str, Any]) -> None:
+        """Record a fresh snapshot in the history and derive the advice."""
+        with self.stats.timer("tick"):
+            self._process_snapshot(data)
+
+    def _process_snapshot(self, data: dict[str, Any]) -> None:
+        now = dt_util.now()
+        series = self._price_series()
+        next_mapped = "price_next" in self.options.entity_keys.values()
+        if series is not None and not next_mapped:
+            # No next-hour entity mapped: take it from the price slots
+            data["price_next"] = series.price_at(now.timestamp() + 3600)
+        issues = self.quality.issues(
+            now.timestamp(), self._reported(), self.options.stale_after
+        )
+        if issues:
+            data["quality"] = issues
+        else:
+            data.pop("quality", None)
+        self.history.append(now.timestamp(), data)
+        # The history keeps the gaps; everything downstream sees bridged values
+        filled = fill_gaps(
+            data, self.options.entity_keys.values(), self.history, now.timestamp()
+        )
+        if filled:
+            data["gap_filled"] = filled
+        else:
+            data.pop("gap_filled", None)
+        # Integrated once for both the energy totals and the digest
+        wh = self.integrator.add(now.timestamp(), data)
+        self.digest.add(now, data, wh)
+        self.energy.add(
+            now,
+            data,
+            wh,
+            self.options.battery_capacity_kwh,
+            self.options.feed_in_price,
+        )
+        if self.profile is not None:
+            self.profile.add(now.timestamp(), data)
+        charge_window = self._cheapest_charge_window(now, data.get("battery_percent"))
+        if charge_window:
+            data["charge_window"] = charge_window
+        else:
+            data.pop("charge_window", None)
+        self._compute_advice(data, now)
+        self.digest.add_advice(now, (data.get("advice") or {}).get("code"))
+        self._maybe_plan(now, data)
+
+    def _update_forecast(
+        self, now: datetime, solar_remaining: float | None
+    ) -> EnergyForecast | None:
+        """Rebuild the forecast when the profile grid or remaining solar moves."""
+        if self.profile is None:
+            self.forecast = self._forecast_key = None
+            return None
+        key = (
+            self.profile.end_ts,
+            None if solar_remaining is None else round(solar_remaining, 1),
+        )
+        if key != self._forecast_key:
+            offset = now.utcoffset()
+            self.forecast = build_forecast(
+                self.profile,
+                now.timestamp(),
+                offset.total_seconds() if offset else 0.0,
+                solar_remaining,
             )
-        if self._get(CONF_SOLAR_FORECAST_REMAINING_ENTITY):
-            data["solar_remaining_kwh"] = _as_float(
-                self.hass.states.get(self._get(CONF_SOLAR_FORECAST_REMAINING_ENTITY))
+            self._forecast_key = key
+        return self.forecast
+
+    def _price_series(self) -> PriceSeries | None:
+        """Slots parsed from the price entity, re-parsed only when it changes."""
+        entity_id = next(
+            (e for key, e in self.options.sources if key == "price_now"), None
+        )
+        state = self.hass.states.get(entity_id) if entity_id else None
+        if state is None:
+            self.prices = self._prices_key = None
+            return None
+        key = (entity_id, state.last_updated)
+        if key != self._prices_key:
+            self.prices = PriceSeries.from_attributes(
+                state.attributes, dt_util.parse_datetime
             )
+            self._prices_key = key
+        return self.prices
+
+    def _cheapest_charge_window(
+        self, now: datetime, soc: float | None
+    ) -> list[dict[str, Any]] | None:
+        """Cheapest price slots before the next peak for charging to target.
+
+        The slots cover the time to charge from ``soc`` to the target SoC at
+        full battery power. Recomputed only when the prices, the current slot, the peak or the
+        charge time (in quarter hours) change; otherwise the same list is
+        returned.
+        """
+        opt = self.options
+        series = self.prices
+        if series is None or soc is None or opt.battery_power_kw <= 0:
+            self._charge_window = self._charge_window_key = None
+            return None
+        kwh = max(0.0, opt.target_soc - soc) / 100.0 * opt.battery_capacity_kwh
+        hours = math.ceil(kwh / opt.battery_power_kw * 4.0) / 4.0
+        now_ts = now.timestamp()
+        peak_ts = round(now_ts + _minutes_until(now, opt.peak_start) * 60.0)
+        key = (self._prices_key, series.next_change(now_ts), peak_ts, hours)
+        if key != self._charge_window_key:
+            self._charge_window_key = key
+            self._charge_window = [
+                {
+                    "start": dt_util.utc_from_timestamp(start).isoformat(),
+                    "end": dt_util.utc_from_timestamp(end).isoformat(),
+                    "price": price,
+                }
+                for start, end, price in series.cheapest(hours, now_ts, peak_ts)
+            ]
+        return self._charge_window
 
+    @callback
+    def _maybe_plan(self, now: datetime, data: dict[str, Any]) -> None:
+        """Re-run the schedule optimizer when its inputs moved."""
+        soc = data.get("battery_percent")
+        if self.forecast is None or soc is None:
+            self.schedule = self._plan_key = None
+            return
+        if self._plan_task is not None:
+            return
+        start_ts = now.timestamp() // PLAN_STEP_SECONDS * PLAN_STEP_SECONDS
+        series = self.prices
+        prices = (
+            series.slots(start_ts, PLAN_STEP_SECONDS, PLAN_HORIZON_SLOTS)
+            if series is not None
+            else None
+        )
+        if prices is None:
+            self.schedule = self._plan_key = None
+            return
+        key = (
+            start_ts,
+            self._forecast_key,
+            round(soc),
+            prices.tobytes(),
+            self.options.feed_in_price,
+        )
+        if key == self._plan_key:
+            return
+        self._plan_key = key
+        load, solar = slot_energy(
+            self.forecast, start_ts, PLAN_STEP_SECONDS, len(prices)
+        )
+        job = partial(
+            optimize,
+            prices,
+            load,
+            solar,
+            start_ts=start_ts,
+            step_seconds=PLAN_STEP_SECONDS,
+            capacity_kwh=self.options.battery_capacity_kwh,
+            soc_pct=soc,
+            min_soc_pct=self.options.reserve_soc,
+            max_power_kw=self.options.battery_power_kw,
+            export_prices=self.options.feed_in_price,
+        )
+        self._plan_task = self.hass.async_create_task(self._async_plan(job))
+
+    async def _async_plan(self, job: partial) -> None:
         try:
-            now = dt_util.now()
-            ps = datetime.strptime(
-                self._opt.get(CONF_PEAK_START, DEFAULT_PEAK_START), "%H:%M"
-            ).time()
-            pe = datetime.strptime(
-                self._opt.get(CONF_PEAK_END, DEFAULT_PEAK_END), "%H:%M"
-            ).time()
+            with self.stats.timer("plan"):
+                self.schedule = await self.hass.async_add_executor_job(job)
+        except Exception as exc:  # noqa: BLE001
+            _LOGGER.exception("Schedule optimizer failed: %s", exc)
+        finally:
+            self._plan_task = None
+        self.async_update_listeners()
+
+    def _minutes_to_price_change(self, now: datetime) -> float | None:
+        if self.prices is None:
+            return None
+        change = self.prices.next_change(now.timestamp())
+        return None if change is None else (change - now.timestamp()) / 60.0
+
+    def _compute_advice(self, data: dict[str, Any], now: datetime) -> None:
+        try:
+            opt = self.options
+            projected: float | None = None
+            forecast = self._update_forecast(now, data.get("solar_remaining_kwh"))
+            if forecast is not None:
+                info: dict[str, Any] = {
+                    "net_kwh_24h": round(forecast.net_kwh(), 2),
+                    "clearness": round(forecast.clearness, 2),
+                }
+                if data.get("battery_percent") is not None:
+                    projected = projected_soc(
+                        forecast,
+                        data["battery_percent"],
+                        opt.battery_capacity_kwh,
+                        _next_start(now, opt.peak_start).timestamp(),
+                    )
+                    info["projected_soc_at_peak"] = round(projected, 1)
+                data["forecast"] = info
+            else:
+                data.pop("forecast", None)
             inputs = AdvisorInputs(
                 now=now,
                 battery_pct=data.get("battery_percent"),
@@ -126,24 +404,36 @@ class PowerManCoordinator(DataUpdateCoordinator[dict[str, Any]]):
                 price_now=data.get("price_now"),
                 price_next=data.get("price_next"),
                 solar_kwh_remaining_today=data.get("solar_remaining_kwh"),
-                reserve_soc=int(self._opt.get(CONF_RESERVE_SOC, DEFAULT_RESERVE_SOC)),
-                target_soc=int(self._opt.get(CONF_TARGET_SOC, DEFAULT_TARGET_SOC)),
-                cheap_price=float(self._opt.get(CONF_CHEAP_PRICE, DEFAULT_CHEAP_PRICE)),
-                high_price=float(self._opt.get(CONF_HIGH_PRICE, DEFAULT_HIGH_PRICE)),
-                peak_start=ps,
-                peak_end=pe,
-                ev_enabled=bool(self._opt.get(CONF_EV_ENABLED, DEFAULT_EV_ENABLED)),
+                reserve_soc=opt.reserve_soc,
+                target_soc=opt.target_soc,
+                cheap_price=opt.cheap_price,
+                high_price=opt.high_price,
+                peak_start=opt.peak_start,
+                peak_end=opt.peak_end,
+                ev_enabled=opt.ev_enabled,
+                projected_soc_at_peak=projected,
+                minutes_to_price_change=self._minutes_to_price_change(now),
+                review_minutes=opt.advisor_interval_min,
+                untrusted=sum(
+                    1 for key in data.get("quality", ()) if key in ADVISOR_KEYS
+                ),
             )
-            advice = make_advice(inputs)
-            data["advice"] = {
+            with self.stats.timer("advisor"):
+                advice = self.rules.apply(inputs, make_advice(inputs))
+            self.review_minutes = advice.next_review_minutes
+            if advice == self._last_advice:
+                # Nothing material changed (the review horizon is not part of
+                # the comparison): keep the same dict (and timestamp) so
+                # listeners see no attribute churn.
+                data["advice"] = self._last_advice_dict
+                return
+            data["advice"] = self._last_advice_dict = {
                 "code": advice.code,
                 "title": advice.title,
                 "confidence": advice.confidence,
                 "reasons": advice.reasons,
-                "next_review_minutes": advice.next_review_minutes,
                 "timestamp": now.isoformat(),
             }
+            self._last_advice = advice
         except Exception as exc:  # noqa: BLE001
             _LOGGER.exception("Advisor failed: %s", exc)
-
-        return data
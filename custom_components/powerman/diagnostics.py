@@ -0,0 +1,28 @@
+from __future__ import annotations
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN, CONF_AGENT_ID, DATA_ENGINE
+from .coordinator import PowerManCoordinator
+
+TO_REDACT = {CONF_AGENT_ID}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    store = hass.data[DOMAIN][entry.entry_id]
+    coordinator: PowerManCoordinator = store["coordinator"]
+    return {
+        "options": async_redact_data(dict(entry.options), TO_REDACT),
+        "data": coordinator.data,
+        "stats": coordinator.stats.as_dict(),
+        "notifications": hass.data[DOMAIN][DATA_ENGINE].notifications.diagnostics(),
+        "history": {
+            "samples": len(coordinator.history),
+            "capacity": coordinator.history.capacity,
+        },
+    }
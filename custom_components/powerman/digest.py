@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from array import array
+from collections import deque
+from collections.abc import Mapping
+from datetime import date, datetime
+from typing import Any
+
+from .energy import PowerIntegrator
+from .history import SampleBuffer
+
+# Power metrics integrated into hourly energy buckets, with their prompt labels
+ENERGY_METRICS: tuple[tuple[str, str], ...] = (
+    ("solar_power_w", "solar"),
+    ("house_load_w", "load"),
+    ("grid_import_w", "import"),
+    ("grid_export_w", "export"),
+)
+LABELS = dict(ENERGY_METRICS)
+PEAK_METRICS = ("solar_power_w", "house_load_w", "grid_import_w")
+MAX_CHANGES = 8  # most recent advice changes kept for the prompt
+
+
+class DailyDigest:
+    """Fixed-size running summary of today's samples for the AI prompt.
+
+    Each sample adds its integrated energy (a PowerIntegrator step) to the
+    bucket of its hour and updates the peaks and battery range, so ``add``
+    is O(1) and the state never grows past 24 buckets per metric plus
+    MAX_CHANGES advice changes. Everything resets at local midnight.
+    """
+
+    def __init__(self) -> None:
+        self._reset(None)
+
+    def _reset(self, day: date | None) -> None:
+        self.day = day
+        self.samples = 0
+        self._wh = {m: array("d", bytes(8 * 24)) for m, _ in ENERGY_METRICS}
+        self.peaks: dict[str, tuple[float, datetime]] = {}
+        self.soc_min: float | None = None
+        self.soc_max: float | None = None
+        self.soc_last: float | None = None
+        self.changes: deque[tuple[datetime, str]] = deque(maxlen=MAX_CHANGES)
+        self.change_count = 0
+        self._last_code: str | None = None
+        self._rendered: tuple[tuple[int, int], str] | None = None
+
+    def add(
+        self, now: datetime, sample: dict[str, Any], wh: Mapping[str, float]
+    ) -> None:
+        day = now.date()
+        if day != self.day:
+            last_code = self._last_code
+            self._reset(day)
+            self._last_code = last_code
+        hour = now.hour
+        self.samples += 1
+        for metric, value in wh.items():
+            self._wh[metric][hour] += value
+        for metric in PEAK_METRICS:
+            value = sample.get(metric)
+            peak = self.peaks.get(metric)
+            if value is not None and (peak is None or value > peak[0]):
+                self.peaks[metric] = (value, now)
+        soc = sample.get("battery_percent")
+        if soc is not None:
+            self.soc_last = soc
+            self.soc_min = soc if self.soc_min is None else min(self.soc_min, soc)
+            self.soc_max = soc if self.soc_max is None else max(self.soc_max, soc)
+
+    def add_advice(self, now: datetime, code: str | None) -> None:
+        if code and code != self._last_code:
+            if self._last_code is not None and now.date() == self.day:
+                self.changes.append((now, code))
+                self.change_count += 1
+            self._last_code = code
+
+    def rebuild(self, history: SampleBuffer, now: datetime) -> None:
+        """Replay today's rows from the sample history, e.g. after a restart."""
+        self._reset(now.date())
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        integrator = PowerIntegrator()
+        for ts, sample in history.rows(midnight.timestamp()):
+            at = datetime.fromtimestamp(ts, now.tzinfo)
+            self.add(at, sample, integrator.add(ts, sample))
+
+    def total_kwh(self, metric: str) -> float:
+        return sum(self._wh[metric]) / 1000.0
+
+    def render(self) -> str:
+        """Compact text for the prompt; at most 24 hourly rows.
+
+        Cached until the next sample or advice change.
+        """
+        version = (self.samples, self.change_count)
+        if self._rendered is not None and self._rendered[0] == version:
+            return self._rendered[1]
+        text = self._render()
+        self._rendered = (version, text)
+        return text
+
+    def _render(self) -> str:
+        if not self.samples:
+            return "No samples recorded today yet."
+        lines = [
+            "Today so far (kWh): "
+            + ", ".join(
+                f"{label} {self.total_kwh(metric):.1f}"
+                for metric, label in ENERGY_METRICS
+            )
+        ]
+        if self.soc_last is not None:
+            lines.append(
+                f"Battery: {self.soc_min:.0f}-{self.soc_max:.0f} %, now {self.soc_last:.0f} %"
+            )
+        if self.peaks:
+            lines.append(
+                "Peaks: "
+                + ", ".join(
+                    f"{LABELS[m]} {v / 1000.0:.1f} kW at {at:%H:%M}"
+                    for m, (v, at) in self.peaks.items()
+                )
+            )
+        rows = []
+        for hour in range(24):
+            values = [self._wh[metric][hour] for metric, _ in ENERGY_METRICS]
+            if any(values):
+                rows.append(
+                    f"{hour:02d} " + "/".join(f"{v / 1000.0:.1f}" for v in values)
+                )
+        if rows:
+            lines.append(f"Hourly kWh (hour {'/'.join(LABELS.values())}):")
+            lines.extend(rows)
+        if self.change_count:
+            shown = ", ".join(f"{at:%H:%M} {code}" for at, code in self.changes)
+            more = self.change_count - len(self.changes)
+            lines.append(
+                f"Advice changes ({self.change_count}): {shown}"
+                + (f" (+{more} earlier)" if more > 0 else "")
+            )
+        return "\n".join(lines)
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+from datetime import date, datetime
+from typing import Any
+
+MAX_GAP_SECONDS = 900  # longer gaps between readings are not integrated
+
+# Power readings integrated to energy: data key -> total name
+ENERGY_SOURCES: tuple[tuple[str, str], ...] = (
+    ("grid_import_w", "imported_kwh"),
+    ("grid_export_w", "exported_kwh"),
+    ("solar_power_w", "solar_kwh"),
+    ("house_load_w", "load_kwh"),
+)
+TOTALS = tuple(name for _, name in ENERGY_SOURCES) + (
+    "cost",
+    "revenue",
+    "battery_throughput_kwh",
+)
+
+
+class PowerIntegrator:
+    """Trapezoid-rule energy of each power reading between samples.
+
+    ``add`` returns the Wh of every power key since its previous reading;
+    keys without a reading, or whose previous one is more than
+    MAX_GAP_SECONDS old, are left out. The coordinator integrates each
+    sample once and feeds the result to the energy meter and the digest.
+    """
+
+    def __init__(self) -> None:
+        self._prev: dict[str, tuple[float, float]] = {}
+
+    def add(self, ts: float, sample: Mapping[str, Any]) -> dict[str, float]:
+        out: dict[str, float] = {}
+        for key, _ in ENERGY_SOURCES:
+            value = sample.get(key)
+            if value is None:
+                continue
+            prev = self._prev.get(key)
+            if prev is not None and 0 < ts - prev[0] <= MAX_GAP_SECONDS:
+                out[key] = (ts - prev[0]) * (prev[1] + value) / 7200.0
+            self._prev[key] = (ts, value)
+        return out
+
+
+class EnergyMeter:
+    """Today's energy totals from the integrated sample stream.
+
+    Import cost weights each segment by the price at its start, export
+    revenue uses the configured feed-in price, and battery throughput adds
+    up |dSoC| times the usable capacity. Each sample is O(1); the totals
+    reset at local midnight.
+    """
+
+    def __init__(self) -> None:
+        self._reset(None)
+
+    def _reset(self, day: date | None) -> None:
+        self.day = day
+        self.totals: dict[str, float] = dict.fromkeys(TOTALS, 0.0)
+        self._price: float | None = None
+        self._soc: float | None = None
+
+    def add(
+        self,
+        now: datetime,
+        sample: Mapping[str, Any],
+        wh: Mapping[str, float],
+        capacity_kwh: float,
+        feed_in_price: float,
+    ) -> None:
+        """Add one sample; ``wh`` is its PowerIntegrator step."""
+        if now.date() != self.day:
+            self._reset(now.date())
+        totals = self.totals
+        for key, name in ENERGY_SOURCES:
+            if key in wh:
+                totals[name] += wh[key] / 1000.0
+        if self._price is not None and "grid_import_w" in wh:
+            totals["cost"] += wh["grid_import_w"] / 1000.0 * self._price
+        if "grid_export_w" in wh:
+            totals["revenue"] += wh["grid_export_w"] / 1000.0 * feed_in_price
+        self._price = sample.get("price_now")
+        soc = sample.get("battery_percent")
+        if soc is not None:
+            if self._soc is not None:
+                totals["battery_throughput_kwh"] += (
+                    abs(soc - self._soc) * capacity_kwh / 100.0
+                )
+            self._soc = soc
+
+    def self_consumption(self) -> float | None:
+        """Share of today's solar energy used on site (0..1)."""
+        solar = self.totals["solar_kwh"]
+        if solar <= 0:
+            return None
+        return max(0.0, min(1.0, (solar - self.totals["exported_kwh"]) / solar))
+
+    def self_sufficiency(self) -> float | None:
+        """Share of today's load not drawn from the grid (0..1)."""
+        load = self.totals["load_kwh"]
+        if load <= 0:
+            return None
+        return max(0.0, min(1.0, (load - self.totals["imported_kwh"]) / load))
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "day": self.day.isoformat() if self.day else None,
+            "totals": dict(self.totals),
+        }
+
+    def load_dict(self, raw: Mapping[str, Any], today: date) -> None:
+        """Restore totals saved earlier today; other days are discarded."""
+        if raw.get("day") != today.isoformat():
+            return
+        self._reset(today)
+        for name, value in (raw.get("totals") or {}).items():
+            if name in self.totals:
+                self.totals[name] = float(value)
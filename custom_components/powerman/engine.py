@@ -0,0 +1,415 @@
+from __future__ import annotations
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.event import (
+    async_call_later,
+    async_track_state_change_event,
+)
+from homeassistant.util import dt as dt_util
+
+from .ai import InsightJob, InsightWorker
+from .const import (
+    CONF_AGENT_ID,
+    CONF_AI_TIMEOUT,
+    CONF_MINUTES_BETWEEN_AI,
+    DEFAULT_AI_TIMEOUT,
+    DEFAULT_MINUTES_BETWEEN_AI,
+    PUSH_DEBOUNCE_SECONDS,
+)
+from .coordinator import PowerManCoordinator
+from .notifications import NotificationPipeline, format_reasons
+
+_LOGGER = logging.getLogger(__name__)
+
+LAST_AI_KEY = "last_ai_run"  # stored per entry store
+
+JOB_POLL = "poll"
+JOB_WATCH = "watch"
+
+
+class PowerManEngine:
+    """Domain-wide scheduler shared by every PowerMan config entry.
+
+    Owns the single ``state_changed`` subscription for all mapped entities and
+    one timer for all polling and advice-watch jobs. Jobs live in a heap keyed
+    by due time; each wakeup runs every job that is due in one pass.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.hass = hass
+        self.entries: dict[str, dict[str, Any]] = {}
+        self._routes: dict[str, set[str]] = {}  # entity id -> entry ids
+        self._state_unsub: CALLBACK_TYPE | None = None
+        self._dirty: dict[str, set[str]] = {}  # entry id -> entity ids
+        self._debouncer = Debouncer(
+            hass,
+            _LOGGER,
+            cooldown=PUSH_DEBOUNCE_SECONDS,
+            immediate=False,
+            function=self._async_flush_changes,
+        )
+        self._jobs: list[tuple[float, str, str]] = []
+        self._due: dict[tuple[str, str], float] = {}
+        self._timer_unsub: CALLBACK_TYPE | None = None
+        self._timer_at: float | None = None
+        self.notifications = NotificationPipeline(hass)
+        self.insights = InsightWorker(hass, self._on_insight)
+
+    # ---- Entries ----
+    @callback
+    def async_add_entry(self, entry: ConfigEntry, store: dict[str, Any]) -> None:
+        self.entries[entry.entry_id] = store
+        coordinator: PowerManCoordinator = store["coordinator"]
+        store["entry"] = entry
+        store["watch_running"] = False
+        store["remove_listener"] = coordinator.async_add_listener(
+            lambda: self._on_coordinator_update(entry.entry_id)
+        )
+        self.notifications.async_start()
+        self.insights.async_start()
+        self.notifications.async_seed(entry.entry_id, store.get("adv_prev_code"))
+        self.async_update_entry(entry.entry_id)
+        self.async_schedule(entry.entry_id, JOB_WATCH, 5)
+
+    @callback
+    def async_update_entry(self, entry_id: str) -> None:
+        """Re-route state events and polling after an entry's options changed."""
+        coordinator: PowerManCoordinator = self.entries[entry_id]["coordinator"]
+        self._resubscribe()
+        if coordinator.options.push_updates:
+            self._due.pop((entry_id, JOB_POLL), None)
+        else:
+            self.async_schedule(entry_id, JOB_POLL, coordinator.options.update_interval)
+
+    @callback
+    def async_remove_entry(self, entry_id: str) -> dict[str, Any] | None:
+        store = self.entries.pop(entry_id, None)
+        if store is None:
+            return None
+        store["remove_listener"]()
+        self.notifications.async_forget(entry_id)
+        self.insights.async_forget(entry_id)
+        self._dirty.pop(entry_id, None)
+        for kind in (JOB_POLL, JOB_WATCH):
+            self._due.pop((entry_id, kind), None)
+        self._resubscribe()
+        if not self.entries:
+            self._debouncer.async_cancel()
+            self.notifications.async_stop()
+            self.insights.async_stop()
+            if self._timer_unsub:
+                self._timer_unsub()
+            self._timer_unsub = self._timer_at = None
+            self._jobs.clear()
+        return store
+
+    def target_entries(self, entry_ids: list[str] | None) -> list[str]:
+        if not entry_ids:
+            return list(self.entries)
+        return [entry_id for entry_id in entry_ids if entry_id in self.entries]
+
+    # ---- Shared state subscription ----
+    @callback
+    def _resubscribe(self) -> None:
+        routes: dict[str, set[str]] = {}
+        for entry_id, store in self.entries.items():
+            coordinator: PowerManCoordinator = store["coordinator"]
+            if not coordinator.options.push_updates:
+                continue
+            for entity_id in coordinator.options.entity_keys:
+                routes.setdefault(entity_id, set()).add(entry_id)
+        if routes.keys() == self._routes.keys() and self._state_unsub:
+            self._routes = routes
+            return
+        if self._state_unsub:
+            self._state_unsub()
+            self._state_unsub = None
+        self._routes = routes
+        if routes:
+            self._state_unsub = async_track_state_change_event(
+                self.hass, list(routes), self._handle_state_event
+            )
+
+    @callback
+    def _handle_state_event(self, event: Event) -> None:
+        entity_id = event.data["entity_id"]
+        for entry_id in self._routes.get(entity_id, ()):
+            self._dirty.setdefault(entry_id, set()).add(entity_id)
+        self._debouncer.async_schedule_call()
+
+    async def _async_flush_changes(self) -> None:
+        dirty, self._dirty = self._dirty, {}
+        for entry_id, entity_ids in dirty.items():
+            store = self.entries.get(entry_id)
+            if store is not None:
+                store["coordinator"].async_apply_changes(entity_ids)
+
+    # ---- Timer wheel ----
+    @callback
+    def async_schedule(self, entry_id: str, kind: str, delay_seconds: float) -> None:
+        """(Re)schedule one job; the engine keeps a single timer for all."""
+        due = dt_util.utcnow().timestamp() + max(0.0, delay_seconds)
+        self._due[(entry_id, kind)] = due
+        heapq.heappush(self._jobs, (due, entry_id, kind))
+        self._arm()
+
+    @callback
+    def _arm(self) -> None:
+        # Drop heap entries superseded by a later reschedule
+        while self._jobs and self._due.get(self._jobs[0][1:]) != self._jobs[0][0]:
+            heapq.heappop(self._jobs)
+        if not self._jobs:
+            return
+        due = self._jobs[0][0]
+        if self._timer_at is not None and self._timer_at <= due:
+            return
+        if self._timer_unsub:
+            self._timer_unsub()
+        self._timer_at = due
+        self._timer_unsub = async_call_later(
+            self.hass, max(0.0, due - dt_util.utcnow().timestamp()), self._async_tick
+        )
+
+    async def _async_tick(self, _now: datetime) -> None:
+        self._timer_unsub = self._timer_at = None
+        now = dt_util.utcnow().timestamp()
+        polls: list[str] = []
+        watches: list[str] = []
+        while self._jobs and self._jobs[0][0] <= now:
+            due, entry_id, kind = heapq.heappop(self._jobs)
+            if self._due.get((entry_id, kind)) != due:
+                continue
+            del self._due[(entry_id, kind)]
+            (polls if kind == JOB_POLL else watches).append(entry_id)
+
+        # Batch pass: refresh every due poller, then evaluate due watches
+        refreshes = []
+        for entry_id in polls:
+            coordinator = self.entries[entry_id]["coordinator"]
+            self.async_schedule(entry_id, JOB_POLL, coordinator.options.update_interval)
+            refreshes.append(coordinator.async_refresh_data())
+        try:
+            results = await asyncio.gather(*refreshes, return_exceptions=True)
+            results += await asyncio.gather(
+                *(self._async_watch(e) for e in watches), return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    _LOGGER.error("PowerMan: scheduled job failed: %s", result)
+        finally:
+            self._arm()
+
+    # ---- Advice watch ----
+    @callback
+    def _on_coordinator_update(self, entry_id: str) -> None:
+        # Wake the watcher early when a state change flipped the advice
+        store = self.entries.get(entry_id)
+        if store is None or store["watch_running"]:
+            return
+        data = store["coordinator"].data or {}
+        code = (data.get("advice") or {}).get("code")
+        if code != store.get("adv_prev_code"):
+            self.async_schedule(entry_id, JOB_WATCH, 0)
+
+    async def _async_watch(self, entry_id: str) -> None:
+        store = self.entries.get(entry_id)
+        if store is None:
+            return
+        coordinator: PowerManCoordinator = store["coordinator"]
+        store["watch_running"] = True
+        try:
+            data = await coordinator.async_refresh_data()
+            adv = data.get("advice") or {}
+            code = adv.get("code")
+
+            prev_code = store.get("adv_prev_code")
+            if code and code != prev_code:
+                store["adv_prev_code"] = code
+                if coordinator.options.notify_change:
+                    # Coalesced, de-flapped and sent by the pipeline's worker
+                    self.notifications.async_advice_changed(
+                        entry_id, adv, coordinator.stats, self._title_suffix(store)
+                    )
+            elif code is None and prev_code is not None:
+                store["adv_prev_code"] = None
+        finally:
+            store["watch_running"] = False
+            if entry_id in self.entries:
+                # The advisor picks its own review horizon (short near peak and
+                # price boundaries or reserve, long on stable nights).
+                minutes = (
+                    coordinator.review_minutes
+                    or coordinator.options.advisor_interval_min
+                )
+                self.async_schedule(entry_id, JOB_WATCH, minutes * 60)
+
+    def _title_suffix(self, store: dict[str, Any]) -> str:
+        return f" ({store['entry'].title})" if len(self.entries) > 1 else ""
+
+    # ---- Services ----
+    async def async_advise_now(self, entry_ids: list[str] | None) -> None:
+        targets = self.target_entries(entry_ids)
+        results = await asyncio.gather(
+            *(self.entries[e]["coordinator"].async_refresh_data() for e in targets)
+        )
+        for entry_id, data in zip(targets, results):
+            store = self.entries.get(entry_id)
+            if store is None:
+                continue
+            adv = data.get("advice") or {}
+            reasons = format_reasons(adv.get("reasons"))
+            if adv.get("code"):
+                store["adv_prev_code"] = adv.get("code")
+                # The user has seen this code now; don't announce it again
+                self.notifications.async_seed(entry_id, adv.get("code"))
+            # Explicitly requested, so it bypasses coalescing and cooldown
+            self.notifications.async_notify(
+                f"PowerMan — Advice{self._title_suffix(store)}",
+                f"{adv.get('title', '(no advice)')}\n\nReasons:\n{reasons}",
+                notification_id=f"powerman_advice_{entry_id}",
+                stats=store["coordinator"].stats,
+            )
+
+    async def async_generate_insight(self, entry_ids: list[str] | None) -> None:
+        for entry_id in self.target_entries(entry_ids):
+            await self._async_generate_insight(entry_id)
+
+    async def _async_generate_insight(self, entry_id: str) -> None:
+        store = self.entries[entry_id]
+        entry: ConfigEntry = store["entry"]
+        coord: PowerManCoordinator = store["coordinator"]
+        data = coord.data or {}
+
+        # Build a *local* summary (no tokens used)
+        now = dt_util.now()
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        bat = data.get("battery_percent")
+        pwr = data.get("solar_power_w")
+        kwh = data.get("solar_energy_today_kwh")
+
+        summary_lines = [f"PowerMan insight — {now.strftime('%Y-%m-%d %H:%M')}"]
+        if kwh is not None:
+            summary_lines.append(
+                f"• Solar energy today: {kwh:.2f} kWh since {today_start.strftime('%H:%M')}"
+            )
+        if pwr is not None:
+            summary_lines.append(f"• Live solar power: {pwr:.0f} W")
+        if bat is not None:
+            summary_lines.append(f"• Battery state: {bat:.0f} %")
+        if len(summary_lines) == 1:
+            summary_lines.append(
+                "• No mapped entities yet. Configure in the integration options."
+            )
+
+        local_summary = "\n".join(summary_lines)
+
+        # Always show a notification with the local summary
+        self.notifications.async_notify(
+            "PowerMan — Local insight", local_summary, stats=coord.stats
+        )
+
+        # Optional AI call (rate limited), answered by the background worker
+        agent_id = (entry.options.get(CONF_AGENT_ID) or "").strip()
+        if not agent_id:
+            _LOGGER.debug("PowerMan: no agent_id configured; skipping AI.")
+            return
+
+        # Rounded to the precision the prompt shows, so equal inputs give
+        # equal prompts and can reuse the last answer
+        digest = coord.digest.render()
+        key = (
+            agent_id,
+            digest,
+            None if kwh is None else round(kwh, 1),
+            None if pwr is None else round(pwr, -1),
+            None if bat is None else round(bat),
+        )
+        min_minutes = int(
+            entry.options.get(
+                CONF_MINUTES_BETWEEN_AI, DEFAULT_MINUTES_BETWEEN_AI
+            )
+        )
+        last: datetime | None = store.get(LAST_AI_KEY)
+        if last and (dt_util.now() - last) < timedelta(minutes=min_minutes):
+            insight = coord.insight
+            if insight and insight["key"] == key and insight["text"]:
+                coord.stats.incr("ai_cache_hits")
+                self.notifications.async_notify(
+                    f"PowerMan — AI insight{self._title_suffix(store)}",
+                    insight["text"],
+                    stats=coord.stats,
+                )
+                return
+            _LOGGER.info(
+                "PowerMan: AI rate limit hit; skipping (last run %s).",
+                last,
+            )
+            coord.stats.incr("ai_rate_limited")
+            return
+
+        prompt = (
+            "You are an energy assistant. Summarise today's solar/battery situation briefly in 3–5 bullet points. "
+            "Be concise and practical for a home user.\n\n"
+            f"Data:\n"
+            f"- Solar energy produced today (kWh): {'unknown' if key[2] is None else key[2]}\n"
+            f"- Live solar power (W): {'unknown' if key[3] is None else key[3]}\n"
+            f"- Battery state (%): {'unknown' if key[4] is None else key[4]}\n"
+            f"- Current time: {now.isoformat()}\n\n"
+            f"Today's digest:\n{digest}\n"
+        )
+        job = InsightJob(
+            entry_id=entry_id,
+            agent_id=agent_id,
+            prompt=prompt,
+            key=key,
+            timeout=float(entry.options.get(CONF_AI_TIMEOUT, DEFAULT_AI_TIMEOUT)),
+            stats=coord.stats,
+        )
+        if not self.insights.async_submit(job):
+            _LOGGER.info("PowerMan: AI insight already queued; skipping.")
+            coord.stats.incr("ai_rate_limited")
+
+    @callback
+    def _on_insight(
+        self, job: InsightJob, text: str | None, error: Exception | None
+    ) -> None:
+        store = self.entries.get(job.entry_id)
+        if store is None:
+            return
+        coord: PowerManCoordinator = store["coordinator"]
+        suffix = self._title_suffix(store)
+        if error is not None:
+            _LOGGER.warning("PowerMan: AI call failed: %s", error)
+            coord.insight = {
+                **(coord.insight or {"key": None, "text": None}),
+                "error": str(error),
+            }
+            coord.async_update_listeners()
+            self.notifications.async_notify(
+                f"PowerMan — AI error{suffix}",
+                f"AI call failed: {error}",
+                stats=coord.stats,
+            )
+            return
+        store[LAST_AI_KEY] = now = dt_util.now()
+        store["persist"].async_schedule_save(store["data_to_save"])
+        coord.insight = {
+            "key": job.key,
+            "text": text,
+            "agent_id": job.agent_id,
+            "timestamp": now,
+            "error": None,
+        }
+        coord.async_update_listeners()
+        self.notifications.async_notify(
+            f"PowerMan — AI insight{suffix}",
+            text or "The conversation agent returned no text.",
+            stats=coord.stats,
+        )
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from .profile import BUCKET_SECONDS, BUCKETS_PER_DAY, BucketSeries
+
+HORIZON_BUCKETS = 2 * BUCKETS_PER_DAY  # 48 h ahead, enough for day-ahead prices
+MIN_LOAD_COVERAGE = 0.1  # need at least this share of buckets with load data
+_KWH_PER_W_BUCKET = BUCKET_SECONDS / 3600.0 / 1000.0
+
+
+@dataclass
+class EnergyForecast:
+    """Load and solar forecast for the next 48 h on the 5-minute grid."""
+
+    start_ts: float  # start of the first forecast bucket
+    load_w: np.ndarray
+    solar_w: np.ndarray
+    clearness: float  # scale applied to the clear-sky solar envelope
+    # (buckets, capacity) -> composed battery walk, see projected_soc
+    _soc_maps: dict[tuple[int, float], tuple[float, float, float]] = field(
+        default_factory=dict, repr=False, compare=False
+    )
+
+    def net_kwh(self, until_ts: float | None = None) -> float:
+        """Solar minus load energy from ``start_ts`` until ``until_ts``.
+
+        Defaults to the next 24 h.
+        """
+        n = BUCKETS_PER_DAY
+        if until_ts is not None:
+            n = int(
+                np.clip((until_ts - self.start_ts) // BUCKET_SECONDS, 0, HORIZON_BUCKETS)
+            )
+        return float(np.sum(self.solar_w[:n] - self.load_w[:n]) * _KWH_PER_W_BUCKET)
+
+
+def _local_index(ts: np.ndarray, utc_offset: float) -> tuple[np.ndarray, np.ndarray]:
+    """(weekday, slot of day) for each timestamp, Monday == 0."""
+    local = ts + utc_offset
+    day = np.floor(local / 86400.0).astype(np.intp)
+    slot = ((local - day * 86400.0) // BUCKET_SECONDS).astype(np.intp)
+    weekday = (day + 3) % 7  # 1970-01-01 was a Thursday
+    return weekday, slot
+
+
+def _grouped_mean(keys: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+    ok = np.isfinite(values)
+    sums = np.bincount(keys[ok], weights=values[ok], minlength=size)
+    counts = np.bincount(keys[ok], minlength=size)
+    out = np.full(size, np.nan)
+    np.divide(sums, counts, out=out, where=counts > 0)
+    return out
+
+
+def build_forecast(
+    series: BucketSeries,
+    now_ts: float,
+    utc_offset: float,
+    solar_remaining_kwh: float | None = None,
+) -> EnergyForecast | None:
+    """Forecast the next 48 h from the collected 5-minute history.
+
+    Load is the mean per weekday and time of day, falling back to the mean
+    per time of day when a weekday has no data yet. Solar is the per-slot
+    maximum over the history (a clear-sky envelope) scaled by how today's
+    production compares to it. When a remaining-solar forecast is known it
+    replaces today's share of the solar estimate.
+
+    ``utc_offset`` is the local offset in seconds at ``now_ts``; a DST change
+    inside the history window shifts the affected days by one hour.
+    """
+    if series.coverage("house_load_w") < MIN_LOAD_COVERAGE:
+        return None
+
+    ts = series.timestamps()
+    weekday, slot = _local_index(ts, utc_offset)
+    load = series.means("house_load_w")
+    solar = series.means("solar_power_w")
+
+    by_weekday = _grouped_mean(
+        weekday * BUCKETS_PER_DAY + slot, load, 7 * BUCKETS_PER_DAY
+    )
+    by_slot = _grouped_mean(slot, load, BUCKETS_PER_DAY)
+    by_slot = np.where(np.isnan(by_slot), np.nanmean(load), by_slot)
+    by_weekday = np.where(
+        np.isnan(by_weekday), np.tile(by_slot, 7), by_weekday
+    ).reshape(7, BUCKETS_PER_DAY)
+
+    envelope = np.zeros(BUCKETS_PER_DAY)
+    ok = np.isfinite(solar)
+    np.maximum.at(envelope, slot[ok], np.maximum(solar[ok], 0.0))
+
+    # Clearness: today's production so far against the envelope, else the
+    # average over the whole history.
+    start_ts = (now_ts // BUCKET_SECONDS + 1) * BUCKET_SECONDS
+    today = ok & (ts >= now_ts - (now_ts + utc_offset) % 86400.0)
+    ref = envelope[slot[today]].sum()
+    if ref > 0:
+        clearness = float(solar[today].sum() / ref)
+    else:
+        ref = envelope[slot[ok]].sum()
+        clearness = float(solar[ok].sum() / ref) if ref > 0 else 0.0
+    clearness = float(np.clip(clearness, 0.0, 1.0))
+
+    future = start_ts + np.arange(HORIZON_BUCKETS) * BUCKET_SECONDS
+    f_weekday, f_slot = _local_index(future, utc_offset)
+    load_w = by_weekday[f_weekday, f_slot]
+    solar_w = envelope[f_slot] * clearness
+
+    if solar_remaining_kwh is not None:
+        is_today = (f_weekday == f_weekday[0]) & (future < start_ts + 86400)
+        expected = solar_w[is_today].sum() * _KWH_PER_W_BUCKET
+        if expected > 0:
+            solar_w[is_today] *= solar_remaining_kwh / expected
+
+    return EnergyForecast(
+        start_ts=float(start_ts),
+        load_w=load_w,
+        solar_w=solar_w,
+        clearness=clearness,
+    )
+
+
+def projected_soc(
+    forecast: EnergyForecast,
+    soc_pct: float,
+    capacity_kwh: float,
+    until_ts: float,
+) -> float:
+    """Battery % at ``until_ts`` if it absorbs the forecast net energy.
+
+    Each bucket maps the charge to clip(soc + delta, 0, capacity), and a
+    chain of such maps is again clip(soc + shift, lo, hi). The chain is
+    composed once per forecast and horizon, so each call is O(1).
+    """
+    n = int(
+        min(HORIZON_BUCKETS, max(0.0, (until_ts - forecast.start_ts) // BUCKET_SECONDS))
+    )
+    if n == 0:
+        return soc_pct
+    key = (n, capacity_kwh)
+    soc_map = forecast._soc_maps.get(key)
+    if soc_map is None:
+        soc_map = forecast._soc_maps[key] = _compose_walk(
+            (forecast.solar_w[:n] - forecast.load_w[:n]) * _KWH_PER_W_BUCKET,
+            capacity_kwh,
+        )
+    shift, lo, hi = soc_map
+    soc_kwh = min(hi, max(lo, soc_pct / 100.0 * capacity_kwh + shift))
+    return soc_kwh / capacity_kwh * 100.0
+
+
+def _compose_walk(
+    net_kwh: np.ndarray, capacity_kwh: float
+) -> tuple[float, float, float]:
+    """(shift, lo, hi) of the saturating walk over the bucket deltas."""
+    shift, lo, hi = 0.0, -math.inf, math.inf
+    for delta in net_kwh.tolist():
+        shift += delta
+        lo = min(capacity_kwh, max(0.0, lo + delta))
+        hi = min(capacity_kwh, max(0.0, hi + delta))
+    return shift, lo, hi
+
+
+def slot_energy(
+    forecast: EnergyForecast, start_ts: float, step_seconds: int, slots: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """(load, solar) kWh per ``step_seconds`` slot starting at ``start_ts``.
+
+    ``step_seconds`` must be a multiple of the 5-minute bucket. Slots past the
+    forecast horizon repeat the last bucket.
+    """
+    k = step_seconds // BUCKET_SECONDS
+    first = int((start_ts - forecast.start_ts) // BUCKET_SECONDS)
+    idx = np.clip(first + np.arange(slots * k), 0, len(forecast.load_w) - 1)
+    load = forecast.load_w[idx].reshape(slots, k).sum(axis=1) * _KWH_PER_W_BUCKET
+    solar = forecast.solar_w[idx].reshape(slots, k).sum(axis=1) * _KWH_PER_W_BUCKET
+    return load, solar
@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import base64
+import math
+import sys
+from array import array
+from collections.abc import Iterator, Mapping
+from typing import Any
+
+# Data keys recorded in the sample history, in column order.
+METRICS: tuple[str, ...] = (
+    "battery_percent",
+    "solar_power_w",
+    "house_load_w",
+    "grid_import_w",
+    "grid_export_w",
+    "price_now",
+)
+
+DEFAULT_CAPACITY = 8640  # 24 h at one sample every 10 s
+DEFAULT_MIN_SPACING = 10.0  # seconds; closer samples replace the newest row
+
+_NAN = float("nan")
+
+
+class SampleBuffer:
+    """Fixed-capacity ring buffer of coordinator samples.
+
+    Every metric is an ``array('d')`` column sharing one timestamp column
+    (epoch seconds). Missing readings are stored as NaN. Appending is O(1);
+    windowed queries cost O(log n) to locate the window plus its length.
+    """
+
+    def __init__(
+        self,
+        capacity: int = DEFAULT_CAPACITY,
+        min_spacing: float = DEFAULT_MIN_SPACING,
+        metrics: tuple[str, ...] = METRICS,
+    ) -> None:
+        self.capacity = capacity
+        self.min_spacing = min_spacing
+        self.metrics = metrics
+        self._ts = array("d", bytes(8 * capacity))
+        self._cols = {m: array("d", [_NAN]) * capacity for m in metrics}
+        self._head = 0  # next write position
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _slot(self, i: int) -> int:
+        """Physical slot of the i-th oldest sample."""
+        return (self._head - self._len + i) % self.capacity
+
+    @property
+    def last_ts(self) -> float | None:
+        if not self._len:
+            return None
+        return self._ts[(self._head - 1) % self.capacity]
+
+    def append(self, ts: float, sample: Mapping[str, float | None]) -> None:
+        """Record a sample taken at ``ts``.
+
+        A sample closer than ``min_spacing`` to the newest one overwrites it,
+        which keeps bursts of push updates from flushing the history.
+        """
+        last = self.last_ts
+        if last is not None and ts < last:
+            return
+        if last is not None and ts - last < self.min_spacing:
+            slot = (self._head - 1) % self.capacity
+        else:
+            slot = self._head
+            self._head = (self._head + 1) % self.capacity
+            if self._len < self.capacity:
+                self._len += 1
+        self._ts[slot] = ts
+        for m, col in self._cols.items():
+            val = sample.get(m)
+            col[slot] = _NAN if val is None else val
+
+    def _ordered(self, col: array) -> array:
+        start = self._slot(0)
+        end = start + self._len
+        if end <= self.capacity:
+            return col[start:end]
+        return col[start:] + col[: end - self.capacity]
+
+    def as_dict(self, spacing: float = 0.0) -> dict[str, Any]:
+        """Compact serialisable form: base64 of the raw column bytes.
+
+        With ``spacing`` only rows at least that many seconds apart are kept
+        (the newest row always is), which shrinks the payload for storage.
+        """
+        keep: list[int] | None = None
+        if spacing > self.min_spacing and self._len:
+            keep = []
+            last = -math.inf
+            for i in range(self._len - 1):
+                ts = self._ts[self._slot(i)]
+                if ts - last >= spacing:
+                    keep.append(i)
+                    last = ts
+            keep.append(self._len - 1)
+
+        def enc(col: array) -> str:
+            if keep is None:
+                data = self._ordered(col)
+            else:
+                data = array("d", (col[self._slot(i)] for i in keep))
+            return base64.b64encode(data.tobytes()).decode("ascii")
+
+        return {
+            "byteorder": sys.byteorder,
+            "ts": enc(self._ts),
+            "cols": {m: enc(col) for m, col in self._cols.items()},
+        }
+
+    def load_dict(self, raw: Mapping[str, Any]) -> None:
+        """Replace the contents with a payload produced by :meth:`as_dict`."""
+
+        def dec(text: str) -> array:
+            col = array("d", base64.b64decode(text))
+            if raw.get("byteorder", sys.byteorder) != sys.byteorder:
+                col.byteswap()
+            return col
+
+        ts = dec(raw["ts"])[-self.capacity :]
+        cols = {
+            m: dec(text)[-self.capacity :] for m, text in raw.get("cols", {}).items()
+        }
+        n = len(ts)
+        self._ts = ts + array("d", bytes(8 * (self.capacity - n)))
+        for m in self.metrics:
+            col = cols.get(m)
+            if col is None or len(col) != n:
+                col = array("d", [_NAN]) * n
+            self._cols[m] = col + array("d", [_NAN]) * (self.capacity - n)
+        self._len = n
+        self._head = n % self.capacity
+
+    def _first_index(self, since: float) -> int:
+        lo, hi = 0, self._len
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._ts[self._slot(mid)] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def window(self, metric: str, since: float) -> list[tuple[float, float]]:
+        """(timestamp, value) pairs at or after ``since``, skipping NaN."""
+        col = self._cols[metric]
+        out: list[tuple[float, float]] = []
+        for i in range(self._first_index(since), self._len):
+            slot = self._slot(i)
+            val = col[slot]
+            if not math.isnan(val):
+                out.append((self._ts[slot], val))
+        return out
+
+    def recent(self, metric: str, n: int) -> list[float]:
+        """Up to ``n`` newest non-NaN values among the newest ``4 * n`` rows."""
+        col = self._cols[metric]
+        out: list[float] = []
+        for i in range(self._len - 1, max(-1, self._len - 1 - 4 * n), -1):
+            val = col[self._slot(i)]
+            if not math.isnan(val):
+                out.append(val)
+                if len(out) == n:
+                    break
+        return out
+
+    def last_valid(self, metric: str, since: float) -> tuple[float, float] | None:
+        """Newest (timestamp, value) of ``metric`` at or after ``since``."""
+        col = self._cols[metric]
+        for i in range(self._len - 1, -1, -1):
+            slot = self._slot(i)
+            if self._ts[slot] < since:
+                return None
+            val = col[slot]
+            if not math.isnan(val):
+                return self._ts[slot], val
+        return None
+
+    def interpolate(self, metric: str, max_gap: float) -> int:
+        """Fill the NaN run before the newest value linearly; returns rows filled.
+
+        Only runs bounded by readings no more than ``max_gap`` seconds apart
+        are filled, so long outages stay missing.
+        """
+        if self._len < 3:
+            return 0
+        col = self._cols[metric]
+        end = self._slot(self._len - 1)
+        if math.isnan(col[end]) or not math.isnan(col[self._slot(self._len - 2)]):
+            return 0
+        t1, v1 = self._ts[end], col[end]
+        for i in range(self._len - 3, -1, -1):
+            slot = self._slot(i)
+            t0 = self._ts[slot]
+            if t1 - t0 > max_gap:
+                return 0
+            v0 = col[slot]
+            if math.isnan(v0):
+                continue
+            for j in range(i + 1, self._len - 1):
+                gap = self._slot(j)
+                col[gap] = v0 + (v1 - v0) * (self._ts[gap] - t0) / (t1 - t0)
+            return self._len - 2 - i
+        return 0
+
+    def rows(self, since: float) -> Iterator[tuple[float, dict[str, float | None]]]:
+        """(timestamp, sample) for every row at or after ``since``, oldest first."""
+        for i in range(self._first_index(since), self._len):
+            slot = self._slot(i)
+            yield self._ts[slot], {
+                m: None if math.isnan(col[slot]) else col[slot]
+                for m, col in self._cols.items()
+            }
+
+    def min(self, metric: str, since: float) -> float | None:
+        vals = [v for _, v in self.window(metric, since)]
+        return min(vals) if vals else None
+
+    def max(self, metric: str, since: float) -> float | None:
+        vals = [v for _, v in self.window(metric, since)]
+        return max(vals) if vals else None
+
+    def mean(self, metric: str, since: float) -> float | None:
+        """Time-weighted mean over the window."""
+        pts = self.window(metric, since)
+        if not pts:
+            return None
+        span = pts[-1][0] - pts[0][0]
+        if span <= 0:
+            return sum(v for _, v in pts) / len(pts)
+        return self._trapezoid(pts) / span
+
+    def integral(self, metric: str, since: float) -> float | None:
+        """Trapezoidal integral in value-hours (W -> Wh)."""
+        pts = self.window(metric, since)
+        if not pts:
+            return None
+        return self._trapezoid(pts) / 3600.0
+
+    @staticmethod
+    def _trapezoid(pts: list[tuple[float, float]]) -> float:
+        total = 0.0
+        for (t0, v0), (t1, v1) in zip(pts, pts[1:]):
+            total += (t1 - t0) * (v0 + v1) / 2.0
+        return total
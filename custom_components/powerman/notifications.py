@@ -0,0 +1,191 @@
+from __future__ import annotations
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import partial
+from time import monotonic
+from typing import Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+from .stats import Stats
+
+_LOGGER = logging.getLogger(__name__)
+
+COALESCE_SECONDS = 60  # advice changes inside this window become one message
+CODE_COOLDOWN_SECONDS = 1800  # never repeat the same code sooner than this
+QUEUE_SIZE = 16
+
+
+def format_reasons(reasons: list[str] | None) -> str:
+    if not reasons:
+        return "- No reasons provided"
+    return "\n".join(f"- {reason}" for reason in reasons)
+
+
+@dataclass
+class _Pending:
+    """Advice changes collected for one entry during the coalescing window."""
+
+    codes: list[str]
+    advice: dict[str, Any]
+    title_suffix: str
+    stats: Stats
+    unsub: CALLBACK_TYPE | None = None
+
+
+@dataclass
+class _EntryState:
+    last_code: str | None = None  # last code actually notified
+    sent_at: dict[str, float] = field(default_factory=dict)  # code -> monotonic
+    pending: _Pending | None = None
+
+
+class NotificationPipeline:
+    """Debounced, non-blocking persistent notifications.
+
+    Advice changes pass three filters before reaching the notification
+    service: changes inside COALESCE_SECONDS are merged into one message;
+    a window that ends on the code that was last notified (a flap such as
+    A -> B -> A) sends nothing, which is the hysteresis; and a code is not
+    repeated within CODE_COOLDOWN_SECONDS. Messages go through a bounded queue
+    drained by one background worker, so callers never await the service;
+    when the queue is full the oldest message is dropped.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.hass = hass
+        self._entries: dict[str, _EntryState] = {}
+        self._queue: asyncio.Queue[tuple[str, str, str | None, Stats | None]] = (
+            asyncio.Queue(QUEUE_SIZE)
+        )
+        self._worker: asyncio.Task | None = None
+
+    @callback
+    def async_start(self) -> None:
+        if self._worker is None:
+            self._worker = self.hass.async_create_background_task(
+                self._async_run(), "powerman_notifications"
+            )
+
+    @callback
+    def async_stop(self) -> None:
+        for state in self._entries.values():
+            if state.pending and state.pending.unsub:
+                state.pending.unsub()
+        self._entries.clear()
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+    @callback
+    def async_forget(self, entry_id: str) -> None:
+        state = self._entries.pop(entry_id, None)
+        if state and state.pending and state.pending.unsub:
+            state.pending.unsub()
+
+    @callback
+    def async_seed(self, entry_id: str, code: str | None) -> None:
+        """Set the code the user last saw, e.g. restored at startup."""
+        self._entries.setdefault(entry_id, _EntryState()).last_code = code
+
+    # ---- Advice changes ----
+    @callback
+    def async_advice_changed(
+        self,
+        entry_id: str,
+        advice: dict[str, Any],
+        stats: Stats,
+        title_suffix: str = "",
+    ) -> None:
+        state = self._entries.setdefault(entry_id, _EntryState())
+        code = advice.get("code")
+        pending = state.pending
+        if pending is None:
+            pending = state.pending = _Pending([code], advice, title_suffix, stats)
+            pending.unsub = async_call_later(
+                self.hass, COALESCE_SECONDS, partial(self._flush, entry_id)
+            )
+            return
+        if pending.codes[-1] != code:
+            pending.codes.append(code)
+            stats.incr("notifications_coalesced")
+        pending.advice = advice
+
+    @callback
+    def _flush(self, entry_id: str, _now: datetime | None = None) -> None:
+        state = self._entries.get(entry_id)
+        if state is None or state.pending is None:
+            return
+        pending, state.pending = state.pending, None
+        code = pending.codes[-1]
+        now = monotonic()
+        if code == state.last_code:
+            pending.stats.incr("notifications_suppressed")
+            return
+        sent = state.sent_at.get(code)
+        if sent is not None and now - sent < CODE_COOLDOWN_SECONDS:
+            pending.stats.incr("notifications_suppressed")
+            state.last_code = code
+            return
+        state.last_code = code
+        state.sent_at[code] = now
+
+        adv = pending.advice
+        message = (
+            f"{adv.get('title', '')}\n\nReasons:\n{format_reasons(adv.get('reasons'))}"
+        )
+        if len(pending.codes) > 1:
+            message += (
+                f"\n\n{len(pending.codes)} changes in the last "
+                f"{COALESCE_SECONDS // 60} min: {' → '.join(pending.codes)}"
+            )
+        self.async_notify(
+            f"PowerMan — Advice changed{pending.title_suffix}",
+            message,
+            notification_id=f"powerman_advice_{entry_id}",
+            stats=pending.stats,
+        )
+
+    # ---- Queue ----
+    @callback
+    def async_notify(
+        self,
+        title: str,
+        message: str,
+        *,
+        notification_id: str | None = None,
+        stats: Stats | None = None,
+    ) -> None:
+        """Queue a notification; never waits for the notification service."""
+        if self._queue.full():
+            dropped = self._queue.get_nowait()
+            _LOGGER.debug("PowerMan: notification queue full; dropped %s", dropped[0])
+            if dropped[3] is not None:
+                dropped[3].incr("notifications_dropped")
+        self._queue.put_nowait((title, message, notification_id, stats))
+
+    async def _async_run(self) -> None:
+        while True:
+            title, message, notification_id, stats = await self._queue.get()
+            data = {"title": title, "message": message}
+            if notification_id:
+                data["notification_id"] = notification_id
+            try:
+                await self.hass.services.async_call(
+                    "persistent_notification", "create", data, blocking=True
+                )
+                if stats is not None:
+                    stats.incr("notifications")
+            except Exception as exc:  # noqa: BLE001
+                _LOGGER.warning("PowerMan: notification failed: %s", exc)
+
+    def diagnostics(self) -> dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "pending_entries": [
+                entry_id for entry_id, s in self._entries.items() if s.pending
+            ],
+        }
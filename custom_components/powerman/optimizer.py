@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+
+DEFAULT_LEVELS = 51  # SoC grid points (2 % resolution)
+DEFAULT_EFFICIENCY = 0.9  # round trip
+SHORTFALL_PENALTY = 10.0  # per kWh below the minimum SoC, per slot
+CYCLE_COST = 0.001  # per kWh moved; breaks ties in favour of resting
+
+ACTION_IDLE = 0
+ACTION_CHARGE = 1
+ACTION_DISCHARGE = -1
+ACTION_NAMES = {
+    ACTION_IDLE: "idle",
+    ACTION_CHARGE: "charge",
+    ACTION_DISCHARGE: "discharge",
+}
+
+
+@dataclass
+class Schedule:
+    """Least-cost battery plan over a price horizon."""
+
+    start_ts: float
+    step_seconds: int
+    actions: np.ndarray  # ACTION_* per slot
+    soc_pct: np.ndarray  # planned SoC at the start of each slot, plus the end
+    grid_kwh: np.ndarray  # planned grid exchange per slot (+ import, - export)
+    cost: float
+
+    def action_at(self, ts: float) -> int | None:
+        idx = int((ts - self.start_ts) // self.step_seconds)
+        if 0 <= idx < len(self.actions):
+            return int(self.actions[idx])
+        return None
+
+    def runs(self) -> list[dict]:
+        """Compress the plan into runs of identical actions."""
+        out: list[dict] = []
+        change = np.flatnonzero(np.diff(self.actions)) + 1
+        bounds = np.concatenate(([0], change, [len(self.actions)]))
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            out.append(
+                {
+                    "start": self.start_ts + int(a) * self.step_seconds,
+                    "end": self.start_ts + int(b) * self.step_seconds,
+                    "action": ACTION_NAMES[int(self.actions[a])],
+                    "soc_end": round(float(self.soc_pct[b]), 1),
+                }
+            )
+        return out
+
+
+def optimize(
+    prices: np.ndarray,
+    load_kwh: np.ndarray,
+    solar_kwh: np.ndarray,
+    *,
+    start_ts: float,
+    step_seconds: int,
+    capacity_kwh: float,
+    soc_pct: float,
+    min_soc_pct: float,
+    max_power_kw: float,
+    export_prices: np.ndarray | float = 0.0,
+    efficiency: float = DEFAULT_EFFICIENCY,
+    levels: int = DEFAULT_LEVELS,
+) -> Schedule:
+    """Backward dynamic programming over a discretised SoC grid.
+
+    Every slot evaluates all level-to-level transitions at once as an
+    ``levels x levels`` cost matrix, so the work is O(T * levels^2) in NumPy
+    with a Python loop only over the T slots. Staying below ``min_soc_pct``
+    is allowed but penalised, so an initially low battery still has a plan.
+    """
+    prices = np.asarray(prices, dtype=float)
+    n = len(prices)
+    net = (
+        np.asarray(load_kwh, dtype=float)[:n] - np.asarray(solar_kwh, dtype=float)[:n]
+    )
+    export = np.broadcast_to(np.asarray(export_prices, dtype=float), (n,))
+
+    energy = np.linspace(0.0, capacity_kwh, levels)
+    delta = energy[None, :] - energy[:, None]  # [from, to] kWh into the battery
+    eta = np.sqrt(efficiency)
+    battery_grid = np.where(delta > 0, delta / eta, delta * eta)
+    wear = np.abs(delta) * CYCLE_COST
+    max_step = max_power_kw * step_seconds / 3600.0
+    infeasible = np.abs(delta) > max_step + 1e-9
+    shortfall = np.maximum(min_soc_pct / 100.0 * capacity_kwh - energy, 0.0)
+    penalty = shortfall * SHORTFALL_PENALTY
+
+    value = np.zeros(levels)
+    policy = np.empty((n, levels), dtype=np.intp)
+    for t in range(n - 1, -1, -1):
+        grid = net[t] + battery_grid
+        cost = np.where(grid > 0, grid * prices[t], grid * export[t])
+        cost = cost + wear + penalty[None, :] + value[None, :]
+        cost[infeasible] = np.inf
+        best = np.argmin(cost, axis=1)
+        policy[t] = best
+        value = cost[np.arange(levels), best]
+
+    state = int(np.abs(energy - soc_pct / 100.0 * capacity_kwh).argmin())
+    states = np.empty(n + 1, dtype=np.intp)
+    states[0] = state
+    for t in range(n):
+        states[t + 1] = policy[t, states[t]]
+
+    moved = delta[states[:-1], states[1:]]
+    grid_kwh = net + battery_grid[states[:-1], states[1:]]
+    cost = float(
+        np.sum(np.where(grid_kwh > 0, grid_kwh * prices, grid_kwh * export))
+    )
+    actions = np.select(
+        [moved > 1e-9, moved < -1e-9], [ACTION_CHARGE, ACTION_DISCHARGE], ACTION_IDLE
+    )
+    return Schedule(
+        start_ts=start_ts,
+        step_seconds=step_seconds,
+        actions=actions,
+        soc_pct=energy[states] / capacity_kwh * 100.0,
+        grid_kwh=grid_kwh,
+        cost=cost,
+    )
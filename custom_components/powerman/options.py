@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+from dataclasses import dataclass
+from datetime import datetime, time
+from typing import Any
+
+from .const import (
+    CONF_ADVISOR_INTERVAL_MIN,
+    CONF_BACKFILL_DAYS,
+    CONF_BATTERY_CAPACITY_KWH,
+    CONF_BATTERY_ENTITY,
+    CONF_BATTERY_POWER_KW,
+    CONF_CHEAP_PRICE,
+    CONF_EV_ENABLED,
+    CONF_FEED_IN_PRICE,
+    CONF_GRID_EXPORT_ENTITY,
+    CONF_GRID_IMPORT_ENTITY,
+    CONF_HIGH_PRICE,
+    CONF_INSTRUMENTATION,
+    CONF_LOAD_POWER_ENTITY,
+    CONF_NOTIFY_CHANGE,
+    CONF_PEAK_END,
+    CONF_PEAK_START,
+    CONF_PRICE_NEXT_ENTITY,
+    CONF_PRICE_NOW_ENTITY,
+    CONF_PUSH_UPDATES,
+    CONF_RESERVE_SOC,
+    CONF_SOLAR_ENERGY_TODAY_ENTITY,
+    CONF_SOLAR_FORECAST_REMAINING_ENTITY,
+    CONF_SOLAR_POWER_ENTITY,
+    CONF_STALE_MINUTES,
+    CONF_TARGET_SOC,
+    CONF_UPDATE_INTERVAL,
+    DEFAULT_ADVISOR_INTERVAL_MIN,
+    DEFAULT_BACKFILL_DAYS,
+    DEFAULT_BATTERY_CAPACITY_KWH,
+    DEFAULT_BATTERY_POWER_KW,
+    DEFAULT_CHEAP_PRICE,
+    DEFAULT_EV_ENABLED,
+    DEFAULT_FEED_IN_PRICE,
+    DEFAULT_HIGH_PRICE,
+    DEFAULT_INSTRUMENTATION,
+    DEFAULT_NOTIFY_CHANGE,
+    DEFAULT_PEAK_END,
+    DEFAULT_PEAK_START,
+    DEFAULT_PUSH_UPDATES,
+    DEFAULT_RESERVE_SOC,
+    DEFAULT_STALE_MINUTES,
+    DEFAULT_TARGET_SOC,
+    DEFAULT_UPDATE_INTERVAL,
+    MAX_BACKFILL_DAYS,
+)
+
+# (option key, data key) for every mapped source entity
+SOURCES: tuple[tuple[str, str], ...] = (
+    (CONF_BATTERY_ENTITY, "battery_percent"),
+    (CONF_SOLAR_POWER_ENTITY, "solar_power_w"),
+    (CONF_SOLAR_ENERGY_TODAY_ENTITY, "solar_energy_today_kwh"),
+    (CONF_GRID_IMPORT_ENTITY, "grid_import_w"),
+    (CONF_GRID_EXPORT_ENTITY, "grid_export_w"),
+    (CONF_LOAD_POWER_ENTITY, "house_load_w"),
+    (CONF_PRICE_NOW_ENTITY, "price_now"),
+    (CONF_PRICE_NEXT_ENTITY, "price_next"),
+    (CONF_SOLAR_FORECAST_REMAINING_ENTITY, "solar_remaining_kwh"),
+)
+
+
+def _parse_time(value: Any, default: str) -> time:
+    try:
+        return datetime.strptime(str(value), "%H:%M").time()
+    except ValueError:
+        return datetime.strptime(default, "%H:%M").time()
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledOptions:
+    """Typed, pre-parsed snapshot of a config entry's options.
+
+    Built once at setup and whenever the options change, so the coordinator
+    hot path never parses or casts option values.
+    """
+
+    sources: tuple[tuple[str, str], ...]  # (data key, entity id)
+    entity_keys: Mapping[str, str]  # entity id -> data key
+    update_interval: int
+    push_updates: bool
+    reserve_soc: int
+    target_soc: int
+    cheap_price: float
+    high_price: float
+    feed_in_price: float
+    peak_start: time
+    peak_end: time
+    ev_enabled: bool
+    notify_change: bool
+    advisor_interval_min: int
+    backfill_days: int
+    battery_capacity_kwh: float
+    battery_power_kw: float
+    instrumentation: bool
+    stale_after: int  # seconds; 0 disables
+
+    @classmethod
+    def from_options(cls, options: Mapping[str, Any]) -> CompiledOptions:
+        sources = tuple(
+            (data_key, options[conf_key])
+            for conf_key, data_key in SOURCES
+            if options.get(conf_key)
+        )
+        return cls(
+            sources=sources,
+            entity_keys={entity_id: data_key for data_key, entity_id in sources},
+            update_interval=int(
+                options.get(CONF_UPDATE_INTERVAL, DEFAULT_UPDATE_INTERVAL)
+            ),
+            push_updates=bool(options.get(CONF_PUSH_UPDATES, DEFAULT_PUSH_UPDATES)),
+            reserve_soc=int(options.get(CONF_RESERVE_SOC, DEFAULT_RESERVE_SOC)),
+            target_soc=int(options.get(CONF_TARGET_SOC, DEFAULT_TARGET_SOC)),
+            cheap_price=float(options.get(CONF_CHEAP_PRICE, DEFAULT_CHEAP_PRICE)),
+            high_price=float(options.get(CONF_HIGH_PRICE, DEFAULT_HIGH_PRICE)),
+            feed_in_price=float(
+                options.get(CONF_FEED_IN_PRICE, DEFAULT_FEED_IN_PRICE)
+            ),
+            peak_start=_parse_time(
+                options.get(CONF_PEAK_START, DEFAULT_PEAK_START), DEFAULT_PEAK_START
+            ),
+            peak_end=_parse_time(
+                options.get(CONF_PEAK_END, DEFAULT_PEAK_END), DEFAULT_PEAK_END
+            ),
+            ev_enabled=bool(options.get(CONF_EV_ENABLED, DEFAULT_EV_ENABLED)),
+            notify_change=bool(options.get(CONF_NOTIFY_CHANGE, DEFAULT_NOTIFY_CHANGE)),
+            advisor_interval_min=int(
+                options.get(CONF_ADVISOR_INTERVAL_MIN, DEFAULT_ADVISOR_INTERVAL_MIN)
+            ),
+            backfill_days=min(
+                MAX_BACKFILL_DAYS,
+                max(0, int(options.get(CONF_BACKFILL_DAYS, DEFAULT_BACKFILL_DAYS))),
+            ),
+            battery_capacity_kwh=float(
+                options.get(CONF_BATTERY_CAPACITY_KWH, DEFAULT_BATTERY_CAPACITY_KWH)
+            ),
+            battery_power_kw=float(
+                options.get(CONF_BATTERY_POWER_KW, DEFAULT_BATTERY_POWER_KW)
+            ),
+            instrumentation=bool(
+                options.get(CONF_INSTRUMENTATION, DEFAULT_INSTRUMENTATION)
+            ),
+            stale_after=60
+            * max(0, int(options.get(CONF_STALE_MINUTES, DEFAULT_STALE_MINUTES))),
+        )
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Callable, Mapping
+from datetime import datetime
+from typing import Any
+
+import numpy as np
+
+# Attribute names that carry a list of price slots, in lookup order:
+# Nordpool (raw_today/raw_tomorrow), Tibber-style (today/tomorrow),
+# generic/EnergyZero-style (prices) and Amber (forecasts).
+_LIST_ATTRS: tuple[tuple[str, ...], ...] = (
+    ("raw_today", "raw_tomorrow"),
+    ("today", "tomorrow"),
+    ("prices",),
+    ("forecasts",),
+)
+_START_KEYS = ("start", "start_time", "startsAt", "from", "time", "timestamp")
+_END_KEYS = ("end", "end_time", "endsAt", "till", "to")
+_VALUE_KEYS = ("value", "price", "total", "per_kwh", "price_per_kwh")
+
+
+def _first(item: Mapping[str, Any], keys: tuple[str, ...]) -> Any:
+    for key in keys:
+        if item.get(key) is not None:
+            return item[key]
+    return None
+
+
+class PriceSeries:
+    """Time-indexed price slots parsed from a price sensor's attributes.
+
+    Slots are stored sorted in ``array('d')`` columns, so point lookups are a
+    bisection. Instances are immutable and cached until the source entity
+    changes.
+    """
+
+    __slots__ = ("starts", "ends", "values")
+
+    def __init__(self, starts: array, ends: array, values: array) -> None:
+        self.starts = starts
+        self.ends = ends
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @classmethod
+    def from_attributes(
+        cls,
+        attributes: Mapping[str, Any],
+        parse_datetime: Callable[[str], datetime | None],
+    ) -> PriceSeries | None:
+        """Parse the first recognised price-list attribute(s).
+
+        ``parse_datetime`` turns the slot timestamps into aware datetimes
+        (Home Assistant's ``dt_util.parse_datetime`` in the integration).
+        """
+        rows: list[tuple[float, float | None, float]] = []
+        for names in _LIST_ATTRS:
+            for name in names:
+                items = attributes.get(name)
+                if not isinstance(items, list):
+                    continue
+                for item in items:
+                    if not isinstance(item, Mapping):
+                        continue
+                    start = _first(item, _START_KEYS)
+                    value = _first(item, _VALUE_KEYS)
+                    if start is None or value is None:
+                        continue
+                    if isinstance(start, datetime):
+                        start_dt = start
+                    else:
+                        start_dt = parse_datetime(str(start))
+                    if start_dt is None:
+                        continue
+                    end = _first(item, _END_KEYS)
+                    if isinstance(end, datetime):
+                        end_dt: datetime | None = end
+                    else:
+                        end_dt = None if end is None else parse_datetime(str(end))
+                    try:
+                        price = float(value)
+                    except (TypeError, ValueError):
+                        continue
+                    rows.append(
+                        (
+                            start_dt.timestamp(),
+                            end_dt.timestamp() if end_dt else None,
+                            price,
+                        )
+                    )
+            if rows:
+                break
+        if not rows:
+            return None
+
+        rows.sort(key=lambda r: r[0])
+        starts = array("d", (r[0] for r in rows))
+        values = array("d", (r[2] for r in rows))
+        ends = array("d")
+        for i, (start, end, _) in enumerate(rows):
+            if end is None:
+                # Slot lasts until the next one; the last slot repeats the
+                # previous length (one hour when there is only one slot).
+                if i + 1 < len(rows):
+                    end = rows[i + 1][0]
+                elif i:
+                    end = start + (start - rows[i - 1][0])
+                else:
+                    end = start + 3600.0
+            ends.append(end)
+        return cls(starts, ends, values)
+
+    @property
+    def end_ts(self) -> float:
+        return self.ends[-1]
+
+    def _index(self, ts: float) -> int | None:
+        i = bisect_right(self.starts, ts) - 1
+        if i < 0 or ts >= self.ends[i]:
+            return None
+        return i
+
+    def price_at(self, ts: float) -> float | None:
+        i = self._index(ts)
+        return None if i is None else self.values[i]
+
+    def next_change(self, ts: float) -> float | None:
+        """Timestamp at which the slot covering ``ts`` ends."""
+        i = self._index(ts)
+        return None if i is None else self.ends[i]
+
+    def slots(
+        self, start_ts: float, step_seconds: int, count: int
+    ) -> np.ndarray | None:
+        """Prices resampled onto a regular grid, truncated at the last slot."""
+        if self._index(start_ts) is None:
+            return None
+        grid = start_ts + np.arange(count) * step_seconds
+        grid = grid[grid < self.end_ts]
+        idx = np.searchsorted(self.starts, grid, side="right") - 1
+        return np.frombuffer(self.values, dtype=float)[idx].copy()
+
+    def cheapest(
+        self, hours: float, after_ts: float, before_ts: float
+    ) -> list[tuple[float, float, float]]:
+        """Cheapest slots totalling ``hours`` inside [after_ts, before_ts).
+
+        Locating the window is O(log n); picking k of the m slots in it is
+        O(m + k log m). Returns (start, end, price) tuples sorted by time.
+        """
+        lo = max(bisect_right(self.starts, after_ts) - 1, 0)
+        hi = bisect_left(self.starts, before_ts)
+        window = [(self.values[i], i) for i in range(lo, hi) if self.ends[i] > after_ts]
+        heapq.heapify(window)
+        need = hours * 3600.0
+        picked: list[int] = []
+        while window and need > 0:
+            _, i = heapq.heappop(window)
+            picked.append(i)
+            need -= min(self.ends[i], before_ts) - max(self.starts[i], after_ts)
+        return [(self.starts[i], self.ends[i], self.values[i]) for i in sorted(picked)]
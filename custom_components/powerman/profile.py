@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+
+import numpy as np
+
+from .history import METRICS
+
+BUCKET_SECONDS = 300  # 5-minute grid
+BUCKETS_PER_DAY = 86400 // BUCKET_SECONDS
+
+
+class BucketSeries:
+    """Fixed 5-minute grid of per-metric means over the last ``days`` days.
+
+    Sums and counts are kept separately so bulk (backfill) and incremental
+    (live sample) inputs can be mixed. The grid slides forward as samples
+    newer than its end arrive.
+    """
+
+    def __init__(
+        self, days: int, end_ts: float, metrics: tuple[str, ...] = METRICS
+    ) -> None:
+        self.metrics = metrics
+        self._row = {m: i for i, m in enumerate(metrics)}
+        self.size = int(days) * BUCKETS_PER_DAY
+        self.end_ts = (end_ts // BUCKET_SECONDS + 1) * BUCKET_SECONDS
+        self._sum = np.zeros((len(metrics), self.size))
+        self._count = np.zeros((len(metrics), self.size))
+
+    @property
+    def start_ts(self) -> float:
+        return self.end_ts - self.size * BUCKET_SECONDS
+
+    def timestamps(self) -> np.ndarray:
+        """Start timestamp of every bucket."""
+        return self.start_ts + np.arange(self.size) * BUCKET_SECONDS
+
+    def _advance(self, ts: float) -> None:
+        if ts < self.end_ts:
+            return
+        k = int((ts - self.end_ts) // BUCKET_SECONDS) + 1
+        self.end_ts += k * BUCKET_SECONDS
+        if k >= self.size:
+            self._sum[:] = 0.0
+            self._count[:] = 0.0
+            return
+        self._sum[:, :-k] = self._sum[:, k:]
+        self._sum[:, -k:] = 0.0
+        self._count[:, :-k] = self._count[:, k:]
+        self._count[:, -k:] = 0.0
+
+    def add_many(self, metric: str, ts: np.ndarray, values: np.ndarray) -> None:
+        """Resample arbitrary (timestamp, value) points into the grid."""
+        row = self._row.get(metric)
+        if row is None:
+            return
+        ts = np.asarray(ts, dtype=float)
+        values = np.asarray(values, dtype=float)
+        idx = np.floor((ts - self.start_ts) / BUCKET_SECONDS).astype(np.intp)
+        ok = np.isfinite(values) & (idx >= 0) & (idx < self.size)
+        np.add.at(self._sum[row], idx[ok], values[ok])
+        np.add.at(self._count[row], idx[ok], 1.0)
+
+    def add(self, ts: float, sample: Mapping[str, float | None]) -> None:
+        """Fold one live sample into its bucket."""
+        self._advance(ts)
+        idx = int((ts - self.start_ts) // BUCKET_SECONDS)
+        if idx < 0:
+            return
+        for metric, row in self._row.items():
+            val = sample.get(metric)
+            if val is not None:
+                self._sum[row, idx] += val
+                self._count[row, idx] += 1.0
+
+    def means(self, metric: str) -> np.ndarray:
+        """Bucket means for ``metric``; NaN where no data was seen."""
+        row = self._row[metric]
+        count = self._count[row]
+        out = np.full(self.size, np.nan)
+        np.divide(self._sum[row], count, out=out, where=count > 0)
+        return out
+
+    def coverage(self, metric: str) -> float:
+        """Fraction of buckets holding at least one reading."""
+        return float(np.count_nonzero(self._count[self._row[metric]])) / self.size
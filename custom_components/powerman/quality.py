@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+from collections.abc import Collection, Mapping
+from statistics import median
+
+from .history import SampleBuffer
+
+# Unit of measurement -> factor to the canonical unit of each kind of source
+POWER_UNITS = {"W": 1.0, "kW": 1000.0, "MW": 1_000_000.0}
+ENERGY_UNITS = {"Wh": 0.001, "kWh": 1.0, "MWh": 1000.0}
+UNIT_SCALES: dict[str, dict[str, float]] = {
+    "solar_power_w": POWER_UNITS,
+    "grid_import_w": POWER_UNITS,
+    "grid_export_w": POWER_UNITS,
+    "house_load_w": POWER_UNITS,
+    "solar_energy_today_kwh": ENERGY_UNITS,
+    "solar_remaining_kwh": ENERGY_UNITS,
+}
+
+# Outlier screening: median/MAD over the newest OUTLIER_WINDOW history values.
+# MIN_SPREAD floors the scale so a flat series does not flag every change.
+OUTLIER_WINDOW = 30
+OUTLIER_K = 6.0
+MAD_SCALE = 1.4826  # MAD -> standard deviation for normal data
+MIN_SPREAD: dict[str, float] = {
+    "battery_percent": 3.0,
+    "solar_power_w": 250.0,
+    "grid_import_w": 250.0,
+    "grid_export_w": 250.0,
+    "house_load_w": 250.0,
+}
+
+# Gap filling: how long a missing reading may be bridged with the last value
+# seen, and the longest outage interpolated in the history once it ends
+HOLD_SECONDS: dict[str, float] = {
+    "battery_percent": 900.0,
+    "solar_power_w": 300.0,
+    "grid_import_w": 300.0,
+    "grid_export_w": 300.0,
+    "house_load_w": 300.0,
+    "price_now": 3600.0,
+}
+INTERPOLATE_SECONDS = 900.0
+
+# Minimum age before a slowly updating source counts as stale; other sources
+# use the Stale After option. Prices change hourly, forecasts refresh every
+# hour or few, and the solar energy counter is flat overnight.
+STALE_SECONDS: dict[str, float] = {
+    "price_now": 7200.0,
+    "price_next": 7200.0,
+    "solar_remaining_kwh": 10800.0,
+    "solar_energy_today_kwh": 43200.0,
+}
+
+STALE = "stale"
+OUTLIER = "outlier"
+
+
+def normalize(data_key: str, value: float, unit: str | None) -> float:
+    """Convert ``value`` to the unit the data key is named after."""
+    scales = UNIT_SCALES.get(data_key)
+    if scales is None or unit is None:
+        return value
+    return value * scales.get(unit, 1.0)
+
+
+class QualityFilter:
+    """Per-entry screening of source readings.
+
+    ``screen`` rejects readings out of range or far outside the recent
+    median +/- OUTLIER_K robust deviations. A reading that jumps is rejected
+    once; if the next one lands on the same side it is accepted as a real
+    step, so only isolated spikes are dropped. ``issues`` names every input
+    that is currently stale or was just rejected.
+    """
+
+    def __init__(self) -> None:
+        self._rejected: dict[str, float] = {}  # data key -> side of the spike
+
+    def screen(
+        self, data_key: str, value: float, history: SampleBuffer
+    ) -> float | None:
+        if data_key == "battery_percent" and not 0.0 <= value <= 100.0:
+            self._rejected[data_key] = 0.0
+            return None
+        spread = MIN_SPREAD.get(data_key)
+        if spread is None or data_key not in history.metrics:
+            self._rejected.pop(data_key, None)
+            return value
+        recent = history.recent(data_key, OUTLIER_WINDOW)
+        if len(recent) < OUTLIER_WINDOW // 3:
+            self._rejected.pop(data_key, None)
+            return value
+        mid = median(recent)
+        mad = median(abs(v - mid) for v in recent) * MAD_SCALE
+        deviation = value - mid
+        if abs(deviation) <= OUTLIER_K * max(mad, spread):
+            self._rejected.pop(data_key, None)
+            return value
+        side = 1.0 if deviation > 0 else -1.0
+        if self._rejected.pop(data_key, None) == side:
+            return value  # second reading on the same side: a real step
+        self._rejected[data_key] = side
+        return None
+
+    @property
+    def rejected(self) -> set[str]:
+        """Data keys whose last reading was rejected (worth re-reading)."""
+        return set(self._rejected)
+
+    def forget(self, data_key: str) -> None:
+        """The source is unavailable; it is not an outlier."""
+        self._rejected.pop(data_key, None)
+
+    def issues(
+        self, now: float, reported: Mapping[str, float], stale_after: float
+    ) -> dict[str, str]:
+        """Rejected and stale inputs.
+
+        ``reported`` maps data keys to when their entity last reported a
+        state (epoch), so a source that keeps sending the same value is not
+        stale. Each key waits at least its STALE_SECONDS.
+        """
+        out = {key: OUTLIER for key in self._rejected}
+        if stale_after > 0:
+            for key, updated in reported.items():
+                limit = max(stale_after, STALE_SECONDS.get(key, 0.0))
+                if now - updated > limit and key not in out:
+                    out[key] = STALE
+        return out
+
+
+def fill_gaps(
+    data: dict, keys: Collection[str], history: SampleBuffer, now: float
+) -> list[str]:
+    """Bridge short outages of the mapped ``keys``; returns the keys filled.
+
+    Call right after the current sample was appended to ``history`` (with
+    missing readings as NaN). A missing reading is replaced by the newest
+    value within its HOLD_SECONDS; a reading that is back after a gap of
+    at most INTERPOLATE_SECONDS has the gap in the history interpolated.
+    """
+    filled: list[str] = []
+    for key, hold in HOLD_SECONDS.items():
+        if key not in keys or key not in history.metrics:
+            continue
+        if data.get(key) is None:
+            last = history.last_valid(key, now - hold)
+            if last is not None:
+                data[key] = last[1]
+                filled.append(key)
+        else:
+            history.interpolate(key, INTERPOLATE_SECONDS)
+    return filled
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import operator
+from collections.abc import Callable, Mapping, Sequence
+from dataclasses import replace
+from typing import Any
+
+import yaml
+
+from .advisor import Advice, AdvisorInputs, _within_peak
+
+MAX_RULES = 50
+DEFAULT_CONFIDENCE = 0.7
+
+
+def _in(value: Any, allowed: frozenset) -> bool:
+    return value in allowed
+
+
+OPERATORS: dict[str, Callable[[Any, Any], bool]] = {
+    "lt": operator.lt,
+    "lte": operator.le,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "in": _in,
+}
+
+# Values a condition can test: name -> getter(inputs, built-in advice)
+FIELDS: dict[str, Callable[[AdvisorInputs, Advice], Any]] = {
+    "battery_pct": lambda i, a: i.battery_pct,
+    "solar_w": lambda i, a: i.solar_w,
+    "load_w": lambda i, a: i.load_w,
+    "import_w": lambda i, a: i.import_w,
+    "export_w": lambda i, a: i.export_w,
+    "price_now": lambda i, a: i.price_now,
+    "price_next": lambda i, a: i.price_next,
+    "solar_kwh_remaining_today": lambda i, a: i.solar_kwh_remaining_today,
+    "projected_soc_at_peak": lambda i, a: i.projected_soc_at_peak,
+    "hour": lambda i, a: i.now.hour,
+    "peak": lambda i, a: _within_peak(i.now, i.peak_start, i.peak_end),
+    "advice": lambda i, a: a.code,
+}
+
+
+class RuleError(ValueError):
+    """A rule definition is invalid."""
+
+
+class Rule:
+    """One compiled rule: a flat tuple of (getter, operator, operand) checks."""
+
+    __slots__ = ("name", "priority", "checks", "review_minutes", "_advice")
+
+    def __init__(
+        self,
+        name: str,
+        priority: int,
+        checks: tuple[tuple[Callable, Callable, Any], ...],
+        advice: Advice,
+        review_minutes: int | None,
+    ) -> None:
+        self.name = name
+        self.priority = priority
+        self.checks = checks
+        self.review_minutes = review_minutes
+        self._advice = advice
+
+    def matches(self, i: AdvisorInputs, builtin: Advice) -> bool:
+        for get, op, operand in self.checks:
+            value = get(i, builtin)
+            if value is None or not op(value, operand):
+                return False
+        return True
+
+    def advice(self, review: int) -> Advice:
+        # The rule's own horizon wins; the object is only rebuilt when the
+        # horizon changes
+        if self.review_minutes is not None:
+            review = self.review_minutes
+        if self._advice.next_review_minutes != review:
+            self._advice = replace(self._advice, next_review_minutes=review)
+        return self._advice
+
+
+class RuleSet:
+    """User rules applied on top of the built-in advice.
+
+    Rules are tried from the highest priority down (file order breaks
+    ties); the first whose conditions all hold replaces the built-in
+    advice. A condition on ``advice`` tests the built-in code, so a rule
+    can be limited to otherwise quiet periods. Evaluation walks
+    pre-compiled tuples and returns pre-built Advice objects.
+    """
+
+    __slots__ = ("rules",)
+
+    def __init__(self, rules: Sequence[Rule] = ()) -> None:
+        self.rules = tuple(sorted(rules, key=lambda r: -r.priority))
+
+    def __bool__(self) -> bool:
+        return bool(self.rules)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def apply(self, i: AdvisorInputs, builtin: Advice) -> Advice:
+        for rule in self.rules:
+            if rule.matches(i, builtin):
+                return rule.advice(builtin.next_review_minutes)
+        return builtin
+
+
+def _operand(name: str, op: str, value: Any) -> Any:
+    if op == "in":
+        if not isinstance(value, (list, tuple)):
+            raise RuleError(f"'{name}: in' needs a list")
+        try:
+            return frozenset(value)
+        except TypeError as exc:
+            raise RuleError(f"'{name}: in' needs a list of plain values") from exc
+    if name == "advice":
+        return str(value)
+    if name == "peak":
+        return bool(value)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise RuleError(f"'{name}: {op}' needs a number")
+    return float(value)
+
+
+def _compile_rule(raw: Any, index: int) -> Rule:
+    if not isinstance(raw, Mapping):
+        raise RuleError(f"rule {index + 1} is not a mapping")
+    name = str(raw.get("name") or f"rule_{index + 1}")
+    code = raw.get("code")
+    if not code or not isinstance(code, str):
+        raise RuleError(f"rule '{name}' needs a 'code'")
+    when = raw.get("when")
+    if not isinstance(when, Mapping) or not when:
+        raise RuleError(f"rule '{name}' needs a 'when' mapping")
+
+    checks: list[tuple[Callable, Callable, Any]] = []
+    for field, spec in when.items():
+        get = FIELDS.get(field)
+        if get is None:
+            raise RuleError(
+                f"rule '{name}': unknown field '{field}' "
+                f"(one of {', '.join(FIELDS)})"
+            )
+        if not isinstance(spec, Mapping):
+            spec = {"in" if isinstance(spec, list) else "eq": spec}
+        for op, value in spec.items():
+            if op not in OPERATORS:
+                raise RuleError(
+                    f"rule '{name}': unknown operator '{op}' "
+                    f"(one of {', '.join(OPERATORS)})"
+                )
+            checks.append((get, OPERATORS[op], _operand(field, op, value)))
+
+    try:
+        priority = int(raw.get("priority", 0))
+        confidence = float(raw.get("confidence", DEFAULT_CONFIDENCE))
+        review = raw.get("review_minutes")
+        review = None if review is None else max(1, int(review))
+    except (TypeError, ValueError) as exc:
+        raise RuleError(f"rule '{name}': {exc}") from exc
+    if not 0.0 <= confidence <= 1.0:
+        raise RuleError(f"rule '{name}': confidence must be between 0 and 1")
+
+    advice = Advice(
+        code=code,
+        title=str(raw.get("title") or name),
+        confidence=round(confidence, 2),
+        reasons=[str(raw.get("reason") or f"Rule '{name}' matched")],
+        next_review_minutes=review or 1,
+    )
+    return Rule(name, priority, tuple(checks), advice, review)
+
+
+def compile_rules(raw: Any) -> RuleSet:
+    """Compile a list of rule mappings (or ``{"rules": [...]}``)."""
+    if raw is None:
+        return RuleSet()
+    if isinstance(raw, Mapping):
+        raw = raw.get("rules") or []
+    if not isinstance(raw, list):
+        raise RuleError("rules must be a list")
+    if len(raw) > MAX_RULES:
+        raise RuleError(f"at most {MAX_RULES} rules are supported")
+    return RuleSet([_compile_rule(item, n) for n, item in enumerate(raw)])
+
+
+def parse_rules(text: str | None) -> RuleSet:
+    """Compile rules from YAML text; empty text gives an empty set."""
+    if not text or not text.strip():
+        return RuleSet()
+    try:
+        raw = yaml.safe_load(text)
+    except yaml.YAMLError as exc:
+        raise RuleError(f"invalid YAML: {exc}") from exc
+    return compile_rules(raw)
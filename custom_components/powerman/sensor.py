@@ -1,4 +1,6 @@
 from __future__ import annotations
+from datetime import datetime
+from time import monotonic
 from typing import Any
 
 from homeassistant.components.sensor import (
@@ -7,10 +9,13 @@ from homeassistant.components.sensor import (
     SensorStateClass,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.const import EntityCategory, PERCENTAGE, UnitOfEnergy, UnitOfTime
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.event import async_call_later
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.util import dt as dt_util
 
 from .const import (
     DOMAIN,
@@ -19,12 +24,19 @@ from .const import (
     CONF_BATTERY_ENTITY,
     CONF_SOLAR_POWER_ENTITY,
     CONF_SOLAR_ENERGY_TODAY_ENTITY,
+    CONF_INSTRUMENTATION,
+    CONF_GRID_IMPORT_ENTITY,
+    CONF_GRID_EXPORT_ENTITY,
+    CONF_LOAD_POWER_ENTITY,
+    CONF_PRICE_NOW_ENTITY,
+    CONF_FEED_IN_PRICE,
 )
 from .coordinator import PowerManCoordinator
+from .optimizer import ACTION_NAMES
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback) -> None:
-    coordinator: PowerManCoordinator = hass.data[DOMAIN][entry.entry_id]
+    coordinator: PowerManCoordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
     name = entry.title or DEFAULT_NAME
 
     sensors: list[SensorEntity] = []
@@ -39,13 +51,47 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
         sensors.append(SolarEnergyTodaySensor(coordinator, entry, f"{name} Solar Energy Today"))
 
     sensors.append(AdviceSensor(coordinator, entry, f"{name} Advice"))
+    sensors.append(BatteryScheduleSensor(coordinator, entry, f"{name} Battery Schedule"))
+    sensors.append(InsightSensor(coordinator, entry, f"{name} AI Insight"))
+
+    opts = entry.options
+    for key, (label, required) in ENERGY_FLOW_SENSORS.items():
+        if all(opts.get(conf) for conf in required):
+            sensors.append(EnergyFlowSensor(coordinator, entry, f"{name} {label}", key))
+
+    if entry.options.get(CONF_INSTRUMENTATION):
+        sensors.extend(
+            InstrumentationSensor(coordinator, entry, f"{name} {label}", key)
+            for key, label in INSTRUMENTATION_SENSORS.items()
+        )
 
     if sensors:
         async_add_entities(sensors)
 
 
+def _within(old: Any, new: Any, deadband: float) -> bool:
+    if old == new:
+        return True
+    if isinstance(old, (int, float)) and isinstance(new, (int, float)):
+        return abs(new - old) < deadband
+    return False
+
+
 class _BasePowerManSensor(CoordinatorEntity[PowerManCoordinator], SensorEntity):
+    """Coordinator sensor that only writes state when something meaningful changed.
+
+    A refresh is written when the state moves by at least ``_deadband`` or
+    ``_write_key()`` (whatever feeds the attributes) changes, but no more
+    often than every ``_min_interval`` seconds (a skipped change is written
+    when the interval ends) and at least every ``_max_interval`` seconds.
+    """
+
     _attr_has_entity_name = True
+    _deadband: float = 0.0
+    _min_interval: float = 0.0
+    _max_interval: float = 600.0
+    # Data key forwarded by this sensor, for the gap_filled attribute
+    _data_key: str | None = None
 
     def __init__(self, coordinator: PowerManCoordinator, entry: ConfigEntry, name: str, unique_suffix: str) -> None:
         super().__init__(coordinator)
@@ -57,13 +103,64 @@ class _BasePowerManSensor(CoordinatorEntity[PowerManCoordinator], SensorEntity):
             manufacturer="PowerMan",
             model="Entity Bridge",
         )
+        self._written: tuple[Any, Any] | None = None
+        self._written_at = 0.0
+        self._trailing: CALLBACK_TYPE | None = None
+
+    def _write_key(self) -> Any:
+        """Identity of the data behind the attributes; unchanged means no write."""
+        return self._gap_filled() if self._data_key else None
+
+    def _gap_filled(self) -> bool:
+        return self._data_key in (self.coordinator.data.get("gap_filled") or ())
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        value = self.native_value
+        key = (self.available, self._write_key())
+        elapsed = monotonic() - self._written_at
+        if self._written is not None and elapsed < self._max_interval:
+            old_value, old_key = self._written
+            if key == old_key and _within(old_value, value, self._deadband):
+                return
+            if elapsed < self._min_interval:
+                if self._trailing is None:
+                    self._trailing = async_call_later(
+                        self.hass, self._min_interval - elapsed, self._write_trailing
+                    )
+                return
+        self._write(value, key)
+
+    @callback
+    def _write_trailing(self, _now: datetime) -> None:
+        self._trailing = None
+        self._write(self.native_value, (self.available, self._write_key()))
+
+    @callback
+    def _write(self, value: Any, key: Any) -> None:
+        if self._trailing is not None:
+            self._trailing()
+            self._trailing = None
+        self._written = (value, key)
+        self._written_at = monotonic()
+        self.async_write_ha_state()
+
+    async def async_will_remove_from_hass(self) -> None:
+        if self._trailing is not None:
+            self._trailing()
+            self._trailing = None
+        await super().async_will_remove_from_hass()
 
     @property
     def extra_state_attributes(self) -> dict[str, Any]:
-        return {
+        attrs: dict[str, Any] = {
             "integration": DOMAIN,
             "provenance": "Forwarded from selected entities",
         }
+        if self._data_key:
+            # Source unavailable: the value is held from the recent history
+            attrs["gap_filled"] = self._gap_filled()
+        return attrs
 
 
 class BatterySensor(_BasePowerManSensor):
@@ -71,6 +168,8 @@ class BatterySensor(_BasePowerManSensor):
     _attr_device_class = SensorDeviceClass.BATTERY
     _attr_state_class = SensorStateClass.MEASUREMENT
     icon = "mdi:battery"
+    _deadband = 1.0  # %
+    _data_key = "battery_percent"
 
     def __init__(self, coordinator: PowerManCoordinator, entry: ConfigEntry, name: str) -> None:
         super().__init__(coordinator, entry, name, "battery")
@@ -85,6 +184,10 @@ class SolarPowerSensor(_BasePowerManSensor):
     _attr_device_class = SensorDeviceClass.POWER
     _attr_state_class = SensorStateClass.MEASUREMENT
     icon = "mdi:solar-power"
+    _deadband = 25.0  # W
+    _data_key = "solar_power_w"
+    _min_interval = 10.0
+    _max_interval = 300.0
 
     def __init__(self, coordinator: PowerManCoordinator, entry: ConfigEntry, name: str) -> None:
         super().__init__(coordinator, entry, name, "solar_power")
@@ -99,6 +202,7 @@ class SolarEnergyTodaySensor(_BasePowerManSensor):
     _attr_device_class = SensorDeviceClass.ENERGY
     _attr_state_class = SensorStateClass.TOTAL_INCREASING
     icon = "mdi:solar-panel"
+    _deadband = 0.01  # kWh
 
     def __init__(self, coordinator: PowerManCoordinator, entry: ConfigEntry, name: str) -> None:
         super().__init__(coordinator, entry, name, "solar_energy_today")
@@ -110,10 +214,21 @@ class SolarEnergyTodaySensor(_BasePowerManSensor):
 
 class AdviceSensor(_BasePowerManSensor):
     icon = "mdi:lightbulb-on-outline"
+    _unrecorded_attributes = frozenset({"timestamp", "cheapest_charge_slots"})
 
     def __init__(self, coordinator: PowerManCoordinator, entry: ConfigEntry, name: str) -> None:
         super().__init__(coordinator, entry, name, "advice")
 
+    def _write_key(self) -> Any:
+        # The coordinator keeps the same dict and charge window list while
+        # they are unchanged
+        data = self.coordinator.data
+        return (
+            data.get("advice"),
+            tuple(data.get("gap_filled") or ()),
+            data.get("charge_window"),
+        )
+
     @property
     def native_value(self) -> str:
         adv = self.coordinator.data.get("advice") or {}
@@ -129,7 +244,176 @@ class AdviceSensor(_BasePowerManSensor):
                 "confidence": adv.get("confidence"),
                 "reasons": adv.get("reasons"),
                 "timestamp": adv.get("timestamp"),
-                "next_review_minutes": adv.get("next_review_minutes"),
+                "gap_filled": self.coordinator.data.get("gap_filled") or [],
+                "cheapest_charge_slots": self.coordinator.data.get("charge_window")
+                or [],
+            }
+        )
+        return base
+
+
+class BatteryScheduleSensor(_BasePowerManSensor):
+    """Current slot of the least-cost battery plan over the price horizon."""
+
+    icon = "mdi:calendar-clock"
+    _unrecorded_attributes = frozenset({"schedule"})
+
+    def __init__(self, coordinator: PowerManCoordinator, entry: ConfigEntry, name: str) -> None:
+        super().__init__(coordinator, entry, name, "battery_schedule")
+
+    def _write_key(self) -> Any:
+        return self.coordinator.schedule
+
+    @property
+    def native_value(self) -> str | None:
+        schedule = self.coordinator.schedule
+        if schedule is None:
+            return None
+        action = schedule.action_at(dt_util.utcnow().timestamp())
+        return ACTION_NAMES.get(action) if action is not None else None
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:  # type: ignore[override]
+        base = super().extra_state_attributes
+        schedule = self.coordinator.schedule
+        if schedule is None:
+            return base
+        base.update(
+            {
+                "planned_cost": round(schedule.cost, 2),
+                "step_minutes": schedule.step_seconds // 60,
+                "schedule": [
+                    {
+                        **run,
+                        "start": dt_util.utc_from_timestamp(run["start"]).isoformat(),
+                        "end": dt_util.utc_from_timestamp(run["end"]).isoformat(),
+                    }
+                    for run in schedule.runs()
+                ],
             }
         )
         return base
+
+
+class InsightSensor(_BasePowerManSensor):
+    """Time of the last conversation agent answer; the text is an attribute."""
+
+    icon = "mdi:robot-outline"
+    _attr_device_class = SensorDeviceClass.TIMESTAMP
+    _unrecorded_attributes = frozenset({"text"})
+
+    def __init__(self, coordinator: PowerManCoordinator, entry: ConfigEntry, name: str) -> None:
+        super().__init__(coordinator, entry, name, "ai_insight")
+
+    def _write_key(self) -> Any:
+        return self.coordinator.insight
+
+    @property
+    def native_value(self) -> datetime | None:
+        insight = self.coordinator.insight
+        return insight.get("timestamp") if insight else None
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:  # type: ignore[override]
+        base = super().extra_state_attributes
+        insight = self.coordinator.insight or {}
+        base.update(
+            {
+                "text": insight.get("text"),
+                "agent_id": insight.get("agent_id"),
+                "error": insight.get("error"),
+            }
+        )
+        return base
+
+
+# Derived sensors: key -> (label, options that must be mapped)
+ENERGY_FLOW_SENSORS: dict[str, tuple[str, tuple[str, ...]]] = {
+    "imported_kwh": ("Energy Imported Today", (CONF_GRID_IMPORT_ENTITY,)),
+    "exported_kwh": ("Energy Exported Today", (CONF_GRID_EXPORT_ENTITY,)),
+    "cost": ("Energy Cost Today", (CONF_GRID_IMPORT_ENTITY, CONF_PRICE_NOW_ENTITY)),
+    "revenue": ("Export Revenue Today", (CONF_GRID_EXPORT_ENTITY, CONF_FEED_IN_PRICE)),
+    "battery_throughput_kwh": ("Battery Throughput Today", (CONF_BATTERY_ENTITY,)),
+    "self_consumption": ("Self Consumption", (CONF_SOLAR_POWER_ENTITY, CONF_GRID_EXPORT_ENTITY)),
+    "self_sufficiency": ("Self Sufficiency", (CONF_LOAD_POWER_ENTITY, CONF_GRID_IMPORT_ENTITY)),
+}
+
+
+class EnergyFlowSensor(_BasePowerManSensor):
+    """Today's totals and ratios from the coordinator's energy meter."""
+
+    icon = "mdi:transmission-tower"
+
+    def __init__(self, coordinator: PowerManCoordinator, entry: ConfigEntry, name: str, key: str) -> None:
+        super().__init__(coordinator, entry, name, f"energy_{key}")
+        self._key = key
+        if key in ("self_consumption", "self_sufficiency"):
+            self._attr_native_unit_of_measurement = PERCENTAGE
+            self._attr_state_class = SensorStateClass.MEASUREMENT
+            self._deadband = 0.5
+        elif key in ("cost", "revenue"):
+            self._attr_native_unit_of_measurement = coordinator.hass.config.currency
+            self._attr_device_class = SensorDeviceClass.MONETARY
+            self._attr_state_class = SensorStateClass.TOTAL
+            self._deadband = 0.01
+        else:
+            self._deadband = 0.01
+            self._attr_native_unit_of_measurement = UnitOfEnergy.KILO_WATT_HOUR
+            self._attr_device_class = SensorDeviceClass.ENERGY
+            self._attr_state_class = SensorStateClass.TOTAL_INCREASING
+
+    @property
+    def native_value(self) -> float | None:
+        energy = self.coordinator.energy
+        if self._key == "self_consumption":
+            ratio = energy.self_consumption()
+        elif self._key == "self_sufficiency":
+            ratio = energy.self_sufficiency()
+        else:
+            return round(energy.totals[self._key], 3)
+        return None if ratio is None else round(ratio * 100.0, 1)
+
+    @property
+    def last_reset(self) -> datetime | None:
+        if self._attr_state_class != SensorStateClass.TOTAL:
+            return None
+        return dt_util.start_of_local_day()
+
+
+# Diagnostic sensors created when instrumentation is enabled: key -> label
+INSTRUMENTATION_SENSORS = {
+    "tick_p90": "Tick p90",
+    "advisor_p90": "Advisor p90",
+    "ai_latency": "AI latency",
+}
+
+
+class InstrumentationSensor(_BasePowerManSensor):
+    """Hot-path timing read from the coordinator's stats."""
+
+    icon = "mdi:timer-outline"
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _min_interval = 60.0
+
+    def __init__(self, coordinator: PowerManCoordinator, entry: ConfigEntry, name: str, key: str) -> None:
+        super().__init__(coordinator, entry, name, f"stats_{key}")
+        self._key = key
+        self._attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+        self._attr_device_class = SensorDeviceClass.DURATION
+
+    @property
+    def native_value(self) -> float | None:
+        stats = self.coordinator.stats
+        if self._key == "tick_p90":
+            return stats.percentile_ms("tick", 90)
+        if self._key == "advisor_p90":
+            return stats.percentile_ms("advisor", 90)
+        timing = stats.timings.get("ai_call")
+        return round(timing.last * 1000.0, 1) if timing else None
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:  # type: ignore[override]
+        base = super().extra_state_attributes
+        base.update(self.coordinator.stats.counters)
+        return base
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+from array import array
+from time import perf_counter
+from typing import Any
+
+WINDOW = 256  # durations kept per timer for the percentiles
+
+
+class _NullTimer:
+    """Shared no-op context used while instrumentation is off."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> _NullTimer:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        return None
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("_stats", "_name", "_start")
+
+    def __init__(self, stats: Stats, name: str) -> None:
+        self._stats = stats
+        self._name = name
+
+    def __enter__(self) -> _Timer:
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self._stats.record(self._name, perf_counter() - self._start)
+
+
+class Timing:
+    """Count, total and a ring of the last WINDOW durations (seconds)."""
+
+    __slots__ = ("count", "total", "last", "_ring")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self._ring = array("d", bytes(8 * WINDOW))
+
+    def add(self, seconds: float) -> None:
+        self._ring[self.count % WINDOW] = seconds
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+
+    def percentile(self, p: float) -> float | None:
+        n = min(self.count, WINDOW)
+        if not n:
+            return None
+        values = sorted(self._ring[:n])
+        return values[min(n - 1, int(p / 100.0 * n))]
+
+    def as_dict(self) -> dict[str, Any]:
+        def ms(value: float | None) -> float | None:
+            return None if value is None else round(value * 1000.0, 3)
+
+        return {
+            "count": self.count,
+            "mean_ms": ms(self.total / self.count) if self.count else None,
+            "last_ms": ms(self.last) if self.count else None,
+            "p50_ms": ms(self.percentile(50)),
+            "p90_ms": ms(self.percentile(90)),
+            "p99_ms": ms(self.percentile(99)),
+        }
+
+
+class Stats:
+    """Hot-path timers and counters for one entry.
+
+    While disabled, ``timer()`` hands out a shared no-op context and
+    ``incr()`` returns at once, so the instrumented paths cost a method call.
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.timings: dict[str, Timing] = {}
+        self.counters: dict[str, int] = {}
+
+    def timer(self, name: str) -> _Timer | _NullTimer:
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def record(self, name: str, seconds: float) -> None:
+        timing = self.timings.get(name)
+        if timing is None:
+            timing = self.timings[name] = Timing()
+        timing.add(seconds)
+
+    def incr(self, name: str, n: int = 1) -> None:
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def percentile_ms(self, name: str, p: float) -> float | None:
+        timing = self.timings.get(name)
+        value = timing.percentile(p) if timing else None
+        return None if value is None else round(value * 1000.0, 3)
+
+    def reset(self) -> None:
+        self.timings.clear()
+        self.counters.clear()
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "timings": {name: t.as_dict() for name, t in self.timings.items()},
+            "counters": dict(self.counters),
+        }
@@ -0,0 +1,46 @@
+from __future__ import annotations
+from collections.abc import Callable
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, STORAGE_SAVE_DELAY, STORAGE_VERSION
+
+
+class PowerManStore:
+    """Persists an entry's sample history and advice/AI state across restarts."""
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        self._store: Store[dict[str, Any]] = Store(
+            hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}"
+        )
+        self._pending = False
+
+    async def async_load(self) -> dict[str, Any]:
+        return await self._store.async_load() or {}
+
+    @callback
+    def async_schedule_save(self, data_func: Callable[[], dict[str, Any]]) -> None:
+        """Save within STORAGE_SAVE_DELAY.
+
+        ``Store.async_delay_save`` restarts its timer on every call, so while
+        a save is pending further calls are ignored; the data is collected
+        when the save is written.
+        """
+        if self._pending:
+            return
+        self._pending = True
+
+        def collect() -> dict[str, Any]:
+            self._pending = False
+            return data_func()
+
+        self._store.async_delay_save(collect, STORAGE_SAVE_DELAY)
+
+    async def async_save(self, data: dict[str, Any]) -> None:
+        self._pending = False  # replaces any delayed save
+        await self._store.async_save(data)
+
+    async def async_remove(self) -> None:
+        await self._store.async_remove()
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import itertools
+import os
+import random
+from collections.abc import Iterable, Iterator, Mapping
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import tzinfo
+from multiprocessing import shared_memory
+from multiprocessing.context import BaseContext
+from typing import Any
+
+import numpy as np
+
+from .backtest import CHUNK_ROWS, TIMESTAMP_COLUMN, backtest
+from .const import (
+    CONF_CHEAP_PRICE,
+    CONF_HIGH_PRICE,
+    CONF_RESERVE_SOC,
+    CONF_TARGET_SOC,
+)
+from .options import CompiledOptions
+
+TUNED_OPTIONS = (CONF_CHEAP_PRICE, CONF_HIGH_PRICE, CONF_RESERVE_SOC, CONF_TARGET_SOC)
+CHEAP_QUANTILES = (0.1, 0.2, 0.3, 0.4)
+HIGH_QUANTILES = (0.6, 0.7, 0.8, 0.9)
+RESERVE_GRID = (10, 20, 30, 40, 50, 60)
+TARGET_GRID = (50, 60, 70, 80, 90, 100)
+
+
+@dataclass(frozen=True)
+class SharedHistorySpec:
+    """Picklable handle to a history loaded into shared memory."""
+
+    name: str
+    rows: int
+    columns: tuple[str, ...]
+
+
+class SharedHistory:
+    """History columns packed into one shared-memory block.
+
+    The parent loads the history once; worker processes attach by name and
+    get zero-copy NumPy views, so no task ever pickles the data.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, spec: SharedHistorySpec):
+        self._shm = shm
+        self.spec = spec
+        self.columns = {
+            name: np.ndarray(
+                (spec.rows,), dtype=float, buffer=shm.buf, offset=i * spec.rows * 8
+            )
+            for i, name in enumerate(spec.columns)
+        }
+
+    @classmethod
+    def create(cls, chunks: Iterable[Mapping[str, np.ndarray]]) -> SharedHistory:
+        parts: dict[str, list[np.ndarray]] = {}
+        for chunk in chunks:
+            for name, values in chunk.items():
+                parts.setdefault(name, []).append(values)
+        if TIMESTAMP_COLUMN not in parts:
+            raise ValueError("history is empty")
+        names = (TIMESTAMP_COLUMN, *(n for n in parts if n != TIMESTAMP_COLUMN))
+        rows = sum(len(p) for p in parts[TIMESTAMP_COLUMN])
+        size = max(1, rows * 8 * len(names))
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        history = cls(shm, SharedHistorySpec(shm.name, rows, names))
+        for name in names:
+            np.concatenate(parts[name], out=history.columns[name])
+        return history
+
+    @classmethod
+    def attach(cls, spec: SharedHistorySpec) -> SharedHistory:
+        return cls(shared_memory.SharedMemory(name=spec.name), spec)
+
+    def chunks(self, chunk_rows: int = CHUNK_ROWS) -> Iterator[dict[str, np.ndarray]]:
+        for start in range(0, self.spec.rows, chunk_rows):
+            yield {
+                name: values[start : start + chunk_rows]
+                for name, values in self.columns.items()
+            }
+
+    def close(self, unlink: bool = False) -> None:
+        self.columns = {}
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+
+
+def candidates(
+    prices: np.ndarray, samples: int | None = None, seed: int = 0
+) -> list[dict[str, Any]]:
+    """Option sets to evaluate: a grid, or a random subset of it.
+
+    Price thresholds come from quantiles of the recorded prices; sets with
+    cheap >= high or reserve >= target are left out.
+    """
+    prices = prices[np.isfinite(prices)]
+    cheap = sorted({round(float(v), 3) for v in np.quantile(prices, CHEAP_QUANTILES)})
+    high = sorted({round(float(v), 3) for v in np.quantile(prices, HIGH_QUANTILES)})
+    grid = [
+        dict(zip(TUNED_OPTIONS, combo))
+        for combo in itertools.product(cheap, high, RESERVE_GRID, TARGET_GRID)
+        if combo[0] < combo[1] and combo[2] < combo[3]
+    ]
+    if samples is not None and samples < len(grid):
+        grid = random.Random(seed).sample(grid, samples)
+    return grid
+
+
+# Per-process state set up by _init_worker
+_WORKER: dict[str, Any] = {}
+
+
+def _init_worker(
+    spec: SharedHistorySpec, base: dict[str, Any], kwargs: dict[str, Any]
+) -> None:
+    _WORKER["history"] = SharedHistory.attach(spec)
+    _WORKER["base"] = base
+    _WORKER["kwargs"] = kwargs
+
+
+def _evaluate(overrides: dict[str, Any]) -> tuple[dict[str, Any], dict[str, Any]]:
+    options = CompiledOptions.from_options({**_WORKER["base"], **overrides})
+    result = backtest(_WORKER["history"].chunks(), options, **_WORKER["kwargs"])
+    return overrides, result.as_dict()
+
+
+def tune(
+    history: SharedHistory,
+    base_options: Mapping[str, Any],
+    option_sets: list[dict[str, Any]],
+    *,
+    workers: int | None = None,
+    initial_soc_pct: float | None = None,
+    export_price: float = 0.0,
+    tz: tzinfo | None = None,
+    mp_context: BaseContext | None = None,
+) -> list[tuple[dict[str, Any], dict[str, Any]]]:
+    """Backtest every option set on all cores; cheapest first.
+
+    Returns (option overrides, backtest metrics) pairs sorted by grid cost,
+    then by peak-window import. ``mp_context`` picks how the worker
+    processes start (default: the platform's start method).
+    """
+    kwargs = {
+        "initial_soc_pct": initial_soc_pct,
+        "export_price": export_price,
+        "tz": tz,
+    }
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(),
+        mp_context=mp_context,
+        initializer=_init_worker,
+        initargs=(history.spec, dict(base_options), kwargs),
+    ) as pool:
+        results = list(pool.map(_evaluate, option_sets, chunksize=4))
+    results.sort(key=lambda r: (r[1]["cost"], r[1]["peak_import_kwh"]))
+    return results
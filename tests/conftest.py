@@ -0,0 +1,7 @@
+"""Make tools/powerman_pkg importable so tests load the HA-free modules."""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tools"))
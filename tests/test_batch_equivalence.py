@@ -0,0 +1,192 @@
+"""batch.advise_batch must match the scalar advisor row by row.
+
+The coordinator evaluates ``rules.apply(inputs, make_advice(inputs))`` on the
+raw readings, so readings sitting exactly on a threshold are checked against
+that path as well as against the batch evaluation.
+"""
+from __future__ import annotations
+
+from dataclasses import replace
+from datetime import datetime, time, timedelta
+
+import numpy as np
+import pytest
+
+from powerman_pkg import load
+
+advisor = load("advisor")
+batch = load("batch")
+rules = load("rules")
+
+BASE = advisor.AdvisorInputs(
+    now=datetime(2024, 6, 3, 11, 0),
+    battery_pct=50.0,
+    solar_w=1500.0,
+    load_w=800.0,
+    import_w=0.0,
+    export_w=200.0,
+    price_now=0.2,
+    price_next=0.25,
+    solar_kwh_remaining_today=5.0,
+    reserve_soc=30,
+    target_soc=80,
+    cheap_price=0.15,
+    high_price=0.3,
+    peak_start=time(15),
+    peak_end=time(21),
+    ev_enabled=True,
+)
+
+
+def _maybe(rng: np.random.Generator, value: float, p_none: float = 0.15):
+    return None if rng.random() < p_none else value
+
+
+def _random_inputs(rng: np.random.Generator, rows: int) -> list:
+    reserve = int(rng.integers(0, 60))
+    target = int(rng.integers(reserve, 101))
+    cheap = round(float(rng.uniform(0.0, 0.3)), 3)
+    high = round(float(rng.uniform(cheap, 0.8)), 3)
+    peak_start = time(int(rng.integers(0, 24)), int(rng.choice([0, 15, 30, 45])))
+    peak_end = time(int(rng.integers(0, 24)), int(rng.choice([0, 30])))
+    ev = bool(rng.random() < 0.5)
+    review = int(rng.integers(1, 30))
+    base = datetime(2024, 1, 1) + timedelta(days=int(rng.integers(0, 365)))
+
+    out = []
+    for _ in range(rows):
+        now = base + timedelta(microseconds=int(rng.integers(0, 86_400_000_000)))
+        if rng.random() < 0.1:  # land exactly on a boundary
+            now = now.replace(
+                hour=peak_start.hour, minute=peak_start.minute, second=0, microsecond=0
+            )
+        # Bias readings onto and just around the thresholds
+        bat = float(
+            rng.choice([reserve, reserve - 0.4, target, rng.uniform(0, 100)])
+        )
+        price = float(rng.choice([cheap, cheap + 1e-4, high, rng.uniform(-0.1, 1.0)]))
+        out.append(
+            advisor.AdvisorInputs(
+                now=now,
+                battery_pct=_maybe(rng, bat),
+                solar_w=_maybe(rng, float(rng.choice([50.0, rng.uniform(0, 6000)]))),
+                load_w=_maybe(rng, float(rng.uniform(0, 4000))),
+                import_w=_maybe(rng, float(rng.uniform(0, 4000))),
+                export_w=_maybe(rng, float(rng.choice([500.0, rng.uniform(0, 4000)]))),
+                price_now=_maybe(rng, price),
+                price_next=_maybe(rng, float(rng.uniform(0, 1))),
+                solar_kwh_remaining_today=_maybe(
+                    rng, float(rng.choice([1.0, rng.uniform(0, 20)])), 0.4
+                ),
+                reserve_soc=reserve,
+                target_soc=target,
+                cheap_price=cheap,
+                high_price=high,
+                peak_start=peak_start,
+                peak_end=peak_end,
+                ev_enabled=ev,
+                projected_soc_at_peak=_maybe(rng, float(rng.uniform(0, 100)), 0.5),
+                minutes_to_price_change=_maybe(rng, float(rng.uniform(0, 90)), 0.5),
+                review_minutes=review,
+                untrusted=int(rng.choice([0, 0, 0, 1, 2, 6])),
+            )
+        )
+    return out
+
+
+def _assert_batch_matches(inputs: list) -> None:
+    result = batch.advise_batch(batch.columns_from_inputs(inputs))
+    names = result.code_names()
+    for row, i in enumerate(inputs):
+        expected = advisor.make_advice(i)
+        got = (names[row], result.confidence[row], result.next_review_minutes[row])
+        want = (expected.code, expected.confidence, expected.next_review_minutes)
+        assert got == want, f"row {row}: {i}"
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_batches_match_scalar(seed: int) -> None:
+    _assert_batch_matches(_random_inputs(np.random.default_rng(seed), 500))
+
+
+# (inputs, expected code) right on or next to a threshold
+THRESHOLD_CASES = {
+    "price_equals_cheap": (
+        replace(BASE, battery_pct=20.0, price_now=0.15, now=datetime(2024, 6, 3, 16)),
+        "charge_battery_from_grid_now",
+    ),
+    "price_equals_cheap_inexact": (
+        replace(
+            BASE,
+            battery_pct=20.0,
+            price_now=0.57,
+            cheap_price=0.57,
+            high_price=0.9,
+            now=datetime(2024, 6, 3, 16),
+        ),
+        "charge_battery_from_grid_now",
+    ),
+    "price_just_above_cheap_in_peak": (
+        replace(
+            BASE,
+            battery_pct=20.0,
+            price_now=0.1004,
+            cheap_price=0.1002,
+            now=datetime(2024, 6, 3, 16),
+        ),
+        "do_nothing_normal_day",
+    ),
+    "soc_just_below_reserve": (
+        replace(BASE, battery_pct=29.6),
+        "charge_battery_from_grid_now",
+    ),
+    "soc_equals_reserve": (
+        replace(BASE, battery_pct=30.0),
+        "do_nothing_normal_day",
+    ),
+    "soc_equals_target_exporting": (
+        replace(BASE, battery_pct=80.0, export_w=501.0),
+        "plug_in_ev_now",
+    ),
+    "export_equals_ev_threshold": (
+        replace(BASE, battery_pct=80.0, export_w=500.0),
+        "do_nothing_normal_day",
+    ),
+    "price_equals_high": (
+        replace(BASE, battery_pct=20.0, price_now=0.3),
+        "do_nothing_normal_day",
+    ),
+    "projected_just_below_reserve": (
+        replace(BASE, projected_soc_at_peak=29.9),
+        "charge_battery_from_grid_now",
+    ),
+    "peak_start_exactly": (
+        replace(BASE, battery_pct=20.0, now=datetime(2024, 6, 3, 15)),
+        "do_nothing_normal_day",
+    ),
+}
+
+
+@pytest.mark.parametrize("name", THRESHOLD_CASES)
+def test_thresholds(name: str) -> None:
+    inputs, code = THRESHOLD_CASES[name]
+    # The coordinator's path: built-in advice on the raw readings, then rules
+    advice = rules.RuleSet().apply(inputs, advisor.make_advice(inputs))
+    assert advice.code == code
+    _assert_batch_matches([inputs])
+
+
+def test_rule_on_threshold_uses_raw_reading() -> None:
+    ruleset = rules.parse_rules(
+        """
+- name: cheap_now
+  when: {price_now: {lte: 0.57}}
+  code: run_appliances_now
+"""
+    )
+    at = replace(BASE, price_now=0.57)
+    above = replace(BASE, price_now=0.5701)
+    assert ruleset.apply(at, advisor.make_advice(at)).code == "run_appliances_now"
+    assert ruleset.apply(above, advisor.make_advice(above)).code == (
+        "do_nothing_normal_day"
+    )
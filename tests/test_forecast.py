@@ -0,0 +1,38 @@
+"""projected_soc's composed walk must match stepping through the buckets."""
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from powerman_pkg import load
+
+forecast = load("forecast")
+
+
+def _walk(fc, soc_pct: float, capacity_kwh: float, until_ts: float) -> float:
+    n = int((until_ts - fc.start_ts) // forecast.BUCKET_SECONDS)
+    n = max(0, min(forecast.HORIZON_BUCKETS, n))
+    soc = soc_pct / 100.0 * capacity_kwh
+    if n == 0:
+        return soc_pct
+    for delta in (fc.solar_w[:n] - fc.load_w[:n]) * forecast._KWH_PER_W_BUCKET:
+        soc = min(capacity_kwh, max(0.0, soc + delta))
+    return soc / capacity_kwh * 100.0
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_projected_soc_matches_bucket_walk(seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    size = forecast.HORIZON_BUCKETS
+    fc = forecast.EnergyForecast(
+        start_ts=0.0,
+        load_w=rng.uniform(0, 3000, size),
+        solar_w=rng.uniform(0, 6000, size) * rng.random(),
+        clearness=1.0,
+    )
+    capacity = float(rng.uniform(3, 20))
+    for until in rng.uniform(-600, (size + 10) * forecast.BUCKET_SECONDS, 5):
+        for soc in [0.0, 100.0, *rng.uniform(0, 100, 10)]:
+            assert forecast.projected_soc(fc, soc, capacity, until) == pytest.approx(
+                _walk(fc, soc, capacity, until), abs=1e-9
+            )
@@ -0,0 +1,117 @@
+"""NotificationPipeline: coalescing, hysteresis, cooldown and the bounded queue.
+
+The clock and ``async_call_later`` are replaced so each coalescing window is
+flushed by hand; the worker is never started, so sent messages stay queued.
+"""
+from __future__ import annotations
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+from powerman_pkg import load  # noqa: E402
+
+notifications = load("notifications")
+stats_mod = load("stats")
+
+ENTRY = "entry"
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> _Clock:
+    clock = _Clock()
+    monkeypatch.setattr(notifications, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def flushes(monkeypatch: pytest.MonkeyPatch) -> list:
+    scheduled: list = []
+
+    def call_later(hass, delay, action):
+        assert delay == notifications.COALESCE_SECONDS
+        scheduled.append(action)
+        return lambda: None
+
+    monkeypatch.setattr(notifications, "async_call_later", call_later)
+    return scheduled
+
+
+@pytest.fixture
+def pipeline(clock: _Clock, flushes: list) -> notifications.NotificationPipeline:
+    return notifications.NotificationPipeline(hass=None)
+
+
+def _queued(pipeline: notifications.NotificationPipeline) -> list[tuple]:
+    items = []
+    while not pipeline._queue.empty():
+        items.append(pipeline._queue.get_nowait())
+    return items
+
+
+def _change(pipeline, stats, *codes: str) -> None:
+    for code in codes:
+        pipeline.async_advice_changed(
+            ENTRY, {"code": code, "title": code.title(), "reasons": []}, stats
+        )
+
+
+def test_changes_inside_the_window_become_one_message(pipeline, flushes) -> None:
+    stats = stats_mod.Stats(enabled=True)
+    _change(pipeline, stats, "charge", "hold", "hold", "discharge")
+    assert len(flushes) == 1
+    flushes.pop()()
+    [(title, message, notification_id, _)] = _queued(pipeline)
+    assert title == "PowerMan — Advice changed"
+    assert notification_id == f"powerman_advice_{ENTRY}"
+    assert message.startswith("Discharge\n")
+    assert "3 changes in the last 1 min: charge → hold → discharge" in message
+    assert stats.counters == {"notifications_coalesced": 2}
+
+
+def test_flap_back_to_the_notified_code_sends_nothing(pipeline, flushes) -> None:
+    stats = stats_mod.Stats(enabled=True)
+    pipeline.async_seed(ENTRY, "charge")
+    _change(pipeline, stats, "hold", "charge")
+    flushes.pop()()
+    assert _queued(pipeline) == []
+    assert stats.counters["notifications_suppressed"] == 1
+
+
+def test_code_is_not_repeated_within_the_cooldown(pipeline, flushes, clock) -> None:
+    stats = stats_mod.Stats(enabled=True)
+    for code in ("charge", "hold"):
+        _change(pipeline, stats, code)
+        flushes.pop()()
+    assert len(_queued(pipeline)) == 2
+
+    clock.now += notifications.CODE_COOLDOWN_SECONDS - 1
+    _change(pipeline, stats, "charge")
+    flushes.pop()()
+    assert _queued(pipeline) == []
+    assert stats.counters["notifications_suppressed"] == 1
+
+    # The suppressed code still counts as shown, so only a new change fires.
+    clock.now += 2
+    _change(pipeline, stats, "hold")
+    flushes.pop()()
+    [(_, message, _, _)] = _queued(pipeline)
+    assert message.startswith("Hold\n")
+
+
+def test_full_queue_drops_the_oldest_message(pipeline) -> None:
+    stats = stats_mod.Stats(enabled=True)
+    total = notifications.QUEUE_SIZE + 2
+    for i in range(total):
+        pipeline.async_notify(f"title {i}", "message", stats=stats)
+    titles = [item[0] for item in _queued(pipeline)]
+    assert titles == [f"title {i}" for i in range(2, total)]
+    assert stats.counters == {"notifications_dropped": 2}
@@ -0,0 +1,50 @@
+"""PriceSeries.cheapest: the cheapest slots inside a window, in time order."""
+from __future__ import annotations
+
+from array import array
+
+from powerman_pkg import load
+
+prices = load("prices")
+
+HOUR = 3600.0
+
+
+def _series(values: list[float]) -> prices.PriceSeries:
+    starts = array("d", (i * HOUR for i in range(len(values))))
+    ends = array("d", ((i + 1) * HOUR for i in range(len(values))))
+    return prices.PriceSeries(starts, ends, array("d", values))
+
+
+def test_picks_cheapest_slots_sorted_by_time() -> None:
+    series = _series([0.30, 0.10, 0.25, 0.05, 0.20, 0.40])
+    picked = series.cheapest(3, 0.0, 6 * HOUR)
+    assert picked == [
+        (1 * HOUR, 2 * HOUR, 0.10),
+        (3 * HOUR, 4 * HOUR, 0.05),
+        (4 * HOUR, 5 * HOUR, 0.20),
+    ]
+
+
+def test_window_excludes_slots_at_or_after_before_ts() -> None:
+    series = _series([0.30, 0.10, 0.25, 0.05, 0.20, 0.40])
+    picked = series.cheapest(2, 0.0, 3 * HOUR)
+    assert [p[2] for p in picked] == [0.10, 0.25]
+
+
+def test_partly_elapsed_slot_counts_only_its_remainder() -> None:
+    series = _series([0.05, 0.10, 0.30])
+    # Half of the cheapest slot is left, so the next cheapest one is added
+    picked = series.cheapest(1, 0.5 * HOUR, 3 * HOUR)
+    assert [p[2] for p in picked] == [0.05, 0.10]
+
+
+def test_more_hours_than_the_window_returns_every_slot() -> None:
+    series = _series([0.30, 0.10, 0.25])
+    assert len(series.cheapest(10, 0.0, 3 * HOUR)) == 3
+
+
+def test_empty_window_and_zero_hours() -> None:
+    series = _series([0.30, 0.10, 0.25])
+    assert series.cheapest(2, 5 * HOUR, 8 * HOUR) == []
+    assert series.cheapest(0, 0.0, 3 * HOUR) == []
@@ -0,0 +1,176 @@
+"""Source screening: units, outliers, staleness, gap filling and the penalty."""
+from __future__ import annotations
+
+from dataclasses import replace
+from datetime import datetime, time
+
+import pytest
+
+from powerman_pkg import load
+
+advisor = load("advisor")
+history_mod = load("history")
+quality = load("quality")
+
+NOW = 1_700_000_000.0
+
+
+def _history(key: str, values: list[float]) -> history_mod.SampleBuffer:
+    buf = history_mod.SampleBuffer(capacity=64)
+    for n, value in enumerate(values):
+        buf.append(NOW + 10.0 * n, {key: value})
+    return buf
+
+
+@pytest.mark.parametrize(
+    ("key", "value", "unit", "expected"),
+    [
+        ("solar_power_w", 1.5, "kW", 1500.0),
+        ("house_load_w", 800.0, "W", 800.0),
+        ("solar_remaining_kwh", 2500.0, "Wh", 2.5),
+        ("solar_power_w", 1.5, "hp", 1.5),  # unknown unit is left alone
+        ("solar_power_w", 1.5, None, 1.5),
+        ("battery_percent", 55.0, "kW", 55.0),  # key without units
+    ],
+)
+def test_normalize(key: str, value: float, unit: str | None, expected: float) -> None:
+    assert quality.normalize(key, value, unit) == pytest.approx(expected)
+
+
+def test_battery_out_of_range_is_rejected() -> None:
+    qf = quality.QualityFilter()
+    assert qf.screen("battery_percent", 101.0, _history("battery_percent", [])) is None
+    assert qf.rejected == {"battery_percent"}
+
+
+def test_spike_is_rejected_once_and_a_step_accepted_on_the_second_reading() -> None:
+    buf = _history("house_load_w", [800.0, 810.0, 790.0] * 10)
+    qf = quality.QualityFilter()
+    assert qf.screen("house_load_w", 5000.0, buf) is None
+    assert qf.rejected == {"house_load_w"}
+    assert qf.screen("house_load_w", 5100.0, buf) == 5100.0
+    assert qf.rejected == set()
+
+
+def test_spike_on_the_other_side_is_rejected_again() -> None:
+    buf = _history("house_load_w", [800.0, 810.0, 790.0] * 10)
+    qf = quality.QualityFilter()
+    assert qf.screen("house_load_w", 5000.0, buf) is None
+    assert qf.screen("house_load_w", -4000.0, buf) is None
+    assert qf.screen("house_load_w", 820.0, buf) == 820.0
+    assert qf.rejected == set()
+
+
+def test_short_history_is_not_screened() -> None:
+    buf = _history("house_load_w", [800.0] * (quality.OUTLIER_WINDOW // 3 - 1))
+    assert quality.QualityFilter().screen("house_load_w", 5000.0, buf) == 5000.0
+
+
+def test_staleness_uses_last_reported_and_the_per_key_minimum() -> None:
+    qf = quality.QualityFilter()
+    reported = {
+        "house_load_w": NOW - 601.0,
+        "solar_power_w": NOW - 60.0,
+        "price_now": NOW - 3600.0,  # inside its STALE_SECONDS
+    }
+    assert qf.issues(NOW, reported, stale_after=600.0) == {
+        "house_load_w": quality.STALE
+    }
+    reported["price_now"] = NOW - quality.STALE_SECONDS["price_now"] - 1.0
+    assert qf.issues(NOW, reported, stale_after=600.0) == {
+        "house_load_w": quality.STALE,
+        "price_now": quality.STALE,
+    }
+
+
+def test_stale_after_zero_disables_staleness_but_not_outliers() -> None:
+    qf = quality.QualityFilter()
+    qf.screen("battery_percent", -5.0, _history("battery_percent", []))
+    assert qf.issues(NOW, {"house_load_w": 0.0}, stale_after=0.0) == {
+        "battery_percent": quality.OUTLIER
+    }
+
+
+def _gappy(
+    key: str, rows: list[tuple[float, float | None]]
+) -> history_mod.SampleBuffer:
+    buf = history_mod.SampleBuffer(capacity=64)
+    for offset, value in rows:
+        buf.append(NOW + offset, {key: value})
+    return buf
+
+
+def test_missing_reading_is_held_within_its_hold_time() -> None:
+    hold = quality.HOLD_SECONDS["house_load_w"]
+    buf = _gappy("house_load_w", [(0.0, 800.0), (hold - 10.0, None)])
+    data = {"house_load_w": None}
+    filled = quality.fill_gaps(data, ["house_load_w"], buf, NOW + hold - 10.0)
+    assert filled == ["house_load_w"]
+    assert data == {"house_load_w": 800.0}
+
+
+def test_hold_expires() -> None:
+    hold = quality.HOLD_SECONDS["house_load_w"]
+    buf = _gappy("house_load_w", [(0.0, 800.0), (hold + 10.0, None)])
+    data = {"house_load_w": None}
+    assert quality.fill_gaps(data, ["house_load_w"], buf, NOW + hold + 10.0) == []
+    assert data == {"house_load_w": None}
+
+
+def test_unmapped_key_is_not_filled() -> None:
+    buf = _gappy("house_load_w", [(0.0, 800.0), (10.0, None)])
+    data = {"house_load_w": None}
+    assert quality.fill_gaps(data, [], buf, NOW + 10.0) == []
+
+
+def test_short_gap_is_interpolated_when_the_reading_returns() -> None:
+    rows = [(0.0, 100.0), (100.0, None), (200.0, None), (300.0, 400.0)]
+    buf = _gappy("house_load_w", rows)
+    data = {"house_load_w": 400.0}
+    assert quality.fill_gaps(data, ["house_load_w"], buf, NOW + 300.0) == []
+    expected = [400.0, 300.0, 200.0, 100.0]
+    assert buf.recent("house_load_w", 4) == pytest.approx(expected)
+
+
+def test_gap_longer_than_the_limit_stays_missing() -> None:
+    end = quality.INTERPOLATE_SECONDS + 100.0
+    rows = [(0.0, 100.0), (300.0, None), (600.0, None), (end, 400.0)]
+    buf = _gappy("house_load_w", rows)
+    quality.fill_gaps({"house_load_w": 400.0}, ["house_load_w"], buf, NOW + end)
+    assert buf.recent("house_load_w", 4) == [400.0, 100.0]
+
+
+BASE = advisor.AdvisorInputs(
+    now=datetime(2024, 6, 3, 11, 0),
+    battery_pct=50.0,
+    solar_w=1500.0,
+    load_w=800.0,
+    import_w=0.0,
+    export_w=200.0,
+    price_now=0.2,
+    price_next=0.25,
+    solar_kwh_remaining_today=5.0,
+    reserve_soc=30,
+    target_soc=80,
+    cheap_price=0.15,
+    high_price=0.3,
+    peak_start=time(15),
+    peak_end=time(21),
+    ev_enabled=True,
+)
+
+
+@pytest.mark.parametrize("untrusted", [1, 2])
+def test_untrusted_inputs_lower_confidence(untrusted: int) -> None:
+    trusted = advisor.make_advice(BASE)
+    advice = advisor.make_advice(replace(BASE, untrusted=untrusted))
+    assert advice.code == trusted.code
+    assert advice.confidence == pytest.approx(
+        trusted.confidence - advisor.UNTRUSTED_PENALTY * untrusted
+    )
+    assert advice.reasons[-1] == f"{untrusted} input(s) stale or rejected as outliers"
+
+
+def test_confidence_never_drops_below_the_floor() -> None:
+    advice = advisor.make_advice(replace(BASE, untrusted=20))
+    assert advice.confidence == advisor.MIN_CONFIDENCE
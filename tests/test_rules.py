@@ -0,0 +1,32 @@
+"""Rule compilation rejects bad definitions with RuleError only."""
+from __future__ import annotations
+
+import pytest
+
+from powerman_pkg import load
+
+rules = load("rules")
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "- {code: x, when: {hour: {in: [[1, 2]]}}}",
+        "- {code: x, when: {hour: {in: [{a: 1}]}}}",
+        "- {code: x, when: {hour: [[17, 18]]}}",
+        "- {code: x, when: {hour: {in: 17}}}",
+        "- {code: x, when: {nope: 1}}",
+        "- {code: x, when: {hour: {near: 1}}}",
+        "- {when: {hour: 1}}",
+        "rules: {code: x}",
+        "- [unclosed",
+    ],
+)
+def test_invalid_rules_raise_rule_error(text: str) -> None:
+    with pytest.raises(rules.RuleError):
+        rules.parse_rules(text)
+
+
+def test_in_with_plain_values_compiles() -> None:
+    ruleset = rules.parse_rules("- {code: x, when: {hour: [17, 18]}}")
+    assert len(ruleset) == 1
@@ -0,0 +1,52 @@
+"""Replay a recorded history through the advisor and a simulated battery.
+
+    python tools/backtest.py history.csv [--option reserve_soc_percent=40 ...]
+        [--tz Europe/Amsterdam] [--initial-soc 50] [--export-price 0.05]
+
+The history is a wide CSV or Parquet file (Parquet needs pyarrow) with a
+``timestamp`` column plus house_load_w, price_now and optionally
+solar_power_w, price_next, solar_remaining_kwh and export_price. Options use
+the integration's option keys (see const.py). Prints the metrics as JSON.
+Runs without Home Assistant.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from zoneinfo import ZoneInfo
+
+from powerman_pkg import load, parse_option
+
+backtest_mod = load("backtest")
+options_mod = load("options")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("history")
+    parser.add_argument("--option", type=parse_option, action="append", default=[])
+    parser.add_argument("--tz", help="zone of naive timestamps (default: local)")
+    parser.add_argument("--initial-soc", type=float)
+    parser.add_argument("--export-price", type=float, default=0.0)
+    args = parser.parse_args()
+
+    tz = ZoneInfo(args.tz) if args.tz else None
+    options = options_mod.CompiledOptions.from_options(dict(args.option))
+    start = time.perf_counter()
+    result = backtest_mod.backtest(
+        backtest_mod.read_history(args.history, tz),
+        options,
+        initial_soc_pct=args.initial_soc,
+        export_price=args.export_price,
+        tz=tz,
+    )
+    out = result.as_dict()
+    out["elapsed_s"] = round(time.perf_counter() - start, 2)
+    print(json.dumps(out, indent=2))
+    return 0 if result.rows else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
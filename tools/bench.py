@@ -0,0 +1,367 @@
+"""PowerMan micro-benchmarks with JSON baselines and a regression gate.
+
+    python tools/bench.py                  # run and compare with the baseline
+    python tools/bench.py --save           # run and store a new baseline
+    python tools/bench.py --filter advisor --threshold 0.25
+
+Baselines are per machine architecture (``.benchmarks/<machine>.json`` by
+default) because the numbers from a workstation say nothing about a
+low-power ARM box. A case is a regression when it is slower than its
+baseline by more than the threshold; the exit code is then 1. Cases that
+need Home Assistant (coordinator tick, service handlers) are skipped when
+it is not installed.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import tempfile
+import time
+import timeit
+from collections.abc import Callable
+from datetime import datetime, time as dtime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+from powerman_pkg import PACKAGE_DIR, load
+
+advisor = load("advisor")
+batch = load("batch")
+const = load("const")
+history = load("history")
+optimizer = load("optimizer")
+options_mod = load("options")
+rules = load("rules")
+
+BENCH_DIR = Path(".benchmarks")
+DEFAULT_THRESHOLD = 0.20  # 20 % slower than the baseline fails
+STATE_COUNT = 5000  # entities in the stub state machine
+
+# name -> () -> (callable, operations per call); async cases return a coroutine
+CASES: dict[str, Callable] = {}
+ASYNC_CASES: dict[str, Callable] = {}
+
+
+def case(name: str, *, is_async: bool = False):
+    def register(func: Callable) -> Callable:
+        (ASYNC_CASES if is_async else CASES)[name] = func
+        return func
+
+    return register
+
+
+def _advisor_mix(n: int = 256, seed: int = 0) -> list:
+    """Inputs over a day: night, morning ramp, export midday, low SoC, peak."""
+    rng = np.random.default_rng(seed)
+    base = datetime(2024, 6, 3)
+    out = []
+    for k in range(n):
+        now = base + timedelta(minutes=int(k * 1440 / n))
+        hour = now.hour + now.minute / 60
+        solar = max(0.0, np.sin((hour - 6) / 12 * np.pi)) * 5000
+        load_w = 400 + 300 * rng.random() + (1500 if 17 <= hour < 21 else 0)
+        out.append(
+            advisor.AdvisorInputs(
+                now=now,
+                battery_pct=float(rng.uniform(10, 100)),
+                solar_w=solar,
+                load_w=load_w,
+                import_w=max(0.0, load_w - solar),
+                export_w=max(0.0, solar - load_w),
+                price_now=float(rng.uniform(0.05, 0.45)),
+                price_next=float(rng.uniform(0.05, 0.45)),
+                solar_kwh_remaining_today=None if k % 3 else float(rng.uniform(0, 8)),
+                reserve_soc=30,
+                target_soc=80,
+                cheap_price=0.15,
+                high_price=0.30,
+                peak_start=dtime(15),
+                peak_end=dtime(21),
+                ev_enabled=True,
+                projected_soc_at_peak=None if k % 2 else float(rng.uniform(0, 100)),
+                minutes_to_price_change=float(rng.uniform(0, 60)),
+            )
+        )
+    return out
+
+
+@case("advisor.make_advice")
+def _make_advice():
+    inputs = _advisor_mix()
+
+    def run():
+        for i in inputs:
+            advisor.make_advice(i)
+
+    return run, len(inputs)
+
+
+# Rules exercising every kind of check; only some match the mix above
+BENCH_RULES = """
+- name: preheat_water
+  priority: 20
+  when: {solar_w: {gt: 2500}, battery_pct: {gte: 90}, peak: false}
+  code: preheat_water
+- name: defer_dishwasher
+  priority: 10
+  when: {price_now: {gt: 0.3}, hour: [17, 18, 19, 20], advice: do_nothing_normal_day}
+  code: defer_dishwasher
+- name: cheap_night
+  when: {price_now: {lt: 0.1}, solar_w: {lt: 50}}
+  code: run_appliances_now
+"""
+
+
+@case("advisor.make_advice+rules")
+def _make_advice_rules():
+    inputs = _advisor_mix()
+    ruleset = rules.parse_rules(BENCH_RULES)
+
+    def run():
+        for i in inputs:
+            ruleset.apply(i, advisor.make_advice(i))
+
+    return run, len(inputs)
+
+
+@case("advisor.within_peak")
+def _within_peak():
+    base = datetime(2024, 6, 3)
+    nows = [base + timedelta(minutes=m) for m in range(0, 1440, 7)]
+    windows = [(dtime(15), dtime(21)), (dtime(22), dtime(6)), (dtime(0), dtime(0))]
+
+    def run():
+        for start, end in windows:
+            for now in nows:
+                advisor._within_peak(now, start, end)
+
+    return run, len(nows) * len(windows)
+
+
+@case("batch.advise_batch[1y]")
+def _advise_batch():
+    columns = batch.columns_from_inputs(_advisor_mix(1000))
+    rows = 365 * 288
+    columns = {
+        k: (np.resize(v, rows) if isinstance(v, np.ndarray) else v)
+        for k, v in columns.items()
+    }
+    return (lambda: batch.advise_batch(columns)), 1
+
+
+@case("history.append")
+def _history_append():
+    buffer = history.SampleBuffer()
+    sample = {m: 1.0 for m in history.METRICS}
+    clock = [0.0]
+
+    def run():
+        for _ in range(100):
+            clock[0] += 30.0
+            buffer.append(clock[0], sample)
+
+    return run, 100
+
+
+@case("optimizer.optimize[48h]")
+def _optimize():
+    slots = 192
+    hour = (np.arange(slots) * 900 / 3600.0) % 24
+    prices = 0.2 + 0.15 * ((hour >= 17) & (hour < 21))
+    load_kwh = np.full(slots, 0.15)
+    solar = np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None) * 1.2
+
+    def run():
+        optimizer.optimize(
+            prices,
+            load_kwh,
+            solar,
+            start_ts=0.0,
+            step_seconds=900,
+            capacity_kwh=10.0,
+            soc_pct=50.0,
+            min_soc_pct=30.0,
+            max_power_kw=5.0,
+        )
+
+    return run, 1
+
+
+def _ha_available() -> bool:
+    try:
+        import homeassistant  # noqa: F401
+    except ImportError:
+        return False
+    # The HA cases import the integration itself rather than the bare package
+    sys.path.insert(0, str(PACKAGE_DIR.parent.parent))
+    return True
+
+
+async def _ha_setup():
+    """A real HomeAssistant core with STATE_COUNT states and no-op services."""
+    from homeassistant.core import HomeAssistant
+
+    from custom_components.powerman.coordinator import PowerManCoordinator
+
+    hass = HomeAssistant(tempfile.mkdtemp())
+    for k in range(STATE_COUNT):
+        hass.states.async_set(f"sensor.bench_{k}", str(k % 100))
+
+    async def _noop(call) -> None:
+        return None
+
+    hass.services.async_register("persistent_notification", "create", _noop)
+    hass.services.async_register("conversation", "process", _noop)
+
+    options = options_mod.CompiledOptions.from_options(
+        {
+            conf_key: f"sensor.bench_{k * 500}"
+            for k, (conf_key, _) in enumerate(options_mod.SOURCES)
+        }
+    )
+    coordinator = PowerManCoordinator(hass, options=options)
+    return hass, coordinator
+
+
+async def _time_async(func: Callable, number: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            await func()
+        best = min(best, time.perf_counter() - start)
+    return best / number
+
+
+@case("coordinator.update_data", is_async=True)
+async def _coordinator_tick(number: int, repeat: int) -> float:
+    hass, coordinator = await _ha_setup()
+    try:
+        return await _time_async(coordinator._async_update_data, number, repeat)
+    finally:
+        await hass.async_stop(force=True)
+
+
+@case("services.advise_now", is_async=True)
+async def _service_advise_now(number: int, repeat: int) -> float:
+    from custom_components.powerman.engine import PowerManEngine
+
+    hass, coordinator = await _ha_setup()
+    engine = PowerManEngine(hass)
+    engine.entries["bench"] = {
+        "coordinator": coordinator,
+        "entry": SimpleNamespace(title="bench", options={}),
+        "adv_prev_code": None,
+    }
+    # The worker delivers the queued notifications to the no-op service;
+    # without it the queue fills and every call only drops the oldest one.
+    engine.notifications.async_start()
+    try:
+        return await _time_async(
+            lambda: engine.async_advise_now(None), number, repeat
+        )
+    finally:
+        engine.notifications.async_stop()
+        await hass.async_stop(force=True)
+
+
+@case("services.generate_insight", is_async=True)
+async def _service_generate_insight(number: int, repeat: int) -> float:
+    from custom_components.powerman.engine import PowerManEngine
+
+    hass, coordinator = await _ha_setup()
+    await coordinator._async_update_data()
+    engine = PowerManEngine(hass)
+    engine.entries["bench"] = {
+        "coordinator": coordinator,
+        "entry": SimpleNamespace(title="bench", options={}),
+    }
+    engine.notifications.async_start()
+    try:
+        return await _time_async(
+            lambda: engine.async_generate_insight(None), number, repeat
+        )
+    finally:
+        engine.notifications.async_stop()
+        await hass.async_stop(force=True)
+
+
+def run_cases(pattern: str | None, number: int, repeat: int) -> dict[str, dict]:
+    results: dict[str, dict] = {}
+    for name, setup in CASES.items():
+        if pattern and pattern not in name:
+            continue
+        func, ops = setup()
+        func()  # warm up caches and lazy imports
+        timer = timeit.Timer(func)
+        loops, _ = timer.autorange()
+        best = min(timer.repeat(repeat=repeat, number=loops)) / loops
+        results[name] = {"us_per_op": round(best / ops * 1e6, 3)}
+    if any(not pattern or pattern in name for name in ASYNC_CASES):
+        if _ha_available():
+            for name, func in ASYNC_CASES.items():
+                if pattern and pattern not in name:
+                    continue
+                best = asyncio.run(func(number, repeat))
+                results[name] = {"us_per_op": round(best * 1e6, 3)}
+        else:
+            print("Home Assistant not installed; skipping HA cases", file=sys.stderr)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--baseline", type=Path, default=BENCH_DIR / f"{platform.machine()}.json"
+    )
+    parser.add_argument("--save", action="store_true", help="store as new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--filter", help="only cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=200, help="async case loops")
+    args = parser.parse_args()
+
+    results = run_cases(args.filter, args.number, args.repeat)
+    baseline: dict = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text()).get("cases", {})
+
+    regressions = 0
+    for name, result in results.items():
+        line = f"{name:32s} {result['us_per_op']:12.3f} us/op"
+        base = baseline.get(name)
+        if base:
+            ratio = result["us_per_op"] / base["us_per_op"]
+            line += f"  {ratio:6.2f}x baseline"
+            if ratio > 1.0 + args.threshold:
+                line += "  REGRESSION"
+                regressions += 1
+        print(line)
+
+    if args.save:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        merged = {**baseline, **results}
+        args.baseline.write_text(
+            json.dumps(
+                {
+                    "machine": platform.machine(),
+                    "python": platform.python_version(),
+                    "saved": datetime.now().isoformat(timespec="seconds"),
+                    "cases": merged,
+                },
+                indent=2,
+                sort_keys=True,
+            )
+        )
+        print(f"baseline written to {args.baseline}", file=sys.stderr)
+        return 0
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
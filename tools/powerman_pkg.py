@@ -0,0 +1,37 @@
+"""Import PowerMan's Home Assistant-free modules outside Home Assistant.
+
+The integration package's ``__init__`` imports Home Assistant, so the tools
+register ``powerman`` as a bare package pointing at the source directory
+instead of importing ``custom_components.powerman``. Only modules that do
+not import Home Assistant (advisor, history, profile, forecast, optimizer,
+...) can be loaded this way.
+"""
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import sys
+import types
+from pathlib import Path
+
+PACKAGE_DIR = Path(__file__).resolve().parent.parent / "custom_components" / "powerman"
+
+
+def load(module: str) -> types.ModuleType:
+    if "powerman" not in sys.modules:
+        pkg = types.ModuleType("powerman")
+        pkg.__path__ = [str(PACKAGE_DIR)]
+        sys.modules["powerman"] = pkg
+    return importlib.import_module(f"powerman.{module}")
+
+
+def parse_option(text: str) -> tuple[str, object]:
+    """argparse type for ``--option key=value``; values are JSON if they parse."""
+    key, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected key=value, got {text!r}")
+    try:
+        return key, json.loads(value)
+    except json.JSONDecodeError:
+        return key, value  # plain strings such as 16:00
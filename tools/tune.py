@@ -0,0 +1,109 @@
+"""Search advisor thresholds for the lowest backtested grid cost.
+
+    python tools/tune.py history.csv [--option battery_capacity_kwh=13.5 ...]
+        [--samples 100] [--workers N] [--tz Europe/Amsterdam]
+        [--output powerman_tuning.json]
+
+Evaluates cheap/high price thresholds and reserve/target SoC over a grid
+(or a random subset of it with --samples) using every core. The history is
+loaded once into shared memory for all workers. The best set is written as
+JSON; copy it into the Home Assistant config directory and the PowerMan
+options dialog shows it as a suggestion.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from powerman_pkg import load, parse_option
+
+backtest_mod = load("backtest")
+const = load("const")
+options_mod = load("options")
+tune_mod = load("tune")
+
+
+def _worker_context() -> multiprocessing.context.BaseContext | None:
+    # Workers resolve powerman.* through the package powerman_pkg registers
+    # in this process. Forked workers inherit it; where fork is unavailable,
+    # spawned workers re-run this script, which registers it again.
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("history")
+    parser.add_argument("--option", type=parse_option, action="append", default=[])
+    parser.add_argument("--samples", type=int, help="random subset of the grid")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, help="default: all cores")
+    parser.add_argument("--tz", help="zone of naive timestamps (default: local)")
+    parser.add_argument("--initial-soc", type=float)
+    parser.add_argument("--export-price", type=float, default=0.0)
+    parser.add_argument("--output", default=const.TUNING_FILE)
+    args = parser.parse_args()
+
+    tz = ZoneInfo(args.tz) if args.tz else None
+    base = dict(args.option)
+    history = tune_mod.SharedHistory.create(
+        backtest_mod.read_history(args.history, tz)
+    )
+    try:
+        option_sets = tune_mod.candidates(
+            history.columns["price_now"], args.samples, args.seed
+        )
+        compiled = options_mod.CompiledOptions.from_options(base)
+        current = {
+            const.CONF_CHEAP_PRICE: compiled.cheap_price,
+            const.CONF_HIGH_PRICE: compiled.high_price,
+            const.CONF_RESERVE_SOC: compiled.reserve_soc,
+            const.CONF_TARGET_SOC: compiled.target_soc,
+        }
+        if current not in option_sets:
+            option_sets.append(current)
+        print(
+            f"{len(option_sets)} option sets over {history.spec.rows} rows",
+            file=sys.stderr,
+        )
+        start = time.perf_counter()
+        results = tune_mod.tune(
+            history,
+            base,
+            option_sets,
+            workers=args.workers,
+            mp_context=_worker_context(),
+            initial_soc_pct=args.initial_soc,
+            export_price=args.export_price,
+            tz=tz,
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        history.close(unlink=True)
+
+    best, metrics = results[0]
+    current_metrics = next(m for o, m in results if o == current)
+    out = {
+        "generated": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "history": args.history,
+        "evaluated": len(results),
+        "options": best,
+        "cost": metrics["cost"],
+        "current_cost": current_metrics["cost"],
+        "metrics": metrics,
+    }
+    with open(args.output, "w", encoding="utf-8") as handle:
+        json.dump(out, handle, indent=2)
+    print(json.dumps({k: out[k] for k in ("options", "cost", "current_cost")}))
+    print(f"{elapsed:.1f} s, written to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())